@@ -0,0 +1,8 @@
+def warmup():
+    """
+    Compile the numba kernels of nle_utils ahead of the first frame, e.g. in the initializer of parallel workers.
+    The compiled kernels are cached on disk, so only the first process after an install or an update compiles them
+    """
+    from nle_utils.visualize import warmup_kernels
+
+    warmup_kernels()
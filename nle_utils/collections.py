@@ -1,4 +1,4 @@
-from typing import Dict, Iterable, List
+from typing import Any, Dict, Iterable, List
 
 
 def concat_dicts(list_of_dicts: List[Dict]) -> Dict:
@@ -41,3 +41,50 @@ def listify(value) -> list:
         return list(value)
 
     return [value]
+
+
+class RingBuffer:
+    """
+    Fixed-capacity sequence of the last `capacity` appended items, appending to a full buffer overwrites
+    the oldest item. Append and indexing are O(1), indices follow list semantics (buffer[-1] is the newest).
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"RingBuffer capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._len = 0
+
+    def append(self, item: Any):
+        end = self._start + self._len
+        self._items[end % self.capacity] = item
+        if self._len < self.capacity:
+            self._len += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def last(self, n: int) -> List:
+        """The last n items (fewer if not that many were appended), oldest first"""
+        n = min(n, self._len)
+        return [self[i] for i in range(self._len - n, self._len)]
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("RingBuffer index out of range")
+        return self._items[(self._start + index) % self.capacity]
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return (self[i] for i in range(self._len))
+
+    def __repr__(self):
+        return f"RingBuffer({list(self)!r}, capacity={self.capacity})"
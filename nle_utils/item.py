@@ -0,0 +1,22 @@
+from enum import Enum
+
+
+class ItemClasses(Enum):
+    # NetHack object classes (see include/objclass.h), in the default inventory `packorder`
+    COINS = 12
+    AMULETS = 5
+    WEAPONS = 2
+    ARMOR = 3
+    COMESTIBLES = 7
+    SCROLLS = 9
+    SPELLBOOKS = 10
+    POTIONS = 8
+    RINGS = 4
+    WANDS = 11
+    TOOLS = 6
+    GEMS = 13
+    BOULDERS = 14
+    IRON_BALLS = 15
+    CHAINS = 16
+    VENOM = 17
+    ILLEGAL = 1
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from nle import nethack
+
+HISTORY_SIZE = 13
+FONT_SIZE = 32
+INVENTORY_WIDTH = 1000
+FRAME_THICKNESS = 3
+
+
+@dataclass(frozen=True)
+class Rect:
+    """Pixel rectangle of a pane inside a frame"""
+
+    y: int
+    x: int
+    height: int
+    width: int
+
+    def view(self, image):
+        """View of the rectangle in a (..., H, W, 3) image"""
+        return image[..., self.y : self.y + self.height, self.x : self.x + self.width, :]
+
+
+@dataclass(frozen=True)
+class Layout:
+    """Pixel geometry of a `Visualize` frame"""
+
+    width: int
+    height: int
+    tile_size: int
+    char_size: Tuple[int, int]  # (width, height) of a terminal character
+    line_height: int
+    frame_thickness: int
+    actions: Rect
+    messages: Rect
+    popups: Rect
+    map: Rect
+    tty: Rect
+    stats: Rect
+    inventory: Rect
+
+    @property
+    def shape(self):
+        return self.height, self.width, 3
+
+    @property
+    def font_scale(self):
+        return self.line_height / FONT_SIZE
+
+
+def compute_layout(
+    output_size: Optional[Tuple[int, int]] = None,
+    tile_size=32,
+    char_size=(12, 22),
+    map_shape=nethack.nethack.DUNGEON_SHAPE,
+    tty_shape=nethack.nethack.TERMINAL_SHAPE,
+):
+    """
+    Without output_size the frame has the native geometry: tile_size map tiles, FONT_SIZE text lines and a
+    terminal rendered with char_size characters and resized into its pane.
+
+    With output_size=(width, height) the frame is exactly that size: tiles, text lines and frames are scaled by
+    the factor that fits the native layout into it, the extra height goes to the bottom bar and the extra width to
+    the inventory, and the terminal characters are sized so that the terminal fills its pane without resizing.
+    """
+    native_width = map_shape[1] * tile_size + INVENTORY_WIDTH
+    native_height = FONT_SIZE * HISTORY_SIZE + map_shape[0] * tile_size + FONT_SIZE * tty_shape[0]
+    if output_size is None:
+        width, height = native_width, native_height
+        scale = 1.0
+    else:
+        width, height = output_size
+        scale = min(width / native_width, height / native_height)
+        tile_size = max(1, int(tile_size * scale))
+
+    line_height = max(1, round(FONT_SIZE * scale))
+    map_width = map_shape[1] * tile_size
+    map_height = map_shape[0] * tile_size
+    topbar_height = line_height * HISTORY_SIZE
+    bottombar_top = topbar_height + map_height
+    bottombar_height = height - bottombar_top
+    if bottombar_height < tty_shape[0] or map_width // 2 < tty_shape[1] or width - map_width < 1:
+        raise ValueError(f"Output size {output_size} is too small")
+
+    actions_width = round(map_width / 100 * 7)
+    messages_width = round(map_width / 100 * 43)
+    tty_width = map_width - map_width // 2
+    if output_size is None:
+        tty = Rect(bottombar_top, 0, bottombar_height, tty_width)
+    else:
+        char_size = (tty_width // tty_shape[1], bottombar_height // tty_shape[0])
+        tty = Rect(bottombar_top, 0, char_size[1] * tty_shape[0], char_size[0] * tty_shape[1])
+
+    return Layout(
+        width=width,
+        height=height,
+        tile_size=tile_size,
+        char_size=tuple(char_size),
+        line_height=line_height,
+        frame_thickness=max(1, round(FRAME_THICKNESS * scale)),
+        actions=Rect(0, 0, topbar_height, actions_width),
+        messages=Rect(0, actions_width, topbar_height, messages_width),
+        popups=Rect(0, actions_width + messages_width, topbar_height, map_width - actions_width - messages_width),
+        map=Rect(topbar_height, 0, map_height, map_width),
+        tty=tty,
+        stats=Rect(bottombar_top, tty_width, bottombar_height, map_width // 2),
+        inventory=Rect(0, map_width, height, width - map_width),
+    )
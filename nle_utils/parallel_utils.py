@@ -42,7 +42,10 @@ def imap_parallel(
     function_args: tuple,
     n_jobs: Optional[int] = None,
     ordered: bool = True,
+    initializer: Optional[Callable[[], None]] = None,
 ) -> Iterable[T]:
+    """initializer is called once in every worker process (or once in this process if n_jobs is 1) before the
+    first item, e.g. `nle_utils.warmup`"""
     if n_jobs is None or n_jobs <= 0:
         n_jobs = get_physical_cores_count()
 
@@ -51,10 +54,12 @@ def imap_parallel(
     total = len(iterable) if isinstance(iterable, Sized) else None
 
     if n_jobs > 1:
-        pool = mp.Pool(processes=n_jobs)
+        pool = mp.Pool(processes=n_jobs, initializer=initializer)
         pool_map = pool.imap if ordered else pool.imap_unordered
         results = pool_map(tupled_function, args)
     else:
+        if initializer is not None:
+            initializer()
         results = map(tupled_function, args)
 
     with tqdm(results, total=total, leave=False) as progress:
@@ -76,12 +81,14 @@ def map_parallel(
     function: Callable[..., Result[T]],
     function_args: tuple,
     n_jobs: Optional[int] = None,
+    initializer: Optional[Callable[[], None]] = None,
 ) -> List[T]:
     values = imap_parallel(
         iterable=iterable,
         function=function,
         function_args=function_args,
         n_jobs=n_jobs,
+        initializer=initializer,
     )
 
     return [*values]
@@ -94,6 +101,7 @@ def run_parallel(
     function_args: tuple,
     n_jobs: Optional[int] = None,
     ordered: bool = False,
+    initializer: Optional[Callable[[], None]] = None,
 ) -> None:
     values = imap_parallel(
         iterable=iterable,
@@ -101,6 +109,7 @@ def run_parallel(
         function_args=function_args,
         n_jobs=n_jobs,
         ordered=ordered,
+        initializer=initializer,
     )
 
     for _ in values:
@@ -0,0 +1,105 @@
+import re
+
+import numpy as np
+
+MARKERS = (b"--More--", b"(end)")
+PAGE_MARKER_REGEX = re.compile(rb"\(\d+ of \d+\)")
+
+_NUL_TO_SPACE = bytes.maketrans(b"\0", b" ")
+# latin-1 bytes that aren't alphanumeric, like str.isalnum of the decoded character
+_NOT_ALNUM = bytes(b for b in range(256) if not chr(b).isalnum())
+
+
+def decode(chars):
+    """uint8 characters (e.g. the message observation) as a str, NULs replaced by spaces"""
+    return np.asarray(chars, dtype=np.uint8).tobytes().translate(_NUL_TO_SPACE).decode("latin-1")
+
+
+def screen_bytes(tty_chars):
+    """A (rows, columns) uint8 screen as a single bytes object of rows * columns characters, NULs replaced by spaces"""
+    return np.ascontiguousarray(tty_chars, dtype=np.uint8).tobytes().translate(_NUL_TO_SPACE)
+
+
+def find_marker(screen, columns):
+    """Return ((line, column), marker) of the --More--, (end) or (X of N) marker of a `screen_bytes` screen,
+    or (None, None) if there isn't any
+    """
+    markers = _find_markers(screen, columns)
+    if not markers:
+        return None, None
+    if len(markers) > 1:
+        raise ValueError("Too many markers")
+
+    start, marker = markers[0]
+    line, column = divmod(start, columns)
+    if column == 1:
+        column = 0  # e.g. for known items view
+    return (line, column), marker.decode("latin-1")
+
+
+def _find_markers(screen, columns):
+    """
+    (start, marker) of all markers within a line of screen, plain byte searches are much faster than scanning
+    the whole screen with a regex
+    """
+    found = []
+    for marker in MARKERS:
+        start = screen.find(marker)
+        while start >= 0:
+            if start // columns == (start + len(marker) - 1) // columns:
+                found.append((start, marker))
+            start = screen.find(marker, start + len(marker))
+
+    # (X of N) is only matched with a regex where " of " occurs
+    of = screen.find(b" of ")
+    while of >= 0:
+        line_start = of - of % columns
+        start = screen.rfind(b"(", line_start, of)
+        match = PAGE_MARKER_REGEX.match(screen, start, line_start + columns) if start >= 0 else None
+        if match is not None and match.end() > of:
+            found.append((start, match.group()))
+        of = screen.find(b" of ", of + 4)
+    return found
+
+
+def message_and_popup(message, tty_chars):
+    """
+    Split the screen into the message and the popup (e.g. a menu or a long message) shown above a marker.
+
+    message: the decoded message observation, used to find how many screen lines it spans
+    tty_chars: (rows, columns) uint8 screen
+    Returns (message, popup lines, marker), marker is None if the screen doesn't have one.
+    """
+    columns = tty_chars.shape[-1]
+    screen = screen_bytes(tty_chars)
+    marker_pos, marker = find_marker(screen, columns)
+    if marker_pos is None:
+        return message, [], None
+    marker_line, marker_column = marker_pos
+    # lines up to the marker, the marker line cut before the marker
+    lines = [screen[i * columns : (i + 1) * columns] for i in range(marker_line)]
+    lines.append(screen[marker_line * columns : marker_line * columns + marker_column])
+
+    message_lines_count = 0
+    if message:
+        # the message is wrapped over the first lines, compare ignoring non-alphanumeric characters because
+        # wrapping doesn't preserve them (e.g. spaces, '#' at the beginning of a line, a missing trailing '.')
+        target = message.encode("latin-1", errors="replace").translate(None, _NOT_ALNUM)
+        prefix = b""
+        for line in lines:
+            message_lines_count += 1
+            prefix += line.translate(None, _NOT_ALNUM)
+            if prefix == target:
+                break
+        else:
+            if marker_line == 0:
+                return message, [], marker
+            screen = "".join(line.decode("latin-1").strip() for line in lines)
+            raise ValueError(f"Message:\n{repr(message)}\ndoesn't match the screen:\n{repr(screen)}")
+
+    popup = []
+    for line in lines[message_lines_count:marker_line]:
+        line = line[marker_column:].strip()
+        if line:
+            popup.append(line.decode("latin-1"))
+    return message, popup, marker
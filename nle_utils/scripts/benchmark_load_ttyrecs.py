@@ -0,0 +1,75 @@
+import argparse
+import os
+import time
+from glob import glob
+
+import numpy as np
+
+from nle_utils.ttyrec.load_ttyrecs import LoadTtyrecs
+from nle_utils.ttyrec.read_ttyrec import ReadTtyrec
+
+
+def read_sequential(ttyrecs, ttyrec_version, batch_size, seq_length):
+    """Frames/s of `ReadTtyrec` copying frames one by one into (batch_size, seq_length) batches"""
+    reader = ReadTtyrec(ttyrec_version)
+    chars = np.zeros((batch_size * seq_length, *reader.chars.shape[1:]), dtype=np.uint8)
+    colors = np.zeros((batch_size * seq_length, *reader.colors.shape[1:]), dtype=np.int8)
+    frames, i = 0, 0
+    start = time.perf_counter()
+    for ttyrec in ttyrecs:
+        for frame in reader.read(ttyrec):
+            chars[i], colors[i] = frame[0], frame[1]
+            i = (i + 1) % len(chars)
+            frames += 1
+    return frames, frames / (time.perf_counter() - start)
+
+
+def read_chunked(ttyrecs, ttyrec_version, chunk_len):
+    """Frames/s of `ReadTtyrec.read_chunks` into reused buffers"""
+    reader = ReadTtyrec(ttyrec_version, seq_length=chunk_len)
+    frames = 0
+    start = time.perf_counter()
+    for ttyrec in ttyrecs:
+        for chars, *_ in reader.read_chunks(ttyrec):
+            frames += len(chars)
+    return frames, frames / (time.perf_counter() - start)
+
+
+def read_parallel(ttyrecs, ttyrec_version, batch_size, seq_length, num_workers):
+    """Frames/s of `LoadTtyrecs`"""
+    loader = LoadTtyrecs(ttyrecs, ttyrec_version, batch_size, seq_length, num_workers=num_workers)
+    frames = 0
+    start = time.perf_counter()
+    for batch in loader:
+        frames += int((batch["file_ids"] >= 0).sum())
+    return frames, frames / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ttyrec", type=str, help="directory of ttyrec files")
+    parser.add_argument("--ttyrec_version", type=int, default=3)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--seq_length", type=int, default=50)
+    parser.add_argument("--chunk_lens", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--num_workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    flags = parser.parse_args()
+    print(flags)
+
+    if os.path.isdir(flags.ttyrec):
+        data = sorted(glob(f"{flags.ttyrec}/**/*ttyrec*", recursive=True))
+    else:
+        data = [flags.ttyrec]
+
+    frames, fps = read_sequential(data, flags.ttyrec_version, flags.batch_size, flags.seq_length)
+    print(f"ReadTtyrec.read:              {frames} frames, {fps:10.1f} frames/s")
+    for chunk_len in flags.chunk_lens:
+        chunked_frames, chunked_fps = read_chunked(data, flags.ttyrec_version, chunk_len)
+        assert chunked_frames == frames, (chunked_frames, frames)
+        print(f"read_chunks {chunk_len:4d} frames: {chunked_frames} frames, {chunked_fps:10.1f} frames/s")
+    for num_workers in flags.num_workers:
+        parallel_frames, parallel_fps = read_parallel(
+            data, flags.ttyrec_version, flags.batch_size, flags.seq_length, num_workers
+        )
+        assert parallel_frames == frames, (parallel_frames, frames)
+        print(f"LoadTtyrecs {num_workers:2d} workers:      {parallel_frames} frames, {parallel_fps:10.1f} frames/s")
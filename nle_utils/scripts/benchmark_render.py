@@ -0,0 +1,100 @@
+import argparse
+import time
+import tracemalloc
+
+import gymnasium as gym
+import nle  # noqa: F401
+import numpy as np
+
+from nle_utils.visualize import History, Visualize
+
+RENDER_KEYS = (
+    "glyphs",
+    "blstats",
+    "message",
+    "inv_glyphs",
+    "inv_letters",
+    "inv_oclasses",
+    "inv_strs",
+    "tty_chars",
+    "tty_colors",
+)
+
+
+def collect_observations(env_name, batch_size, seed):
+    """Play random actions and stack `batch_size` consecutive observations along a new batch axis"""
+    env = gym.make(env_name)
+    obs, info = env.reset(seed=seed)
+    env.action_space.seed(seed)
+
+    observations = []
+    while len(observations) < batch_size:
+        observations.append({key: obs[key].copy() for key in RENDER_KEYS})
+        obs, reward, term, trun, info = env.step(env.action_space.sample())
+        if term or trun:
+            obs, info = env.reset()
+    env.close()
+
+    return {key: np.stack([o[key] for o in observations]) for key in RENDER_KEYS}
+
+
+def benchmark(function, repeats):
+    function()  # warmup, e.g. numba compilation
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def peak_allocation(function):
+    """Peak memory (in bytes) allocated by a single steady-state call of function"""
+    function()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, default="NetHackChallenge-v0")
+    parser.add_argument("--tileset_path", type=str, default="tilesets/3.6.1tiles32.png")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max_render_alloc_kib",
+        type=float,
+        default=None,
+        help="fail if a steady-state `render` call allocates more than this (e.g. 1024)",
+    )
+    flags = parser.parse_args()
+    print(flags)
+
+    batch = collect_observations(flags.env, flags.batch_size, flags.seed)
+    visualizer = Visualize(tileset_path=flags.tileset_path)
+    infos = [{}] * flags.batch_size
+    histories = [History() for _ in range(flags.batch_size)]
+    out = np.zeros((flags.batch_size, *visualizer.frame_shape()), dtype=np.uint8)
+
+    def loop():
+        for i in range(flags.batch_size):
+            visualizer.history = histories[i]
+            visualizer.render(*(batch[key][i] for key in RENDER_KEYS), infos[i])
+
+    def batched():
+        visualizer.render_batch(*(batch[key] for key in RENDER_KEYS), infos, histories=histories, out=out)
+
+    loop_time = benchmark(loop, flags.repeats)
+    batch_time = benchmark(batched, flags.repeats)
+
+    print(f"render loop:  {loop_time * 1000:.1f} ms/batch, {flags.batch_size / loop_time:.1f} frames/s")
+    print(f"render_batch: {batch_time * 1000:.1f} ms/batch, {flags.batch_size / batch_time:.1f} frames/s")
+    print(f"speedup: {loop_time / batch_time:.2f}x")
+
+    visualizer.history = histories[0]
+    render_alloc = peak_allocation(lambda: visualizer.render(*(batch[key][0] for key in RENDER_KEYS), infos[0]))
+    print(f"render peak allocation: {render_alloc / 1024:.1f} KiB")
+    if flags.max_render_alloc_kib is not None and render_alloc > flags.max_render_alloc_kib * 1024:
+        raise SystemExit(f"render allocated {render_alloc / 1024:.1f} KiB > {flags.max_render_alloc_kib} KiB")
@@ -0,0 +1,130 @@
+import argparse
+import re
+import time
+
+import gymnasium as gym
+import nle  # noqa: F401
+import numpy as np
+
+from nle_utils import screen
+
+
+def collect_screens(env_name, num_screens, seed):
+    """Message and tty_chars observations of an episode played with random actions"""
+    env = gym.make(env_name)
+    obs, info = env.reset(seed=seed)
+    env.action_space.seed(seed)
+
+    screens = []
+    while len(screens) < num_screens:
+        screens.append((obs["message"].copy(), obs["tty_chars"].copy()))
+        obs, reward, term, trun, info = env.step(env.action_space.sample())
+        if term or trun:
+            obs, info = env.reset()
+    env.close()
+
+    return screens
+
+
+def reference_find_marker(lines):
+    """The per-line regex search `AutoMore` used before `nle_utils.screen`"""
+    regex = re.compile(r"(--More--|\(end\)|\(\d+ of \d+\))")
+    if len(regex.findall(" ".join(lines))) > 1:
+        raise ValueError("Too many markers")
+
+    result, marker_type = None, None
+    for i, line in enumerate(lines):
+        res = regex.findall(line)
+        if res:
+            assert len(res) == 1
+            j = line.find(res[0])
+            result, marker_type = (i, j), res[0]
+            break
+
+    if result is not None and result[1] == 1:
+        result = (result[0], 0)
+    return result, marker_type
+
+
+def reference_message_and_popup(message, tty_chars):
+    """The per-character decoding and quadratic prefix matching `AutoMore` used before `nle_utils.screen`"""
+    message = bytes(message).decode("latin-1").strip("\0").strip()
+
+    popup = []
+    lines = [bytes(line).decode("latin-1").strip("\0") for line in tty_chars]
+    marker_pos, marker_type = reference_find_marker(lines)
+    if marker_pos is None:
+        return message, popup, None
+
+    pref = ""
+    message_lines_count = 0
+    if message:
+        for i, line in enumerate(lines[: marker_pos[0] + 1]):
+            if i == marker_pos[0]:
+                line = line[: marker_pos[1]]
+            message_lines_count += 1
+            pref += line.strip()
+
+            def replace_func(x):
+                return "".join(c for c in x if c.isalnum())
+
+            if replace_func(pref) == replace_func(message):
+                break
+        else:
+            if marker_pos[0] == 0:
+                return message, popup, marker_type
+            raise ValueError(f"Message:\n{repr(message)}\ndoesn't match the screen:\n{repr(pref)}")
+
+    for line in lines[message_lines_count : marker_pos[0]] + [lines[marker_pos[0]][: marker_pos[1]]]:
+        line = line[marker_pos[1] :].strip()
+        if line:
+            popup.append(line)
+
+    return message, popup, marker_type
+
+
+def optimized_message_and_popup(message, tty_chars):
+    return screen.message_and_popup(screen.decode(message).strip(), tty_chars)
+
+
+def parse_all(function, screens):
+    results = []
+    for message, tty_chars in screens:
+        try:
+            results.append(function(message, tty_chars))
+        except ValueError as e:
+            results.append(type(e))
+    return results
+
+
+def benchmark(function, screens, repeats):
+    parse_all(function, screens)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        parse_all(function, screens)
+    return (time.perf_counter() - start) / repeats / len(screens)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, default="NetHackChallenge-v0")
+    parser.add_argument("--num_screens", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    flags = parser.parse_args()
+    print(flags)
+
+    screens = collect_screens(flags.env, flags.num_screens, flags.seed)
+
+    expected = parse_all(reference_message_and_popup, screens)
+    results = parse_all(optimized_message_and_popup, screens)
+    mismatches = sum(e != r for e, r in zip(expected, results))
+    with_marker = sum(not isinstance(r, type) and r[2] is not None for r in results)
+    print(f"{len(screens)} screens, {with_marker} with a marker, {mismatches} results differ from the reference")
+    assert mismatches == 0
+
+    reference_time = benchmark(reference_message_and_popup, screens, flags.repeats)
+    optimized_time = benchmark(optimized_message_and_popup, screens, flags.repeats)
+    print(f"reference: {reference_time * 1e6:7.1f} us/screen")
+    print(f"optimized: {optimized_time * 1e6:7.1f} us/screen")
+    print(f"speedup: {reference_time / optimized_time:.2f}x")
@@ -0,0 +1,87 @@
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+import time
+from glob import glob
+from pathlib import Path
+
+import numpy as np
+
+from nle_utils.ttyrec.read_ttyrec import ReadTtyrec
+from nle_utils.ttyrec.stream_ttyrec import StreamTtyrec, open_ttyrec
+
+COMPRESSORS = {"bz2": bz2.compress, "gz": gzip.compress, "xz": lzma.compress, "none": lambda data: data}
+
+
+def recompress(ttyrecs, formats, output_dir):
+    """format -> copies of the ttyrecs in that format (their names end with ttyrec<version>[.<format>])"""
+    paths = {fmt: [] for fmt in formats}
+    for i, ttyrec in enumerate(ttyrecs):
+        with open_ttyrec(ttyrec) as f:
+            data = f.read()
+        name = Path(ttyrec).name.split(".ttyrec")[0]
+        version = Path(ttyrec).name.split(".ttyrec")[1].split(".")[0]
+        for fmt in formats:
+            path = os.path.join(output_dir, f"{i}-{name}.ttyrec{version}" + ("" if fmt == "none" else f".{fmt}"))
+            with open(path, "wb") as f:
+                f.write(COMPRESSORS[fmt](data))
+            paths[fmt].append(path)
+    return paths
+
+
+def benchmark(read_chunks, ttyrecs, consumer_ms):
+    """(frames, seconds) to read the ttyrecs, sleeping consumer_ms per chunk to stand for the consumer's work"""
+    frames = 0
+    start = time.perf_counter()
+    for ttyrec in ttyrecs:
+        for chunk in read_chunks(ttyrec):
+            frames += len(chunk.chars)
+            if consumer_ms > 0:
+                time.sleep(consumer_ms / 1000)
+    return frames, time.perf_counter() - start
+
+
+def checksum(read_chunks, ttyrec):
+    return sum(int(np.sum(chunk.chars, dtype=np.int64)) for chunk in read_chunks(ttyrec))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ttyrec", type=str, help="ttyrec file or directory of ttyrecs")
+    parser.add_argument("--ttyrec_version", type=int, default=3)
+    parser.add_argument("--chunk_len", type=int, default=1000)
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--consumer_ms", type=float, default=0.0, help="simulated work per chunk of the consumer")
+    parser.add_argument("--formats", type=str, nargs="+", default=["bz2", "gz", "xz", "none"])
+    flags = parser.parse_args()
+    print(flags)
+
+    if os.path.isdir(flags.ttyrec):
+        data = sorted(glob(f"{flags.ttyrec}/**/*ttyrec*", recursive=True))
+    else:
+        data = [flags.ttyrec]
+
+    reader = ReadTtyrec(flags.ttyrec_version, seq_length=flags.chunk_len)
+    stream = StreamTtyrec(flags.ttyrec_version, chunk_len=flags.chunk_len, prefetch=flags.prefetch)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = recompress(data, flags.formats, tmp_dir)
+        raw_mb = sum(len(open_ttyrec(ttyrec).read()) for ttyrec in data) / 1e6
+
+        # today's path: Converter.load_ttyrec reads the bz2 files inline
+        bz2_paths = paths.get("bz2") or recompress(data, ["bz2"], tmp_dir)["bz2"]
+        expected = [checksum(reader.read_chunks, ttyrec) for ttyrec in bz2_paths]
+        frames, seconds = benchmark(reader.read_chunks, bz2_paths, flags.consumer_ms)
+        print(f"{'ReadTtyrec bz2':20s} {raw_mb / seconds:8.2f} MB/s {frames / seconds:10.1f} frames/s")
+
+        for fmt, ttyrecs in paths.items():
+            assert [checksum(stream.read_chunks, ttyrec) for ttyrec in ttyrecs] == expected, fmt
+            input_mb = sum(os.path.getsize(ttyrec) for ttyrec in ttyrecs) / 1e6
+            frames, seconds = benchmark(stream.read_chunks, ttyrecs, flags.consumer_ms)
+            print(
+                f"{'StreamTtyrec ' + fmt:20s} {raw_mb / seconds:8.2f} MB/s {frames / seconds:10.1f} frames/s "
+                f"({input_mb / seconds:.2f} MB/s of {fmt} input)"
+            )
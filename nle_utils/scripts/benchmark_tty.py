@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import gymnasium as gym
+import nle  # noqa: F401
+import numba
+import numpy as np
+
+from nle_utils.visualize import _as_rows, _tile_characters_to_image, load_char_sprites, rasterize_ttys
+
+
+def collect_ttys(env_name, batch_size, seed):
+    """tty_chars and tty_colors of `batch_size` consecutive observations played with random actions"""
+    env = gym.make(env_name)
+    obs, info = env.reset(seed=seed)
+    env.action_space.seed(seed)
+
+    chars, colors = [], []
+    while len(chars) < batch_size:
+        chars.append(obs["tty_chars"].copy())
+        colors.append(obs["tty_colors"].copy())
+        obs, reward, term, trun, info = env.step(env.action_space.sample())
+        if term or trun:
+            obs, info = env.reset()
+    env.close()
+
+    return np.stack(chars), np.stack(colors)
+
+
+def benchmark(function, repeats):
+    function()  # warmup, e.g. numba compilation
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, default="NetHackChallenge-v0")
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--font_size", type=int, default=9)
+    parser.add_argument("--char_width", type=int, default=12)
+    parser.add_argument("--char_height", type=int, default=22)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    flags = parser.parse_args()
+    print(flags)
+
+    tty_chars, tty_colors = collect_ttys(flags.env, flags.batch_size, flags.seed)
+    char_sprites = load_char_sprites(flags.font_size, (flags.char_width, flags.char_height))
+    batch_size, rows, cols = tty_chars.shape
+
+    serial_out = np.zeros((batch_size, rows * flags.char_height, cols * flags.char_width, 3), dtype=np.uint8)
+    parallel_out = np.zeros_like(serial_out)
+
+    def serial():
+        for i in range(batch_size):
+            _tile_characters_to_image(
+                _as_rows(serial_out[i]), tty_chars[i], tty_colors[i], rows, cols, char_sprites, 0, 0
+            )
+
+    def parallel():
+        rasterize_ttys(tty_chars, tty_colors, char_sprites, out=parallel_out, parallel=True)
+
+    serial_time = benchmark(serial, flags.repeats)
+    print(f"serial:     {serial_time * 1000:7.1f} ms/batch, {batch_size / serial_time:8.1f} frames/s")
+
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    for threads in flags.threads:
+        if threads > max_threads:
+            print(f"skipping {threads} threads, numba is limited to {max_threads} (NUMBA_NUM_THREADS)")
+            continue
+        numba.set_num_threads(threads)
+        parallel_out[:] = 0
+        parallel_time = benchmark(parallel, flags.repeats)
+        assert np.array_equal(parallel_out, serial_out), f"{threads} threads output differs from the serial loop"
+        print(
+            f"{threads:2d} threads: {parallel_time * 1000:7.1f} ms/batch, {batch_size / parallel_time:8.1f} frames/s, "
+            f"speedup: {serial_time / parallel_time:.2f}x"
+        )
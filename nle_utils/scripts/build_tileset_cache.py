@@ -0,0 +1,14 @@
+import argparse
+
+from nle_utils.tileset import load_tiles
+from nle_utils.utils.cache import cache_dir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuild the memory-mapped tileset cache used by Visualize")
+    parser.add_argument("--tileset_path", type=str, default="tilesets/3.6.1tiles32.png")
+    parser.add_argument("--tile_size", type=int, default=32)
+    flags = parser.parse_args()
+    print(flags)
+
+    tiles = load_tiles(flags.tileset_path, flags.tile_size)
+    print(f"cached {tiles.shape[0]} tiles in {cache_dir()}")
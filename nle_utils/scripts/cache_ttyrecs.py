@@ -0,0 +1,60 @@
+import argparse
+import os
+from glob import glob
+from pathlib import Path
+
+from nle_utils.parallel_utils import Result, run_parallel
+from nle_utils.ttyrec.read_ttyrec import get_ttyrec_version
+from nle_utils.ttyrec.ttyrec_cache import (
+    CHUNK_LEN,
+    COMPRESSIONS,
+    default_cache_dir,
+    open_ttyrec_cache,
+    ttyrec_cache_path,
+    write_ttyrec_cache,
+)
+
+
+def worker(ttyrec_path: str, cache_dir: str, ttyrec_version, chunk_len, compression, overwrite) -> Result:
+    sample_name = Path(ttyrec_path).name
+
+    if get_ttyrec_version(ttyrec_path) != ttyrec_version:
+        return Result(description=sample_name, log_msg=f"file is not a version {ttyrec_version} ttyrec")
+    if not overwrite and open_ttyrec_cache(ttyrec_path, cache_dir) is not None:
+        return Result(description=sample_name, log_msg="up to date")
+
+    path = write_ttyrec_cache(
+        ttyrec_path, ttyrec_cache_path(ttyrec_path, cache_dir), ttyrec_version, chunk_len, compression
+    )
+    return Result(description=sample_name, log_msg=f"{os.path.getsize(ttyrec_path)} bytes -> {_size(path)} bytes")
+
+
+def _size(path):
+    return sum(f.stat().st_size for f in Path(path).iterdir())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Decode ttyrecs once into compressed columnar caches, read by ReadTtyrec(cache_dir=...)"
+    )
+    parser.add_argument("--ttyrec", type=str)
+    parser.add_argument("--cache_dir", type=str, default=str(default_cache_dir()))
+    parser.add_argument("--ttyrec_version", type=int, default=3)
+    parser.add_argument("--chunk_len", type=int, default=CHUNK_LEN)
+    parser.add_argument("--compression", type=str, default="zlib", choices=list(COMPRESSIONS))
+    parser.add_argument("--overwrite", action="store_true", help="rewrite caches that are up to date")
+    parser.add_argument("--n_jobs", type=int, default=8)
+    flags = parser.parse_args()
+    print(flags)
+
+    if os.path.isdir(flags.ttyrec):
+        data = [filename for filename in glob(f"{flags.ttyrec}/**/*ttyrec*", recursive=True)]
+    else:
+        data = (flags.ttyrec,)
+
+    run_parallel(
+        function=worker,
+        iterable=data,
+        function_args=(flags.cache_dir, flags.ttyrec_version, flags.chunk_len, flags.compression, flags.overwrite),
+        n_jobs=flags.n_jobs,
+    )
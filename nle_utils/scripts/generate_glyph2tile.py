@@ -0,0 +1,20 @@
+import argparse
+import importlib.resources
+
+import numpy as np
+from nle import nethack
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate the packaged glyph -> tile index table from NLE")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=str(importlib.resources.files("nle_utils") / "data" / "glyph2tile.npy"),
+    )
+    flags = parser.parse_args()
+    print(flags)
+
+    glyph2tile = np.array(nethack.glyph2tile, dtype=np.int16)
+    assert glyph2tile.shape == (nethack.MAX_GLYPH,)
+    np.save(flags.output, glyph2tile)
+    print(f"saved {glyph2tile.shape[0]} glyphs (max tile {glyph2tile.max()}) to {flags.output}")
@@ -6,8 +6,8 @@ from nle_utils.utils.utils import str2bool
 
 
 def worker(flags):
-    env = PrintTtyrec(flags.ttyrec_version)
-    env.render(flags.ttyrec)
+    env = PrintTtyrec(flags.ttyrec_version, cache_dir=flags.cache_dir)
+    env.render(flags.ttyrec, max_fps=flags.max_fps, every=flags.every, start=flags.start, stop=flags.stop)
 
 
 if __name__ == "__main__":
@@ -15,7 +15,12 @@ if __name__ == "__main__":
     parser.add_argument("--ttyrec", type=str)
     parser.add_argument("--output_dir", type=str)
     parser.add_argument("--ttyrec_version", type=int, default=3)
+    parser.add_argument("--cache_dir", type=str, default=None, help="read ttyrec caches (see cache_ttyrecs.py)")
     parser.add_argument("--show", type=str2bool, default=False)
+    parser.add_argument("--max_fps", type=float, default=None, help="frames drawn per second, unlimited by default")
+    parser.add_argument("--every", type=int, default=1, help="fast-forward, draw only every n-th frame")
+    parser.add_argument("--start", type=int, default=0, help="first frame to play")
+    parser.add_argument("--stop", type=int, default=None)
     flags = parser.parse_args()
     print(flags)
 
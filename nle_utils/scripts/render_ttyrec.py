@@ -4,19 +4,27 @@ from glob import glob
 from pathlib import Path
 from typing import Tuple
 
+from nle_utils import warmup
 from nle_utils.parallel_utils import Result, run_parallel
 from nle_utils.ttyrec.read_ttyrec import get_ttyrec_version
-from nle_utils.ttyrec.render_ttyrec import RenderTtyrec
+from nle_utils.ttyrec.render_ttyrec import RenderTtyrec, render_ttyrec_parallel
 from nle_utils.utils.utils import str2bool
 
 
-def worker(ttyrec_path: str, output_dir: str, ttyrec_version, show) -> Result:
+def worker(ttyrec_path: str, output_dir: str, ttyrec_version, show, dedup, native_resolution, cache_dir) -> Result:
     sample_name = Path(ttyrec_path).name
 
     if get_ttyrec_version(ttyrec_path) is None:
         return Result(description=sample_name, log_msg="file is not ttyrec")
 
-    renderer = RenderTtyrec(output_dir, ttyrec_version, show=show)
+    renderer = RenderTtyrec(
+        output_dir,
+        ttyrec_version,
+        show=show,
+        dedup=dedup,
+        native_resolution=native_resolution,
+        cache_dir=cache_dir,
+    )
     renderer.render(ttyrec_path)
     renderer.close()
 
@@ -29,7 +37,28 @@ if __name__ == "__main__":
     parser.add_argument("--output_dir", type=str)
     parser.add_argument("--ttyrec_version", type=int, default=3)
     parser.add_argument("--show", type=str2bool, default=False)
+    parser.add_argument("--dedup", type=str2bool, default=False)
+    parser.add_argument(
+        "--native_resolution",
+        type=str2bool,
+        default=False,
+        help="rasterize the terminal at the video size instead of resizing it",
+    )
+    parser.add_argument("--cache_dir", type=str, default=None, help="read ttyrec caches (see cache_ttyrecs.py)")
     parser.add_argument("--n_jobs", type=int, default=8)
+    parser.add_argument(
+        "--split",
+        type=str2bool,
+        default=None,
+        help="render each ttyrec with n_jobs workers on segments of it, by default only when --ttyrec is a file "
+        "and --show is off (the segments are rendered in worker processes, they can't be shown)",
+    )
+    parser.add_argument(
+        "--reencode",
+        type=str2bool,
+        default=False,
+        help="with --split, join the segments by re-encoding them with OpenCV (lossy) when ffmpeg isn't installed",
+    )
     flags = parser.parse_args()
     print(flags)
 
@@ -38,10 +67,36 @@ if __name__ == "__main__":
     else:
         data = (flags.ttyrec,)
 
-    total = len(data)
-    run_parallel(
-        function=worker,
-        iterable=data,
-        function_args=(flags.output_dir, flags.ttyrec_version, flags.show),
-        n_jobs=flags.n_jobs,
-    )
+    if flags.split and flags.show:
+        parser.error("--show can't be used with --split, the segments are rendered in worker processes")
+    split = flags.split if flags.split is not None else not (os.path.isdir(flags.ttyrec) or flags.show)
+    if split:
+        for ttyrec in data:
+            if get_ttyrec_version(ttyrec) is None:
+                print(f"{ttyrec}: file is not ttyrec")
+                continue
+            render_ttyrec_parallel(
+                ttyrec,
+                flags.output_dir,
+                n_jobs=flags.n_jobs,
+                ttyrec_version=flags.ttyrec_version,
+                dedup=flags.dedup,
+                native_resolution=flags.native_resolution,
+                cache_dir=flags.cache_dir,
+                reencode=flags.reencode,
+            )
+    else:
+        run_parallel(
+            function=worker,
+            iterable=data,
+            function_args=(
+                flags.output_dir,
+                flags.ttyrec_version,
+                flags.show,
+                flags.dedup,
+                flags.native_resolution,
+                flags.cache_dir,
+            ),
+            n_jobs=flags.n_jobs,
+            initializer=warmup,
+        )
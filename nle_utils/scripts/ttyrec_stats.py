@@ -0,0 +1,38 @@
+import argparse
+import os
+from glob import glob
+
+from nle_utils.ttyrec.ttyrec_stats import STATS_CHUNK_LEN, update_ttyrec_stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per game statistics of ttyrecs, one row per ttyrec")
+    parser.add_argument("--ttyrec", type=str, help="ttyrec file or directory of ttyrecs")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="ttyrec_stats.csv",
+        help=".csv or .parquet (needs pandas and pyarrow, the pandas extra)",
+    )
+    parser.add_argument("--ttyrec_version", type=int, default=3)
+    parser.add_argument("--chunk_len", type=int, default=STATS_CHUNK_LEN)
+    parser.add_argument("--cache_dir", type=str, default=None, help="read ttyrec caches (see cache_ttyrecs.py)")
+    parser.add_argument("--overwrite", action="store_true", help="recompute the rows that are up to date")
+    parser.add_argument("--n_jobs", type=int, default=8)
+    flags = parser.parse_args()
+    print(flags)
+
+    if os.path.isdir(flags.ttyrec):
+        data = [filename for filename in glob(f"{flags.ttyrec}/**/*ttyrec*", recursive=True)]
+    else:
+        data = (flags.ttyrec,)
+
+    processed = update_ttyrec_stats(
+        data,
+        flags.output,
+        flags.ttyrec_version,
+        chunk_len=flags.chunk_len,
+        cache_dir=flags.cache_dir,
+        overwrite=flags.overwrite,
+        n_jobs=flags.n_jobs,
+    )
+    print(f"{processed} ttyrecs processed, {len(data) - processed} skipped")
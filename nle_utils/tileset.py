@@ -0,0 +1,53 @@
+import functools
+import importlib.resources
+
+import cv2
+import numpy as np
+
+from nle_utils.utils.cache import cached_array, file_digest
+
+
+def slice_tileset(tileset_path, tile_size):
+    """Read a tileset image and return its tiles as a contiguous (num_tiles, tile_size, tile_size, 3) RGB array"""
+    tileset = cv2.imread(tileset_path)
+    if tileset is None:
+        raise FileNotFoundError(f"Tileset {tileset_path} not found")
+    if tileset.shape[0] % tile_size != 0 or tileset.shape[1] % tile_size != 0:
+        raise ValueError("Tileset and tile_size doesn't match modulo")
+
+    h = tileset.shape[0] // tile_size
+    w = tileset.shape[1] // tile_size
+    tiles = tileset[..., ::-1].reshape(h, tile_size, w, tile_size, 3).transpose(0, 2, 1, 3, 4)
+    return np.ascontiguousarray(tiles.reshape(h * w, tile_size, tile_size, 3))
+
+
+def resize_tiles(tiles, output_tile_size):
+    """Resize (num_tiles, size, size, 3) tiles to output_tile_size one by one, so that tiles don't bleed into each other"""
+    out = np.empty((len(tiles), output_tile_size, output_tile_size, 3), dtype=np.uint8)
+    for tile, out_tile in zip(tiles, out):
+        cv2.resize(tile, (output_tile_size, output_tile_size), dst=out_tile, interpolation=cv2.INTER_AREA)
+    return out
+
+
+def load_tiles(tileset_path, tile_size, output_tile_size=None):
+    """
+    Tiles of the tileset (resized to output_tile_size if given) from the on-disk cache (built on first use,
+    see scripts/build_tileset_cache.py), memory-mapped read-only so that all render workers share one copy
+    through the page cache
+    """
+    if output_tile_size is None or output_tile_size == tile_size:
+        key = (file_digest(tileset_path), tile_size)
+        return cached_array("tiles", key, lambda: slice_tileset(tileset_path, tile_size))
+
+    key = (file_digest(tileset_path), tile_size, output_tile_size)
+    return cached_array("tiles", key, lambda: resize_tiles(load_tiles(tileset_path, tile_size), output_tile_size))
+
+
+@functools.lru_cache(maxsize=None)
+def load_glyph2tile():
+    """
+    glyph -> tile index mapping, the packaged int16 table (see scripts/generate_glyph2tile.py) memory-mapped
+    read-only on first use
+    """
+    with importlib.resources.as_file(importlib.resources.files("nle_utils") / "data" / "glyph2tile.npy") as path:
+        return np.load(path, mmap_mode="r")
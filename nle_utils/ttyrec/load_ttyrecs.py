@@ -0,0 +1,249 @@
+import contextlib
+import multiprocessing as mp
+import queue
+import traceback
+from multiprocessing import shared_memory
+from typing import Optional, Sequence
+
+import numpy as np
+from nle.dataset import Converter
+
+from nle_utils.parallel_utils import get_physical_cores_count
+from nle_utils.ttyrec.read_ttyrec import (
+    COLUMNS,
+    ROWS,
+    SEQ_LENGTH,
+    TTYREC_V3,
+    TTYREC_VERSION,
+    TtyrecChunk,
+    get_ttyrec_version,
+)
+from nle_utils.ttyrec.ttyrec_cache import open_ttyrec_cache
+
+
+def batch_fields(batch_size, seq_length):
+    """name -> (shape, dtype) of the arrays of a `LoadTtyrecs` batch"""
+    return {
+        "chars": ((batch_size, seq_length, ROWS, COLUMNS), np.uint8),
+        "colors": ((batch_size, seq_length, ROWS, COLUMNS), np.int8),
+        "cursors": ((batch_size, seq_length, 2), np.int16),
+        "timestamps": ((batch_size, seq_length), np.int64),
+        "actions": ((batch_size, seq_length), np.uint8),
+        "scores": ((batch_size, seq_length), np.int32),
+        # index of the file in LoadTtyrecs.ttyrecs, -1 for padding after the last file of a lane
+        "file_ids": ((batch_size, seq_length), np.int32),
+        # first frame of a file
+        "done": ((batch_size, seq_length), np.bool_),
+    }
+
+
+def _slot_arrays(buffers, fields, num_slots):
+    """(num_slots, *shape) arrays of fields backed by the shared memory buffers"""
+    return {
+        name: np.ndarray((num_slots, *shape), dtype=dtype, buffer=buffers[name].buf)
+        for name, (shape, dtype) in fields.items()
+    }
+
+
+class _Lane:
+    """
+    A row of the batches, reads the files assigned to it one after another with its own Converter, or from their
+    caches in cache_dir
+    """
+
+    def __init__(self, ttyrec_version, file_ids, ttyrecs, cache_dir=None):
+        self.converter = Converter(ROWS, COLUMNS, ttyrec_version)
+        self.file_ids = iter(file_ids)
+        self.ttyrecs = ttyrecs
+        self.cache_dir = cache_dir
+        self.cache = None
+        self.position = 0
+        self.file_id = -1
+        self.new_file = False
+
+    def next_file(self):
+        """Load the next file, returns False if there isn't any left"""
+        self.file_id = next(self.file_ids, -1)
+        if self.file_id < 0:
+            return False
+        ttyrec = self.ttyrecs[self.file_id]
+        self.cache = open_ttyrec_cache(ttyrec, self.cache_dir) if self.cache_dir is not None else None
+        self.position = 0
+        if self.cache is None:
+            self.converter.load_ttyrec(ttyrec)
+        self.new_file = True
+        return True
+
+    def convert(self, chunk):
+        """Like Converter.convert: fill the chunk buffers, returns the number of frames left unfilled"""
+        if self.cache is None:
+            return self.converter.convert(*chunk)
+        frames = len(self.cache.read(self.position, self.position + len(chunk.chars), out=chunk).chars)
+        self.position += frames
+        return len(chunk.chars) - frames
+
+    def fill(self, arrays, b):
+        """Fill row b of the batch arrays, returns the number of frames read"""
+        seq_length = arrays["chars"].shape[1]
+        t = 0
+        while t < seq_length and self.file_id >= 0:
+            remaining = self.convert(TtyrecChunk(*(arrays[name][b, t:] for name in TtyrecChunk._fields)))
+            end = seq_length - remaining
+            arrays["file_ids"][b, t:end] = self.file_id
+            arrays["done"][b, t:end] = False
+            if end > t and self.new_file:
+                arrays["done"][b, t] = True
+                self.new_file = False
+            t = end
+            if remaining > 0:
+                # the file ended before the row was full
+                self.next_file()
+
+        if t < seq_length:
+            for name, array in arrays.items():
+                array[b, t:] = -1 if name == "file_ids" else 0
+        return t
+
+
+def _worker(ttyrecs, file_ids, ttyrec_version, batch_size, seq_length, cache_dir, buffer_names, num_slots, free, ready):
+    """Fill free slots with batches of the files file_ids and report them on ready, then report None"""
+    buffers, slots, arrays = {}, None, None
+    try:
+        fields = batch_fields(batch_size, seq_length)
+        buffers = {name: shared_memory.SharedMemory(name=buffer_name) for name, buffer_name in buffer_names.items()}
+        slots = _slot_arrays(buffers, fields, num_slots)
+
+        # files are dealt to the lanes round-robin, so that they run out at about the same time
+        lanes = [_Lane(ttyrec_version, file_ids[b::batch_size], ttyrecs, cache_dir) for b in range(batch_size)]
+        active = [lane.next_file() for lane in lanes]
+        while any(active):
+            slot = free.get()
+            arrays = {name: array[slot] for name, array in slots.items()}
+            frames = sum(lane.fill(arrays, b) for b, lane in enumerate(lanes))
+            active = [lane.file_id >= 0 for lane in lanes]
+            if frames > 0:
+                ready.put((slot, None))
+            else:
+                free.put(slot)
+        ready.put((None, None))
+    except Exception:
+        ready.put((None, traceback.format_exc()))
+    finally:
+        slots = arrays = None
+        for buffer in buffers.values():
+            buffer.close()
+
+
+class LoadTtyrecs:
+    """
+    Load many ttyrec files as (batch_size, seq_length) batches of frames, with worker processes.
+
+    The files are sharded across num_workers processes, each one has a Converter for each row of the batch and
+    fills whole batches into one of the prefetch shared memory slots, ahead of the consumer. A row continues
+    with the next file of the worker when a file ends, "done" marks the first frame of every file and
+    "file_ids" the file of every frame (-1 for the zero padding at the end of the last batches).
+
+    Iterating yields dicts of the `batch_fields` arrays. They are views of a shared memory slot that is
+    handed back to the workers when the next batch is requested, copy them to keep them longer.
+    Batches of different workers are interleaved in the order they are ready.
+    """
+
+    def __init__(
+        self,
+        ttyrecs: Sequence[str],
+        ttyrec_version: TTYREC_VERSION = TTYREC_V3,
+        batch_size: int = 32,
+        seq_length: int = SEQ_LENGTH,
+        num_workers: Optional[int] = None,
+        prefetch: Optional[int] = None,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        num_workers: number of processes, by default the number of physical cores (at most one per file).
+        prefetch: number of shared memory slots, batches can be ready or being filled in all but the one held
+            by the consumer. By default two per worker.
+        shuffle: deal the files to the workers in a random order (with seed) instead of the given one.
+        cache_dir: read the files from their caches in cache_dir when they are up to date (see `ReadTtyrec`).
+        """
+        for ttyrec in ttyrecs:
+            if get_ttyrec_version(ttyrec) != ttyrec_version:
+                raise ValueError(f"{ttyrec} is not a version {ttyrec_version} ttyrec")
+
+        self.ttyrecs = list(ttyrecs)
+        self.ttyrec_version = ttyrec_version
+        self.batch_size = batch_size
+        self.seq_length = seq_length
+        if num_workers is None or num_workers <= 0:
+            num_workers = get_physical_cores_count()
+        self.num_workers = max(1, min(num_workers, len(self.ttyrecs)))
+        self.prefetch = prefetch or 2 * self.num_workers
+        self.shuffle = shuffle
+        self.seed = seed
+        self.cache_dir = cache_dir
+
+    def __iter__(self):
+        file_ids = np.arange(len(self.ttyrecs))
+        if self.shuffle:
+            np.random.default_rng(self.seed).shuffle(file_ids)
+        # +1 slot for the batch held by the consumer
+        num_slots = self.prefetch + 1
+
+        fields = batch_fields(self.batch_size, self.seq_length)
+        buffers, processes = {}, []
+        try:
+            for name, (shape, dtype) in fields.items():
+                size = num_slots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+                buffers[name] = shared_memory.SharedMemory(create=True, size=size)
+            slots = _slot_arrays(buffers, fields, num_slots)
+
+            free, ready = mp.Queue(), mp.Queue()
+            for slot in range(num_slots):
+                free.put(slot)
+            for worker in range(self.num_workers):
+                process = mp.Process(
+                    target=_worker,
+                    args=(
+                        self.ttyrecs,
+                        file_ids[worker :: self.num_workers].tolist(),
+                        self.ttyrec_version,
+                        self.batch_size,
+                        self.seq_length,
+                        self.cache_dir,
+                        {name: buffer.name for name, buffer in buffers.items()},
+                        num_slots,
+                        free,
+                        ready,
+                    ),
+                    daemon=True,
+                )
+                process.start()
+                processes.append(process)
+
+            running = self.num_workers
+            while running > 0:
+                try:
+                    slot, error = ready.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError("ttyrec loader workers exited without finishing")
+                    continue
+                if error is not None:
+                    raise RuntimeError(f"ttyrec loader worker failed:\n{error}")
+                if slot is None:
+                    running -= 1
+                    continue
+                yield {name: array[slot] for name, array in slots.items()}
+                free.put(slot)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            slots = None
+            for buffer in buffers.values():
+                buffer.unlink()
+                # the consumer may still hold views of the last batch, the memory is released with them
+                with contextlib.suppress(BufferError):
+                    buffer.close()
@@ -1,26 +1,119 @@
+import sys
 import time
+from typing import Optional
 
-from nle import nethack
+import numpy as np
 from nle.nethack.actions import _ACTIONS_DICT
 
-from nle_utils.ttyrec.read_ttyrec import TTYREC_VERSION, ReadTtyrec
+from nle_utils.ttyrec.read_ttyrec import ROWS, TTYREC_V3, TTYREC_VERSION, ReadTtyrec
+
+# select graphic rendition of the 16 tty colors, & 8 is brightness (as in nethack.tty_render)
+SGR = ["\033[%d;3%dm" % (bool(color & 8), color & ~8) for color in range(16)]
+
+
+class AnsiScreen:
+    """
+    Draws ttys on an ANSI terminal in place, writing only the cells that changed since the previous frame:
+    runs of changed cells of the same color are written after a cursor movement, the rest of the screen is
+    left as it is.
+    """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self._chars = None
+        self._colors = None
+
+    def draw(self, chars: np.ndarray, colors: np.ndarray, cursor=None, status: str = "") -> str:
+        """The escape sequences drawing the frame (and a status line below it), to write in a single call"""
+        colors = colors & 15
+        if self._chars is None:
+            parts = ["\033[2J"]
+            changed = np.ones(chars.shape, dtype=bool)
+        else:
+            parts = []
+            changed = (chars != self._chars) | (colors != self._colors)
+        self._chars, self._colors = chars.copy(), colors
+
+        ys, xs = np.nonzero(changed)
+        if len(ys):
+            cell_colors = colors[ys, xs]
+            jump = np.ones(len(ys), dtype=bool)
+            jump[1:] = (ys[1:] != ys[:-1]) | (xs[1:] != xs[:-1] + 1)
+            recolor = np.ones(len(ys), dtype=bool)
+            recolor[1:] = cell_colors[1:] != cell_colors[:-1]
+            starts = np.flatnonzero(jump | recolor)
+            ends = np.append(starts[1:], len(ys))
+
+            color = None
+            for start, end, y, x, run_color, run_jump in zip(
+                starts, ends, ys[starts], xs[starts], cell_colors[starts], jump[starts]
+            ):
+                if run_jump:
+                    parts.append(f"\033[{y + 1};{x + 1}H")
+                if run_color != color:
+                    parts.append(SGR[run_color])
+                    color = run_color
+                parts.append(chars[y, x : x + end - start].tobytes().decode("latin1"))
+
+        parts.append(f"\033[0m\033[{ROWS + 1};1H\033[K{status}")
+        if cursor is not None:
+            parts.append(f"\033[{int(cursor[0]) + 1};{int(cursor[1]) + 1}H")
+        return "".join(parts)
+
+    def write(self, chars: np.ndarray, colors: np.ndarray, cursor=None, status: str = ""):
+        self.out.write(self.draw(chars, colors, cursor, status))
+        self.out.flush()
+
+    def reset(self):
+        """Forget the drawn frame, the next one is drawn on a cleared screen"""
+        self._chars = self._colors = None
+
+    def close(self):
+        self.out.write(f"\033[0m\033[{ROWS + 2};1H\n")
+        self.out.flush()
 
 
 class PrintTtyrec:
-    def __init__(self, ttyrec_version=TTYREC_VERSION):
-        self.reader = ReadTtyrec(ttyrec_version)
+    def __init__(self, ttyrec_version: TTYREC_VERSION = TTYREC_V3, cache_dir=None, out=None):
+        self.reader = ReadTtyrec(ttyrec_version, cache_dir=cache_dir)
+        self.screen = AnsiScreen(out)
 
-    def render(self, ttyrec: str):
-        stream = self.reader.read(ttyrec)
+    def render(
+        self,
+        ttyrec: str,
+        max_fps: Optional[float] = None,
+        every: int = 1,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ):
+        """
+        Play frames [start, stop) of ttyrec in the terminal (see `AnsiScreen`).
+        max_fps: draw at most max_fps frames per second, waiting between them (unlimited by default).
+        every: fast-forward, only draw every n-th frame (the others are decoded but not drawn).
+        The status line shows the frames decoded per second (SPS), the timestamp and the action of the frame.
+        """
+        stream = self.reader.read(ttyrec, start, stop)
+        period = 1 / max_fps if max_fps else 0.0
 
-        start = time.time()
+        self.screen.reset()
+        begin = next_draw = time.perf_counter()
         i = 0
         for chars, colors, cursors, timestamps, actions, scores in stream:
-            elapsed = time.time() - start
-            print(nethack.tty_render(chars, colors, cursors))
-            print(f"SPS: {i / elapsed}")
-            print(f"Timestamp: {timestamps}")
-            print(f"action: {_ACTIONS_DICT[actions]}")
             i += 1
+            if (i - 1) % every:
+                continue
+            if period:
+                delay = next_draw - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_draw = max(next_draw + period, time.perf_counter())
+
+            elapsed = time.perf_counter() - begin
+            status = (
+                f"frame: {start + i - 1} SPS: {i / elapsed if elapsed else 0:.0f} Timestamp: {timestamps} "
+                f"action: {_ACTIONS_DICT.get(int(actions), actions)}"
+            )
+            self.screen.write(chars, colors, cursors, status)
 
+        self.screen.close()
         print("finished")
@@ -1,8 +1,9 @@
 import bz2
 import os
 import re
+import threading
 import time
-from typing import Literal
+from typing import Literal, NamedTuple, Optional
 
 import numpy as np
 from nle import nethack
@@ -30,37 +31,194 @@ def get_ttyrec_version(filename):
         return None
 
 
+class TtyrecChunk(NamedTuple):
+    """Consecutive frames of a ttyrec, (frames, ...) arrays"""
+
+    chars: np.ndarray
+    colors: np.ndarray
+    cursors: np.ndarray
+    timestamps: np.ndarray
+    actions: np.ndarray
+    scores: np.ndarray
+
+
+def allocate_chunk(chunk_len) -> TtyrecChunk:
+    """Zeroed buffers of chunk_len frames"""
+    return TtyrecChunk(
+        np.zeros((chunk_len, ROWS, COLUMNS), dtype=np.uint8),
+        np.zeros((chunk_len, ROWS, COLUMNS), dtype=np.int8),
+        np.zeros((chunk_len, 2), dtype=np.int16),
+        np.zeros((chunk_len,), dtype=np.int64),
+        np.zeros((chunk_len), dtype=np.uint8),
+        np.zeros((chunk_len), dtype=np.int32),
+    )
+
+
+class ChunkPool:
+    """
+    num_chunks chunk buffers for `ReadTtyrec.read_chunks`, a buffer is converted into again only after the chunk
+    read into it is released, so consumers can keep chunks (and frames of them) without copying.
+    num_chunks=2 or 3 is double or triple buffering.
+    """
+
+    def __init__(self, num_chunks: int = 3, chunk_len: int = SEQ_LENGTH, block: bool = False):
+        """
+        block: when all chunks are in use wait for another thread to release one, instead of raising RuntimeError
+        """
+        self.num_chunks = num_chunks
+        self.chunk_len = chunk_len
+        self.block = block
+        self._free = [allocate_chunk(chunk_len) for _ in range(num_chunks)]
+        self._in_use = {}
+        self._released = threading.Condition()
+
+    @property
+    def available(self):
+        return len(self._free)
+
+    def acquire(self) -> TtyrecChunk:
+        """Full-length buffers of a free chunk"""
+        with self._released:
+            if not self._free:
+                if not self.block:
+                    raise RuntimeError(f"All {self.num_chunks} chunks are in use, release chunks or use a bigger pool")
+                self._released.wait_for(lambda: self._free)
+            buffers = self._free.pop()
+            self._in_use[id(buffers.chars)] = buffers
+            return buffers
+
+    def release(self, chunk: TtyrecChunk):
+        """Hand back the buffers of a chunk (or of any view of it), its arrays must not be used afterwards"""
+        chars = chunk[0] if chunk[0].base is None else chunk[0].base
+        with self._released:
+            buffers = self._in_use.pop(id(chars), None)
+            if buffers is None:
+                raise ValueError("The chunk is not in use in this pool")
+            self._free.append(buffers)
+            self._released.notify()
+
+
 class ReadTtyrec:
-    def __init__(self, ttyrec_version: TTYREC_VERSION = TTYREC_V3):
+    def __init__(
+        self,
+        ttyrec_version: TTYREC_VERSION = TTYREC_V3,
+        seq_length: int = SEQ_LENGTH,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        seq_length: number of frames converted at once into the reused buffers, longer chunks amortize the
+            per-call overhead
+        cache_dir: read ttyrecs from their up to date caches in cache_dir (see `ttyrec_cache.write_ttyrec_cache`
+            and scripts/cache_ttyrecs.py) when there are, instead of decoding them
+        """
         self.ttyrec_version = ttyrec_version
+        self.seq_length = seq_length
+        self.cache_dir = cache_dir
         self.converter = Converter(ROWS, COLUMNS, ttyrec_version)
+        # ttyrec loaded in the converter and the number of frames converted from it
+        self._loaded = None
+        self._position = 0
 
-        self.chars = np.zeros((SEQ_LENGTH, ROWS, COLUMNS), dtype=np.uint8)
-        self.colors = np.zeros((SEQ_LENGTH, ROWS, COLUMNS), dtype=np.int8)
-        self.cursors = np.zeros((SEQ_LENGTH, 2), dtype=np.int16)
-        self.timestamps = np.zeros((SEQ_LENGTH,), dtype=np.int64)
-        self.actions = np.zeros((SEQ_LENGTH), dtype=np.uint8)
-        self.scores = np.zeros((SEQ_LENGTH), dtype=np.int32)
+        self.chars, self.colors, self.cursors, self.timestamps, self.actions, self.scores = allocate_chunk(seq_length)
 
-    def read(self, ttyrec: str):
+    def read_chunks(
+        self,
+        ttyrec: str,
+        chunk_len: Optional[int] = None,
+        copy: bool = False,
+        pool: Optional[ChunkPool] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ):
+        """
+        Yield `TtyrecChunk`s of up to chunk_len (seq_length by default) frames, one chunk per convert call.
+        ttyrec can also be the path of a ttyrec cache.
+
+        By default the chunks are views of buffers that are overwritten by the next chunk.
+        copy: convert every chunk into freshly allocated arrays that the caller can keep.
+        pool: convert every chunk into buffers acquired from the `ChunkPool` (of chunk_len frames), the caller
+            keeps them until it calls pool.release(chunk).
+        start, stop: only read frames [start, stop). A ttyrec cache is read from the chunk containing start.
+            A ttyrec has to be decoded from its beginning, but the converter keeps its position: reading from
+            start at or after where the previous read of the same ttyrec stopped continues from there.
+        """
         assert self.ttyrec_version == get_ttyrec_version(ttyrec)
-        self.converter.load_ttyrec(ttyrec)
+        if pool is not None:
+            if chunk_len not in (None, pool.chunk_len):
+                raise ValueError(f"chunk_len {chunk_len} doesn't match the pool chunk_len {pool.chunk_len}")
+            chunk_len = pool.chunk_len
+        chunk_len = chunk_len or self.seq_length
+
+        if chunk_len == self.seq_length:
+            buffers = TtyrecChunk(self.chars, self.colors, self.cursors, self.timestamps, self.actions, self.scores)
+        else:
+            buffers = allocate_chunk(chunk_len)
+
+        def next_buffers():
+            if pool is not None:
+                return pool.acquire()
+            if copy:
+                return allocate_chunk(chunk_len)
+            return buffers
+
+        cache = self.open_cache(ttyrec)
+        if cache is not None:
+            stop = len(cache) if stop is None else min(stop, len(cache))
+            for chunk_start in range(start, stop, chunk_len):
+                yield cache.read(chunk_start, min(chunk_start + chunk_len, stop), out=next_buffers())
+            return
+
+        if self._loaded != ttyrec or self._position > start:
+            self.converter.load_ttyrec(ttyrec)
+            self._loaded, self._position = ttyrec, 0
+
+        # the converter fills the whole buffers unless the file ended, so that frames are never converted past
+        # stop (and the position stays exact) the buffers are cut to the frames still needed
+        skipped = TtyrecChunk(self.chars, self.colors, self.cursors, self.timestamps, self.actions, self.scores)
+        remaining = 0
+        while self._position < start and remaining == 0:
+            frames = min(self.seq_length, start - self._position)
+            remaining = self.converter.convert(*(buffer[:frames] for buffer in skipped))
+            self._position += frames - remaining
 
-        while True:
-            remaining = self.converter.convert(
-                self.chars, self.colors, self.cursors, self.timestamps, self.actions, self.scores
-            )
-            end = np.shape(self.chars)[0] - remaining
+        while remaining == 0 and (stop is None or self._position < stop):
+            chunk = next_buffers()
+            frames = chunk_len if stop is None else min(chunk_len, stop - self._position)
+            remaining = self.converter.convert(*(buffer[:frames] for buffer in chunk))
+            end = frames - remaining
+            self._position += end
 
             if end == 0:
+                if pool is not None:
+                    pool.release(chunk)
                 break
 
-            for frame in range(end):
+            yield TtyrecChunk(*(buffer[:end] for buffer in chunk))
+
+    def seek(self, ttyrec: str, frame: int) -> TtyrecChunk:
+        """A copy of frame (chars, colors, cursor, timestamp, action, score) of ttyrec, see `read_chunks` start"""
+        for chunk in self.read_chunks(ttyrec, chunk_len=1, copy=True, start=frame, stop=frame + 1):
+            return TtyrecChunk(*(array[0] for array in chunk))
+        raise IndexError(f"{ttyrec} has no frame {frame}")
+
+    def open_cache(self, ttyrec):
+        """The `TtyrecCache` to read instead of decoding ttyrec, if any"""
+        from nle_utils.ttyrec import ttyrec_cache
+
+        if ttyrec_cache.is_ttyrec_cache(ttyrec):
+            return ttyrec_cache.TtyrecCache(ttyrec)
+        if self.cache_dir is not None:
+            return ttyrec_cache.open_ttyrec_cache(ttyrec, self.cache_dir)
+        return None
+
+    def read(self, ttyrec: str, start: int = 0, stop: Optional[int] = None):
+        for chars, colors, cursors, timestamps, actions, scores in self.read_chunks(ttyrec, start=start, stop=stop):
+            for frame in range(len(chars)):
                 yield (
-                    self.chars[frame],
-                    self.colors[frame],
-                    self.cursors[frame],
-                    self.timestamps[frame],
-                    self.actions[frame],
-                    self.scores[frame],
+                    chars[frame],
+                    colors[frame],
+                    cursors[frame],
+                    timestamps[frame],
+                    actions[frame],
+                    scores[frame],
                 )
@@ -1,12 +1,25 @@
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
 from collections import namedtuple
 from pathlib import Path
+from typing import Optional
 
 import cv2
+import numpy as np
 from nle import nethack
 
-from nle_utils.ttyrec.read_ttyrec import TTYREC_VERSION, ReadTtyrec
+from nle_utils import warmup
+from nle_utils.parallel_utils import get_physical_cores_count
+from nle_utils.ttyrec.read_ttyrec import COLUMNS, ROWS, TTYREC_V3, TTYREC_VERSION, ReadTtyrec
+from nle_utils.ttyrec.stream_ttyrec import estimate_frames
+from nle_utils.utils.utils import log
+from nle_utils.video_writer import DuplicateFrames, FrameTimestamps, concat_frame_timestamps, concat_videos, has_ffmpeg
 from nle_utils.visualize import Visualize
 
+VIDEO_SIZE = (1280, 720)
+
 SmallerBLStats = namedtuple(
     "BLStats",
     "strength_percentage strength dexterity constitution intelligence wisdom charisma score hitpoints max_hitpoints depth gold energy max_energy armor_class monster_level experience_level experience_points time hunger_state carrying_capacity dungeon_number level_number prop_mask align",
@@ -17,44 +30,215 @@ class RenderTtyrec:
     def __init__(
         self,
         output_dir: str,
-        ttyrec_version=TTYREC_VERSION,
+        ttyrec_version: TTYREC_VERSION = TTYREC_V3,
         tileset_path="tilesets/3.6.1tiles32.png",
         tile_size=32,
         render_font_size=(18, 30),
         show: bool = False,
+        native_resolution: bool = False,
+        dedup: bool = False,
+        batch_size: int = 16,
+        cache_dir: Optional[str] = None,
+        parallel: bool = False,
     ):
+        """
+        native_resolution: rasterize the terminal with characters sized to fill VIDEO_SIZE exactly, so that frames
+            are written without resizing (render_font_size is ignored then). By default the terminal is drawn with
+            render_font_size characters and resized to VIDEO_SIZE.
+        dedup: encode repeated screens once, the ttyrec timestamp each frame starts at and how many ttyrec
+            frames it stands for are written to a .frames.csv file next to the video.
+        batch_size: number of screens rasterized at once (see `Visualize.draw_ttys`).
+        cache_dir: read the ttyrecs from their caches in cache_dir when they are up to date (see `ReadTtyrec`).
+        parallel: rasterize the batches with numba threads, the process can't fork afterwards (see `rasterize_ttys`).
+        """
+        if native_resolution:
+            render_font_size = (
+                VIDEO_SIZE[0] // nethack.nethack.TERMINAL_SHAPE[1],
+                VIDEO_SIZE[1] // nethack.nethack.TERMINAL_SHAPE[0],
+            )
+
         self.output_dir = output_dir
-        self.reader = ReadTtyrec(ttyrec_version)
+        self.reader = ReadTtyrec(ttyrec_version, cache_dir=cache_dir)
         self.render_font_size = render_font_size
         self.show = show
+        self.dedup = dedup
+        self.batch_size = batch_size
+        self.parallel = parallel
 
         self.fourcc = cv2.VideoWriter_fourcc(*"mp4v")  # or use 'XVID' for .avi format
         self._window_name = "NetHack"
 
         self.visualizer = Visualize(tileset_path=tileset_path, tile_size=tile_size, render_font_size=render_font_size)
+        height = nethack.nethack.TERMINAL_SHAPE[0] * render_font_size[1]
+        width = nethack.nethack.TERMINAL_SHAPE[1] * render_font_size[0]
+        self._screens = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+        self._frame = np.empty((VIDEO_SIZE[1], VIDEO_SIZE[0], 3), dtype=np.uint8)
+
+    def render(self, ttyrec: str, start: int = 0, stop: Optional[int] = None, output_path=None):
+        """
+        Render frames [start, stop) of ttyrec (see `ReadTtyrec.read_chunks`) to output_path, by default
+        <output_dir>/<ttyrec name>.mp4.
 
-    def render(self, ttyrec: str):
-        self.output_path = Path(self.output_dir) / f"{Path(ttyrec).stem}.mp4"
+        Returns (encoded frames, leading repeats). With dedup the frames at start that repeat frame start - 1 are
+        skipped and counted as leading repeats, for `concat_frame_timestamps` to join segments exactly.
+        """
+        self.output_path = Path(output_path or Path(self.output_dir) / f"{Path(ttyrec).stem}.mp4")
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        self.video_writer = cv2.VideoWriter(str(self.output_path), self.fourcc, 30.0, (1280, 720))
+        self.video_writer = cv2.VideoWriter(str(self.output_path), self.fourcc, 30.0, VIDEO_SIZE)
 
-        stream = self.reader.read(ttyrec)
+        duplicates = DuplicateFrames()
+        frame_timestamps = None
+        if self.dedup:
+            frame_timestamps = FrameTimestamps(self.output_path.with_suffix(".frames.csv"), time_column="timestamp")
+
+        # screens are collected and rasterized in batches, the reader overwrites its buffers while streaming
+        batch_chars = np.zeros((self.batch_size, ROWS, COLUMNS), dtype=np.uint8)
+        batch_colors = np.zeros((self.batch_size, ROWS, COLUMNS), dtype=np.int8)
+        size = 0
+        encoded, leading_repeats = 0, 0
+
+        # with dedup, the frame before start is read only to tell whether the first frames repeat it
+        prime = self.dedup and start > 0
+        stream = self.reader.read(ttyrec, start - 1 if prime else start, stop)
 
         for chars, colors, cursors, timestamps, actions, scores in stream:
-            height = nethack.nethack.TERMINAL_SHAPE[0] * self.render_font_size[1]
-            width = nethack.nethack.TERMINAL_SHAPE[1] * self.render_font_size[0]
+            if self.dedup:
+                if prime:
+                    duplicates(chars, colors)
+                    prime = False
+                    continue
+                if duplicates(chars, colors):
+                    if encoded == 0:
+                        leading_repeats += 1
+                    else:
+                        frame_timestamps.repeat()
+                    continue
+                frame_timestamps.add(int(timestamps))
+
+            batch_chars[size] = chars
+            batch_colors[size] = colors
+            size += 1
+            encoded += 1
+            if size == self.batch_size:
+                self._write_batch(batch_chars, batch_colors, size)
+                size = 0
 
-            screen = self.visualizer._draw_tty(chars, colors, width, height)
+        self._write_batch(batch_chars, batch_colors, size)
+
+        self.video_writer.release()
+        if frame_timestamps is not None:
+            frame_timestamps.close()
+        return encoded, leading_repeats
+
+    def _write_batch(self, chars, colors, size):
+        if size == 0:
+            return
+        # the terminals are drawn at their rasterized size, then resized only if that isn't VIDEO_SIZE
+        screens = self.visualizer.draw_ttys(
+            chars[:size], colors[:size], out=self._screens[:size], parallel=self.parallel
+        )
+        for screen in screens:
+            if screen.shape[1::-1] != VIDEO_SIZE:
+                screen = cv2.resize(screen, VIDEO_SIZE, dst=self._frame, interpolation=cv2.INTER_AREA)
             image = screen[..., ::-1]
 
-            resized_image = cv2.resize(image, (1280, 720), cv2.INTER_AREA)
-            self.video_writer.write(resized_image)
+            self.video_writer.write(image)
 
             if self.show:
-                cv2.imshow(self._window_name, resized_image)
+                cv2.imshow(self._window_name, image)
                 cv2.waitKey(1)
 
-        self.video_writer.release()
-
     def close(self):
         cv2.destroyAllWindows()
+
+
+def count_frames(ttyrec: str, ttyrec_version=TTYREC_V3, cache_dir: Optional[str] = None) -> int:
+    """Number of frames of ttyrec, from its cache if there is one, otherwise by decoding it in long chunks"""
+    reader = ReadTtyrec(ttyrec_version, seq_length=4096, cache_dir=cache_dir)
+    cache = reader.open_cache(ttyrec)
+    if cache is not None:
+        return len(cache)
+    return sum(len(chunk.chars) for chunk in reader.read_chunks(ttyrec))
+
+
+def split_frames(ttyrec: str, ttyrec_version=TTYREC_V3, cache_dir: Optional[str] = None) -> int:
+    """
+    Number of frames of ttyrec to split it in segments, without decoding it: the length of its cache if there is
+    one, otherwise `estimate_frames` from the record headers
+    """
+    cache = ReadTtyrec(ttyrec_version, seq_length=1, cache_dir=cache_dir).open_cache(ttyrec)
+    if cache is not None:
+        return len(cache)
+    return estimate_frames(ttyrec, ttyrec_version)
+
+
+def _render_segment(ttyrec, start, stop, output_path, renderer_kwargs):
+    return RenderTtyrec(os.path.dirname(output_path), **renderer_kwargs).render(ttyrec, start, stop, output_path)
+
+
+def render_ttyrec_parallel(
+    ttyrec: str,
+    output_dir: str,
+    n_jobs: Optional[int] = None,
+    min_segment_frames: int = 2000,
+    reencode: bool = False,
+    **renderer_kwargs,
+):
+    """
+    Render a single ttyrec with n_jobs processes (the number of physical cores by default): the frames are split
+    in consecutive segments of at least min_segment_frames (by the cache length, or the number of frames estimated
+    from the record headers, see `split_frames`), each worker decodes up to the start of its segment (or seeks in
+    the cache, see `ReadTtyrec`) and renders it to a temporary video, then the segments are
+    concatenated without re-encoding by ffmpeg (see `concat_videos`). The video and its .frames.csv (with dedup)
+    are the same as `RenderTtyrec`'s.
+
+    Without ffmpeg on the PATH the ttyrec is rendered in this process, with a warning, unless reencode: then the
+    segments are concatenated by decoding and encoding them again with OpenCV, which is lossy.
+    renderer_kwargs are the arguments of `RenderTtyrec` (ttyrec_version, dedup, cache_dir, ...).
+    """
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = get_physical_cores_count()
+    output_path = Path(output_dir) / f"{Path(ttyrec).stem}.mp4"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if not reencode and not has_ffmpeg():
+        log.warning(f"ffmpeg is not on the PATH, rendering {ttyrec} in a single process (see reencode)")
+        RenderTtyrec(output_dir, **renderer_kwargs).render(ttyrec, output_path=output_path)
+        return
+
+    total = split_frames(ttyrec, renderer_kwargs.get("ttyrec_version", TTYREC_V3), renderer_kwargs.get("cache_dir"))
+    num_segments = max(1, min(n_jobs, total // max(1, min_segment_frames)))
+    if num_segments == 1:
+        renderer = RenderTtyrec(output_dir, **renderer_kwargs)
+        renderer.render(ttyrec, output_path=output_path)
+        return
+
+    # the last segment goes to the end of the file, so that every frame is rendered even if total is an estimate
+    bounds = [int(bound) for bound in np.linspace(0, total, num_segments + 1)][:-1] + [None]
+    # on the same filesystem as the output, segments can be large
+    segment_dir = tempfile.mkdtemp(prefix=".segments-", dir=output_dir)
+    try:
+        paths = [os.path.join(segment_dir, f"{i:04d}.mp4") for i in range(num_segments)]
+        args = [(ttyrec, start, stop, path, renderer_kwargs) for start, stop, path in zip(bounds, bounds[1:], paths)]
+        # not forked, a process that ran the parallel rasterizer (see `rasterize_ttys`) would hang at exit
+        context = mp.get_context("spawn")
+        with context.Pool(processes=min(n_jobs, num_segments), initializer=warmup) as pool:
+            results = pool.starmap(_render_segment, args)
+
+        frames = [frames for frames, _ in results]
+        concat_videos(
+            [path for path, n in zip(paths, frames) if n > 0],
+            output_path,
+            cv2.VideoWriter_fourcc(*"mp4v"),
+            30.0,
+            VIDEO_SIZE,
+            reencode=reencode,
+        )
+        if renderer_kwargs.get("dedup"):
+            concat_frame_timestamps(
+                [Path(path).with_suffix(".frames.csv") for path in paths],
+                [leading_repeats for _, leading_repeats in results],
+                output_path.with_suffix(".frames.csv"),
+            )
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
@@ -0,0 +1,193 @@
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from nle_utils.ttyrec.read_ttyrec import SEQ_LENGTH, TTYREC_V3, TTYREC_VERSION, ChunkPool, ReadTtyrec
+
+OPENERS = {".bz2": bz2.open, ".gz": gzip.open, ".xz": lzma.open, ".lzma": lzma.open}
+FIFO_BLOCK_SIZE = 1 << 16
+ESTIMATE_BLOCK_SIZE = 1 << 20
+# sec, usec, length of a record, followed from version 2 on by its channel (0 output, 1 input, 2 score)
+TTYREC_HEADER = struct.Struct("<iiI")
+INPUT_CHANNEL = 1
+
+
+def open_ttyrec(path):
+    """Binary file object of the decompressed ttyrec, by the file extension (bz2, gz, xz or uncompressed)"""
+    return OPENERS.get(Path(path).suffix, open)(path, "rb")
+
+
+def estimate_frames(ttyrec: str, ttyrec_version: TTYREC_VERSION = TTYREC_V3) -> int:
+    """
+    Number of frames of ttyrec from its record headers, without converting it: the Converter makes a frame of
+    every input record from version 2 on, for version 1 every record is counted. The data of the records is
+    only decompressed, so this is much cheaper than decoding, but only an estimate for files the Converter handles
+    differently (e.g. truncated ones).
+    """
+    header_size = TTYREC_HEADER.size + (ttyrec_version > 1)
+    frames = 0
+    # bytes of record data still to skip past the end of the last block, or the start of a header cut by it
+    skip, tail = 0, b""
+    with open_ttyrec(ttyrec) as f:
+        while block := f.read(ESTIMATE_BLOCK_SIZE):
+            if skip >= len(block):
+                skip -= len(block)
+                continue
+            buffer = tail + block[skip:]
+            position = 0
+            while position + header_size <= len(buffer):
+                _, _, length = TTYREC_HEADER.unpack_from(buffer, position)
+                if ttyrec_version == 1 or buffer[position + header_size - 1] == INPUT_CHANNEL:
+                    frames += 1
+                position += header_size + length
+            skip, tail = max(0, position - len(buffer)), buffer[position:]
+    return frames
+
+
+class _Bz2Fifo:
+    """
+    A FIFO fed by a thread with a ttyrec decompressed from any format and recompressed as a fast level 1 bz2
+    stream, the only format nle's Converter reads
+    """
+
+    def __init__(self, ttyrec):
+        self._dir = tempfile.mkdtemp(prefix="nle_utils_fifo_")
+        # keeps the ttyrec name, which has its version
+        self.path = os.path.join(self._dir, f"{Path(ttyrec).name}.bz2")
+        os.mkfifo(self.path)
+        self._stop = threading.Event()
+        self.error = None
+        self._thread = threading.Thread(target=self._feed, args=(ttyrec,), daemon=True)
+        self._thread.start()
+
+    def _feed(self, ttyrec):
+        try:
+            # blocks until the Converter opens the FIFO, it is opened first so that the Converter gets an empty
+            # stream rather than waiting forever if the ttyrec can't be read
+            with open(self.path, "wb") as fifo:
+                try:
+                    compressor = bz2.BZ2Compressor(1)
+                    with open_ttyrec(ttyrec) as src:
+                        while not self._stop.is_set():
+                            block = src.read(FIFO_BLOCK_SIZE)
+                            if not block:
+                                fifo.write(compressor.flush())
+                                break
+                            fifo.write(compressor.compress(block))
+                except BrokenPipeError:
+                    raise
+                except Exception as e:
+                    self.error = e
+        except BrokenPipeError:
+            pass
+
+    def close(self):
+        """Stop the thread, draining what it's still writing if the Converter didn't read everything"""
+        self._stop.set()
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            while self._thread.is_alive():
+                try:
+                    os.read(fd, FIFO_BLOCK_SIZE)
+                except BlockingIOError:
+                    time.sleep(0.001)
+        finally:
+            os.close(fd)
+        self._thread.join()
+        os.remove(self.path)
+        os.rmdir(self._dir)
+
+
+class StreamTtyrec:
+    """
+    Read ttyrecs with the decompression and terminal emulation of the next chunks running in a background
+    thread while the consumer processes the current one (Converter.convert releases the GIL).
+
+    Besides .bz2, ttyrecs can be .gz, .xz or uncompressed: another thread decompresses them and feeds the
+    Converter through a FIFO (see `_Bz2Fifo`).
+    """
+
+    def __init__(
+        self,
+        ttyrec_version: TTYREC_VERSION = TTYREC_V3,
+        chunk_len: int = SEQ_LENGTH,
+        prefetch: int = 4,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        prefetch: number of chunks converted ahead of the consumer
+        cache_dir: see `ReadTtyrec`
+        """
+        self.reader = ReadTtyrec(ttyrec_version, seq_length=chunk_len, cache_dir=cache_dir)
+        # +1 for the chunk held by the consumer
+        self.pool = ChunkPool(prefetch + 1, chunk_len, block=True)
+
+    def read_chunks(self, ttyrec: str):
+        """
+        Yield `TtyrecChunk`s of up to chunk_len frames, they are handed back to the background thread when the
+        next chunk is requested
+        """
+        fifo = None
+        if Path(ttyrec).suffix != ".bz2" and self.reader.open_cache(ttyrec) is None:
+            fifo = _Bz2Fifo(ttyrec)
+        chunks = queue.Queue()
+        stop = threading.Event()
+
+        def convert():
+            try:
+                for chunk in self.reader.read_chunks(fifo.path if fifo else ttyrec, pool=self.pool):
+                    chunks.put(chunk)
+                    if stop.is_set():
+                        break
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+
+        thread = threading.Thread(target=convert, daemon=True)
+        thread.start()
+        chunk = None
+        try:
+            while True:
+                if chunk is not None:
+                    self.pool.release(chunk)
+                chunk = chunks.get()
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            stop.set()
+            # hand back the held chunk and the ones the thread still converts, so that it isn't blocked on the pool
+            while chunk is not None or thread.is_alive() or not chunks.empty():
+                if chunk is not None and not isinstance(chunk, Exception):
+                    self.pool.release(chunk)
+                try:
+                    chunk = chunks.get(timeout=0.01)
+                except queue.Empty:
+                    chunk = None
+            thread.join()
+            if fifo is not None:
+                fifo.close()
+                if fifo.error is not None:
+                    raise fifo.error
+
+    def read(self, ttyrec: str):
+        for chars, colors, cursors, timestamps, actions, scores in self.read_chunks(ttyrec):
+            for frame in range(len(chars)):
+                yield (
+                    chars[frame],
+                    colors[frame],
+                    cursors[frame],
+                    timestamps[frame],
+                    actions[frame],
+                    scores[frame],
+                )
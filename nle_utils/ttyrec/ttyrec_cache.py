@@ -0,0 +1,225 @@
+import bz2
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from nle_utils.ttyrec.read_ttyrec import (
+    TTYREC_V3,
+    TTYREC_VERSION,
+    ReadTtyrec,
+    TtyrecChunk,
+    allocate_chunk,
+    get_ttyrec_version,
+)
+from nle_utils.utils.cache import cache_dir
+
+# bump when the layout of the cache directories changes, to invalidate them
+TTYREC_CACHE_VERSION = 1
+TTYREC_CACHE_SUFFIX = ".ttycache"
+CHUNK_LEN = 1024
+
+COMPRESSIONS = {
+    "none": (lambda data: data, lambda data: data),
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "bz2": (bz2.compress, bz2.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def default_cache_dir() -> Path:
+    return cache_dir() / "ttyrecs"
+
+
+def ttyrec_cache_path(ttyrec, directory=None) -> Path:
+    """
+    Cache directory of a ttyrec in directory (`default_cache_dir()` by default), the name keeps the ttyrec name
+    (and so its version, see `get_ttyrec_version`) and a digest of its absolute path
+    """
+    digest = hashlib.sha256(os.path.abspath(ttyrec).encode()).hexdigest()[:16]
+    return Path(directory or default_cache_dir()) / f"{Path(ttyrec).name}-{digest}{TTYREC_CACHE_SUFFIX}"
+
+
+def is_ttyrec_cache(path) -> bool:
+    return str(path).endswith(TTYREC_CACHE_SUFFIX) and os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def _source_stat(ttyrec):
+    stat = os.stat(ttyrec)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_ttyrec_cache(
+    ttyrec: str,
+    path=None,
+    ttyrec_version: TTYREC_VERSION = TTYREC_V3,
+    chunk_len: int = CHUNK_LEN,
+    compression: str = "zlib",
+) -> Path:
+    """
+    Decode ttyrec once and store its frames as columns (chars, colors, cursors, timestamps, actions, scores),
+    each one a file of chunk_len-frame chunks compressed independently, so that any frame can be read by
+    decompressing a single chunk. meta.json has the shapes, dtypes and the byte offsets of the chunks.
+    With compression "none" the columns are raw arrays that `TtyrecCache` memory-maps without any copy.
+
+    The cache is written to a temporary directory that is renamed when complete. Returns the cache path
+    (`ttyrec_cache_path` by default).
+    """
+    compress, _ = COMPRESSIONS[compression]
+    path = Path(path or ttyrec_cache_path(ttyrec))
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    columns = TtyrecChunk._fields
+    offsets = {column: [0] for column in columns}
+    num_frames = 0
+    files = {column: open(tmp_path / f"{column}.bin", "wb") for column in columns}
+    try:
+        for chunk in ReadTtyrec(ttyrec_version, seq_length=chunk_len).read_chunks(ttyrec):
+            for column, array in zip(columns, chunk):
+                data = compress(array.tobytes())
+                files[column].write(data)
+                offsets[column].append(offsets[column][-1] + len(data))
+            num_frames += len(chunk.chars)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        "version": TTYREC_CACHE_VERSION,
+        "source": os.path.abspath(ttyrec),
+        **_source_stat(ttyrec),
+        "ttyrec_version": ttyrec_version,
+        "num_frames": num_frames,
+        "chunk_len": chunk_len,
+        "compression": compression,
+        "columns": {
+            column: {"dtype": array.dtype.str, "shape": array.shape[1:], "offsets": offsets[column]}
+            for column, array in zip(columns, allocate_chunk(0))
+        },
+    }
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class TtyrecCache:
+    """
+    Random access to the frames of a `write_ttyrec_cache` directory, the column files are memory-mapped
+    (so that processes share them through the page cache) and only the chunks overlapping the requested
+    frames are decompressed
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != TTYREC_CACHE_VERSION:
+            raise ValueError(f"{path} is a version {self.meta['version']} ttyrec cache, not {TTYREC_CACHE_VERSION}")
+
+        self.num_frames = self.meta["num_frames"]
+        self.chunk_len = self.meta["chunk_len"]
+        self.ttyrec_version = self.meta["ttyrec_version"]
+        _, self._decompress = COMPRESSIONS[self.meta["compression"]]
+
+        self._columns = {}
+        for column, info in self.meta["columns"].items():
+            dtype, shape = np.dtype(info["dtype"]), tuple(info["shape"])
+            if self.num_frames == 0:
+                # empty files can't be memory-mapped
+                data = np.zeros((0, *shape), dtype=dtype)
+            else:
+                data = np.memmap(self.path / f"{column}.bin", dtype=np.uint8, mode="r")
+                if self.meta["compression"] == "none":
+                    data = data.view(dtype).reshape(self.num_frames, *shape)
+            self._columns[column] = (data, dtype, shape, info["offsets"])
+        # the last decompressed chunk of every column, sequential reads straddle chunks
+        self._last_chunk = {}
+
+    def __len__(self):
+        return self.num_frames
+
+    def is_fresh(self, ttyrec=None):
+        """Whether the source ttyrec (the one the cache was written from by default) didn't change since"""
+        try:
+            return _source_stat(ttyrec or self.meta["source"]) == {
+                "size": self.meta["size"],
+                "mtime_ns": self.meta["mtime_ns"],
+            }
+        except FileNotFoundError:
+            return False
+
+    def _chunk(self, column, index):
+        """Decompressed frames of chunk index of column"""
+        key = self._last_chunk.get(column)
+        if key is not None and key[0] == index:
+            return key[1]
+        data, dtype, shape, offsets = self._columns[column]
+        array = np.frombuffer(self._decompress(memoryview(data[offsets[index] : offsets[index + 1]])), dtype=dtype)
+        array = array.reshape(-1, *shape)
+        self._last_chunk[column] = (index, array)
+        return array
+
+    def read(self, start, stop, out: Optional[TtyrecChunk] = None) -> TtyrecChunk:
+        """
+        Frames [start, stop) (clipped to the cache). Copied into out (buffers of at least stop - start frames,
+        the result is a view of them) if given, otherwise without compression the result are read-only views of
+        the memory-mapped columns.
+        """
+        start, stop = max(0, start), min(stop, self.num_frames)
+        stop = max(start, stop)
+        if out is None and self.meta["compression"] == "none":
+            return TtyrecChunk(*(self._columns[column][0][start:stop] for column in TtyrecChunk._fields))
+
+        if out is None:
+            out = allocate_chunk(stop - start)
+        result = TtyrecChunk(*(array[: stop - start] for array in out))
+        for column, array in zip(TtyrecChunk._fields, result):
+            data = self._columns[column][0]
+            if self.meta["compression"] == "none":
+                array[:] = data[start:stop]
+                continue
+            frame = start
+            while frame < stop:
+                index, offset = divmod(frame, self.chunk_len)
+                chunk = self._chunk(column, index)
+                end = min(stop, frame + len(chunk) - offset)
+                array[frame - start : end - start] = chunk[offset : offset + end - frame]
+                frame = end
+        return result
+
+    def __getitem__(self, index):
+        """A frame (a `TtyrecChunk` of scalars and arrays) or a `TtyrecChunk` of a slice of frames"""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.num_frames)
+            chunk = self.read(start, stop)
+            return chunk if step == 1 else TtyrecChunk(*(array[::step] for array in chunk))
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError(f"frame {index} out of range of {self.num_frames} frames")
+        return TtyrecChunk(*(array[0] for array in self.read(index, index + 1)))
+
+
+def open_ttyrec_cache(ttyrec, directory=None) -> Optional[TtyrecCache]:
+    """The cache of ttyrec in directory if it exists and is up to date, None otherwise"""
+    path = ttyrec_cache_path(ttyrec, directory)
+    if not is_ttyrec_cache(path):
+        return None
+    try:
+        cache = TtyrecCache(path)
+    except (ValueError, KeyError, OSError):
+        return None
+    if not cache.is_fresh(ttyrec) or cache.ttyrec_version != get_ttyrec_version(ttyrec):
+        return None
+    return cache
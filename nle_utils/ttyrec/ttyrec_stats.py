@@ -0,0 +1,233 @@
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+from nle.nethack.actions import _ACTIONS_DICT
+from numpy.lib.stride_tricks import sliding_window_view
+
+from nle_utils.parallel_utils import Result, imap_parallel
+from nle_utils.ttyrec.read_ttyrec import TTYREC_V3, TTYREC_VERSION, ReadTtyrec, get_ttyrec_version
+from nle_utils.utils.utils import is_module_available
+
+# the two bottom lines of the tty, "Dlvl:1 $:3 HP:15(16) Pw:2(2) AC:6 Xp:1/0 T:3"
+STATUS_ROWS = slice(22, 24)
+STATS_CHUNK_LEN = 4096
+PARQUET_ENGINES = ("pyarrow", "fastparquet")
+
+STATS_COLUMNS = (
+    "path",
+    "size",
+    "mtime_ns",
+    "frames",
+    "start_time",
+    "duration",
+    "max_score",
+    "final_score",
+    "max_dlvl",
+    "final_dlvl",
+    "turns",
+    "seconds_per_turn",
+    "keypresses",
+    "actions",
+)
+
+
+def _status_numbers(lines: np.ndarray, label: bytes, max_digits: int) -> np.ndarray:
+    """
+    The number following the first label of every row of lines ((frames, width) chars), -1 where there is none.
+    All the frames are matched at once on sliding windows of the lines.
+    """
+    pattern = np.frombuffer(label, dtype=np.uint8)
+    padded = np.pad(lines, ((0, 0), (0, max_digits)), constant_values=ord(" "))
+    windows = sliding_window_view(padded, len(pattern) + max_digits, axis=1)
+    found = (windows[..., : len(pattern)] == pattern).all(axis=-1)
+
+    digits = windows[np.arange(len(lines)), found.argmax(axis=1), len(pattern) :].astype(np.int64) - ord("0")
+    is_digit = np.cumprod((digits >= 0) & (digits <= 9), axis=1).astype(bool)
+    numbers = np.zeros(len(lines), dtype=np.int64)
+    for k in range(max_digits):
+        numbers = np.where(is_digit[:, k], numbers * 10 + digits[:, k], numbers)
+    return np.where(found.any(axis=1) & is_digit[:, 0], numbers, -1)
+
+
+def ttyrec_stats(
+    ttyrec: str,
+    ttyrec_version: TTYREC_VERSION = TTYREC_V3,
+    chunk_len: int = STATS_CHUNK_LEN,
+    cache_dir: Optional[str] = None,
+) -> Dict:
+    """
+    Metrics of a game, computed on whole chunks of converted frames:
+    frames, start_time and duration (seconds), max and final score, max and final dungeon level and turns
+    (from the status lines, -1 when never shown), seconds_per_turn, keypresses and actions (JSON histogram of
+    the keys pressed, by action name).
+    size and mtime_ns of the file tell `update_ttyrec_stats` whether the row is up to date.
+    """
+    reader = ReadTtyrec(ttyrec_version, seq_length=chunk_len, cache_dir=cache_dir)
+    stat = os.stat(ttyrec)
+
+    frames = 0
+    start_time = end_time = None
+    max_score = final_score = 0
+    max_dlvl = final_dlvl = -1
+    first_turn = turns = -1
+    key_counts = np.zeros(256, dtype=np.int64)
+
+    for chars, colors, cursors, timestamps, actions, scores in reader.read_chunks(ttyrec):
+        frames += len(chars)
+        if start_time is None:
+            start_time = int(timestamps[0])
+        end_time = int(timestamps[-1])
+        max_score = max(max_score, int(scores.max()))
+        final_score = int(scores[-1])
+        key_counts += np.bincount(actions, minlength=256)
+
+        status = chars[:, STATUS_ROWS].reshape(len(chars), -1)
+        dlvls = _status_numbers(status, b"Dlvl:", 3)
+        dlvls = dlvls[dlvls >= 0]
+        if len(dlvls):
+            max_dlvl = max(max_dlvl, int(dlvls.max()))
+            final_dlvl = int(dlvls[-1])
+        times = _status_numbers(status, b" T:", 7)
+        times = times[times >= 0]
+        if len(times):
+            first_turn = first_turn if first_turn >= 0 else int(times[0])
+            turns = max(turns, int(times.max()))
+
+    duration = (end_time - start_time) / 1e6 if frames else 0.0
+    # 0 is no key pressed for the frame
+    key_counts[0] = 0
+    played_turns = turns - first_turn
+    return {
+        "path": os.path.abspath(ttyrec),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "frames": frames,
+        "start_time": start_time / 1e6 if frames else 0.0,
+        "duration": duration,
+        "max_score": max_score,
+        "final_score": final_score,
+        "max_dlvl": max_dlvl,
+        "final_dlvl": final_dlvl,
+        "turns": turns,
+        "seconds_per_turn": duration / played_turns if played_turns > 0 else float("nan"),
+        "keypresses": int(key_counts.sum()),
+        "actions": json.dumps(
+            {_ACTIONS_DICT.get(key, str(key)): int(key_counts[key]) for key in np.flatnonzero(key_counts)}
+        ),
+    }
+
+
+def read_ttyrec_stats(path) -> Dict[str, Dict]:
+    """Rows of a .csv or .parquet stats file by ttyrec path, the last one of a path wins"""
+    if not os.path.exists(path):
+        return {}
+    if Path(path).suffix == ".parquet":
+        import pandas as pd
+
+        rows = pd.read_parquet(path).to_dict("records")
+    else:
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+    return {row["path"]: row for row in rows}
+
+
+def check_parquet_support():
+    """Raise ImportError unless pandas and a Parquet engine (pyarrow or fastparquet) are installed"""
+    missing = [module for module in ("pandas",) if not is_module_available(module)]
+    if not any(is_module_available(engine) for engine in PARQUET_ENGINES):
+        missing.append(" or ".join(PARQUET_ENGINES))
+    if missing:
+        raise ImportError(f"Parquet stats need {' and '.join(missing)}, install nle-utils[pandas]")
+
+
+def write_ttyrec_stats(rows, path):
+    """Write rows (dicts of `STATS_COLUMNS`) to a .csv or a .parquet file (see `check_parquet_support`)"""
+    tmp_path = f"{path}.tmp"
+    if Path(path).suffix == ".parquet":
+        import pandas as pd
+
+        pd.DataFrame(list(rows), columns=STATS_COLUMNS).to_parquet(tmp_path, index=False)
+    else:
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=STATS_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(row: Optional[Dict], ttyrec: str) -> bool:
+    if row is None:
+        return False
+    stat = os.stat(ttyrec)
+    return int(row["size"]) == stat.st_size and int(row["mtime_ns"]) == stat.st_mtime_ns
+
+
+def _worker(ttyrec, ttyrec_version, chunk_len, cache_dir) -> Result:
+    name = Path(ttyrec).name
+    try:
+        return Result(value=ttyrec_stats(ttyrec, ttyrec_version, chunk_len, cache_dir), description=name)
+    except Exception as e:
+        return Result(description=name, log_msg=f"failed: {e!r}")
+
+
+def update_ttyrec_stats(
+    ttyrecs,
+    output_path,
+    ttyrec_version: TTYREC_VERSION = TTYREC_V3,
+    chunk_len: int = STATS_CHUNK_LEN,
+    cache_dir: Optional[str] = None,
+    overwrite: bool = False,
+    n_jobs: Optional[int] = None,
+) -> int:
+    """
+    Compute the stats of the ttyrecs in parallel into output_path (.csv or .parquet), one row per game.
+    Unless overwrite, ttyrecs whose size and mtime match their row are skipped. CSV rows are appended as games
+    are done so that an interrupted run keeps them, a Parquet file is written at the end.
+    Returns the number of ttyrecs processed.
+    """
+    is_csv = Path(output_path).suffix != ".parquet"
+    if not is_csv:
+        # before any stats are computed, the file is only written at the end
+        check_parquet_support()
+
+    rows = {} if overwrite else read_ttyrec_stats(output_path)
+    todo = [
+        ttyrec
+        for ttyrec in ttyrecs
+        if get_ttyrec_version(ttyrec) == ttyrec_version and not is_up_to_date(rows.get(os.path.abspath(ttyrec)), ttyrec)
+    ]
+    stale = any(os.path.abspath(ttyrec) in rows for ttyrec in todo)
+    if not todo:
+        return 0
+
+    if is_csv and (overwrite or not os.path.exists(output_path)):
+        write_ttyrec_stats([], output_path)
+
+    csv_file = open(output_path, "a", newline="") if is_csv else None
+    try:
+        values = imap_parallel(
+            iterable=todo,
+            function=_worker,
+            function_args=(ttyrec_version, chunk_len, cache_dir),
+            n_jobs=n_jobs,
+            ordered=False,
+        )
+        for row in values:
+            if row is None:
+                continue
+            rows[row["path"]] = row
+            if csv_file is not None:
+                csv.DictWriter(csv_file, fieldnames=STATS_COLUMNS).writerow(row)
+                csv_file.flush()
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+
+    # rewritten without the outdated rows of changed ttyrecs
+    if not is_csv or stale:
+        write_ttyrec_stats(rows.values(), output_path)
+    return len(todo)
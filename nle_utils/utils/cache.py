@@ -0,0 +1,62 @@
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+from nle_utils.utils.utils import log
+
+CACHE_DIR_ENV = "NLE_UTILS_CACHE_DIR"
+
+
+def cache_dir() -> Path:
+    """
+    Directory of the on-disk caches: $NLE_UTILS_CACHE_DIR if set, otherwise $XDG_CACHE_HOME/nle_utils
+    (~/.cache/nle_utils by default)
+    """
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(xdg_cache_home) / "nle_utils"
+
+
+def file_digest(path, chunk_size=1 << 20) -> str:
+    """sha256 of the file content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_array(name, key, build, mmap_mode="r"):
+    """
+    Content-addressed cache of a numpy array.
+
+    Loads `{name}-{sha256(key)}.npy` from `cache_dir()` memory-mapped (so that processes share it through
+    the page cache) or, if it isn't there yet, calls build(), stores its result atomically and loads it.
+    key should include everything the array depends on, e.g. digests of the input files and build parameters.
+    If the cache directory isn't writable the built array is returned as is.
+    """
+    path = cache_dir() / f"{name}-{hashlib.sha256(repr(key).encode()).hexdigest()[:32]}.npy"
+    try:
+        return np.load(path, mmap_mode=mmap_mode)
+    except OSError:
+        # missing, or the cache directory isn't usable
+        pass
+    except (ValueError, EOFError):
+        log.warning(f"Corrupted cache file {path}, rebuilding")
+
+    array = build()
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        # atomic, so concurrent workers never load a partially written file
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning(f"Could not write cache file {path}: {e}")
+        return array
+
+    return np.load(path, mmap_mode=mmap_mode)
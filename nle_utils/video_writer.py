@@ -0,0 +1,239 @@
+import csv
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+QUEUE_POLICIES = ("block", "drop")
+
+
+class AsyncVideoWriter:
+    """
+    cv2.VideoWriter behind a bounded queue: `write` only hands the frame over, resizing to frame_size and
+    encoding happen in a background thread (OpenCV releases the GIL for both), so the caller doesn't wait
+    for the encoder.
+
+    policy decides what happens when the queue is full:
+        block: wait for the writer thread, no frame is lost
+        drop: skip the frame (counted in `dropped`), the caller never waits
+    """
+
+    def __init__(self, path, fourcc, fps, frame_size, queue_size: int = 8, policy: str = "block"):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy {policy}, expected one of {QUEUE_POLICIES}")
+
+        self.path = path
+        self.frame_size = tuple(frame_size)
+        self.policy = policy
+        self.dropped = 0
+
+        self._video_writer = cv2.VideoWriter(str(path), fourcc, fps, self.frame_size)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="AsyncVideoWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, frame, copy: bool = True):
+        """
+        Queue a BGR frame of any size. Use copy=False only if the caller never reuses the frame buffer,
+        e.g. frames returned by `Visualize.render` are overwritten by the next render and must be copied.
+        """
+        self._raise_error()
+        if self._thread is None:
+            raise RuntimeError("write to a released AsyncVideoWriter")
+
+        # a BGR view of an RGB buffer (like `Visualize.render` returns) is copied in its memory order,
+        # which is a plain memcpy instead of an element-wise copy, and converted in the writer thread
+        rgb = frame.strides[-1] < 0
+        if rgb:
+            frame = frame[..., ::-1]
+        if copy:
+            frame = np.array(frame, copy=True)
+
+        if self.policy == "block":
+            self._queue.put((frame, rgb))
+        else:
+            try:
+                self._queue.put_nowait((frame, rgb))
+            except queue.Full:
+                self.dropped += 1
+
+    def flush(self):
+        """Wait until all queued frames are encoded"""
+        self._queue.join()
+        self._raise_error()
+
+    def release(self):
+        """Encode the remaining frames and close the file"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._video_writer.release()
+        self._raise_error()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                frame, rgb = item
+                if self._error is None:
+                    if frame.shape[1::-1] != self.frame_size:
+                        frame = cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_AREA)
+                    if rgb:
+                        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                    self._video_writer.write(frame)
+            except Exception as e:
+                # reported to the caller on the next write/flush/release, later frames are discarded
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+class DuplicateFrames:
+    """
+    Detects frames whose inputs (e.g. glyphs and tty_chars) are identical to the previous frame's ones, so that
+    rendering and encoding them can be skipped. The inputs are compared exactly, against copies kept in
+    buffers reused between frames.
+    """
+
+    def __init__(self):
+        self._prev = None
+
+    def __call__(self, *arrays):
+        """Return True if arrays equal the ones of the previous call, otherwise remember them and return False"""
+        prev = self._prev
+        if prev is not None and len(prev) == len(arrays):
+            if all(p.shape == a.shape and np.array_equal(p, a) for p, a in zip(prev, arrays)):
+                return True
+            if all(p.shape == a.shape and p.dtype == a.dtype for p, a in zip(prev, arrays)):
+                for p, a in zip(prev, arrays):
+                    np.copyto(p, a)
+                return False
+        self._prev = [np.array(a, copy=True) for a in arrays]
+        return False
+
+    def reset(self):
+        self._prev = None
+
+
+class FrameTimestamps:
+    """
+    Sidecar CSV of a deduplicated video, one row per encoded frame: its index, the time (e.g. step or ttyrec
+    timestamp) of the first input frame it shows and for how many consecutive input frames it stands. A player
+    or post-processing step can restore the original timing from it.
+    """
+
+    def __init__(self, path, time_column="time"):
+        self.path = path
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(("frame", time_column, "repeats"))
+        self._frames = 0
+        self._time = None
+        self._repeats = 0
+
+    def add(self, time):
+        """Record a newly encoded frame"""
+        self._write_row()
+        self._time = time
+        self._repeats = 1
+
+    def repeat(self):
+        """Record a skipped duplicate of the last frame"""
+        if self._time is None:
+            raise RuntimeError("repeat before the first frame")
+        self._repeats += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._write_row()
+        self._file.close()
+
+    def _write_row(self):
+        if self._time is not None:
+            self._writer.writerow((self._frames, self._time, self._repeats))
+            self._frames += 1
+
+
+def concat_videos(paths, output_path, fourcc, fps, frame_size, reencode: bool = False):
+    """
+    Concatenate videos of the same codec and size losslessly: the streams are copied by ffmpeg's concat demuxer,
+    which has to be on the PATH (see `has_ffmpeg`). Raises RuntimeError if it isn't or if it fails.
+    reencode: decode the frames and encode them again with OpenCV instead, for when ffmpeg isn't available. This is
+        lossy, a second generation of the codec.
+    """
+    if reencode:
+        _reencode_videos(paths, output_path, fourcc, fps, frame_size)
+        return
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is not on the PATH, it is needed to concatenate videos without re-encoding them")
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", dir=os.path.dirname(output_path) or ".") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        f.flush()
+        command = [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", f.name]
+        result = subprocess.run([*command, "-c", "copy", str(output_path)], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg failed to concatenate {len(paths)} videos into {output_path}: {result.stderr.strip()}"
+        )
+
+
+def has_ffmpeg() -> bool:
+    """Whether `concat_videos` can concatenate without re-encoding"""
+    return shutil.which("ffmpeg") is not None
+
+
+def _reencode_videos(paths, output_path, fourcc, fps, frame_size):
+    video_writer = cv2.VideoWriter(str(output_path), fourcc, fps, tuple(frame_size))
+    try:
+        for path in paths:
+            capture = cv2.VideoCapture(str(path))
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                video_writer.write(frame)
+            capture.release()
+    finally:
+        video_writer.release()
+
+
+def concat_frame_timestamps(paths, leading_repeats, output_path):
+    """
+    Merge the `FrameTimestamps` CSVs of consecutive segments of a video. leading_repeats[i] is the number of
+    input frames at the start of segment i that repeat the last encoded frame of the previous segments, they
+    are added to its row.
+    """
+    header, rows = None, []
+    for path, repeats in zip(paths, leading_repeats):
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            if repeats:
+                if not rows:
+                    raise ValueError(f"{path} starts with repeats of a frame of no previous segment")
+                rows[-1][2] = str(int(rows[-1][2]) + repeats)
+            rows.extend([len(rows), time, count] for _, time, count in reader)
+
+    with open(output_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
@@ -1,20 +1,31 @@
+import functools
 import importlib.resources
 import os
-import re
+import string
+from typing import NamedTuple, Optional, Tuple
 
 import cv2
 import numpy as np
-import pandas as pd
+import PIL
 from nle import nethack
-from numba import njit
+from numba import njit, prange
 from PIL import Image, ImageDraw, ImageFont
 
+from nle_utils import screen
 from nle_utils.blstats import BLStats
+from nle_utils.collections import RingBuffer
+from nle_utils.item import ItemClasses
+from nle_utils.layout import FONT_SIZE, FRAME_THICKNESS, HISTORY_SIZE, compute_layout
 from nle_utils.level import Level
+from nle_utils.tileset import load_glyph2tile, load_tiles
+from nle_utils.utils.cache import cached_array, file_digest
 
-HISTORY_SIZE = 13
-FONT_SIZE = 32
 RENDERS_HISTORY_SIZE = 128
+TEXT_SPRITE_CACHE_SIZE = 4096
+# pixels the bold text passes are offset by in every direction
+BOLD_OFFSET = 1
+# bump when the array built by _initialize_char_masks changes, to invalidate on-disk caches
+CHAR_MASKS_VERSION = 2
 
 nle_utils_dir = os.path.dirname(importlib.resources.files("nle_utils").__str__())
 SMALL_FONT_PATH = os.path.join(nle_utils_dir, "Hack-Regular.ttf")
@@ -40,24 +51,53 @@ COLORS = [
     "#00FFFF",
     "#FFFFFF",
 ]
+PALETTE = np.array([[int(color[i : i + 2], 16) for i in (1, 3, 5)] for color in COLORS], dtype=np.uint8)
 
+# object class -> position in the inventory (ItemClasses order), unknown classes go last
+ITEM_CLASSES = list(ItemClasses)
+ITEM_CLASS_RANK = np.full(max(c.value for c in ItemClasses) + 1, len(ITEM_CLASSES), dtype=np.int64)
+ITEM_CLASS_RANK[[c.value for c in ITEM_CLASSES]] = np.arange(len(ITEM_CLASSES))
 
-@njit
+
+@njit(inline="always")
+def _blit(out_image, h_pixel, w_pixel, block):
+    """
+    Copy a (h, w, 3) block to out_image at (h_pixel, w_pixel), explicit loops are much faster than slice assignment
+    """
+    for y in range(block.shape[0]):
+        for x in range(block.shape[1]):
+            for c in range(block.shape[2]):
+                out_image[h_pixel + y, w_pixel + x, c] = block[y, x, c]
+
+
+@njit(inline="always")
+def _blit_char(out_rows, h_pixel, w_byte, sprite):
+    """
+    Copy a (h, w * 3) colorized character sprite to (H, W * 3) out_rows at pixel row h_pixel and byte column
+    w_byte. Inlined at numba IR level so that the contiguous inner loop over bytes is vectorized, a regular call
+    is several times slower
+    """
+    for y in range(sprite.shape[0]):
+        for k in range(sprite.shape[1]):
+            out_rows[h_pixel + y, w_byte + k] = sprite[y, k]
+
+
+@njit(cache=True)
 def _tile_characters_to_image(
-    out_image,
+    out_rows,
     chars,
     colors,
     output_height_chars,
     output_width_chars,
-    char_array,
+    char_sprites,
     offset_h,
     offset_w,
 ):
     """
-    Build an image using cached images of characters in char_array to out_image
+    Build an image (viewed as `_as_rows`) from the colorized character sprites of `colorize_char_masks`
     """
-    char_height = char_array.shape[3]
-    char_width = char_array.shape[4]
+    char_height = char_sprites.shape[2]
+    char_bytes = char_sprites.shape[3]
     for h in range(output_height_chars):
         h_char = h + offset_h
         # Stuff outside boundaries is not visible, so
@@ -70,15 +110,103 @@ def _tile_characters_to_image(
                 continue
             char = chars[h_char, w_char]
             color = min(colors[h_char, w_char], 15)
-            h_pixel = h * char_height
-            w_pixel = w * char_width
-            out_image[:, h_pixel : h_pixel + char_height, w_pixel : w_pixel + char_width] = char_array[char, color]
+            _blit_char(out_rows, h * char_height, w * char_bytes, char_sprites[color, char])
+
+
+@njit(cache=True)
+def _tile_characters_row(out_rows, chars, colors, char_sprites, h, cols):
+    """Rasterize the first cols characters of terminal row h into out_rows"""
+    char_height = char_sprites.shape[2]
+    char_bytes = char_sprites.shape[3]
+    for w in range(cols):
+        color = min(colors[h, w], 15)
+        _blit_char(out_rows, h * char_height, w * char_bytes, char_sprites[color, chars[h, w]])
+
+
+@njit(cache=True)
+def _tile_characters_to_images(out_rows, chars, colors, char_sprites):
+    """
+    Batched `_tile_characters_to_image` without offsets: rasterize (B, rows, cols) terminals into (B, H, W * 3)
+    out_rows
+    """
+    rows = min(chars.shape[1], out_rows.shape[1] // char_sprites.shape[2])
+    cols = min(chars.shape[2], out_rows.shape[2] // char_sprites.shape[3])
+    for i in range(chars.shape[0] * rows):
+        b = i // rows
+        _tile_characters_row(out_rows[b], chars[b], colors[b], char_sprites, i % rows, cols)
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def _tile_characters_to_images_parallel(out_rows, chars, colors, char_sprites):
+    """`_tile_characters_to_images` with the rows of all terminals split between numba threads"""
+    rows = min(chars.shape[1], out_rows.shape[1] // char_sprites.shape[2])
+    cols = min(chars.shape[2], out_rows.shape[2] // char_sprites.shape[3])
+    for i in prange(chars.shape[0] * rows):
+        # a row is a separate function, numba doesn't vectorize the blits when they are inlined in a prange body
+        b = i // rows
+        _tile_characters_row(out_rows[b], chars[b], colors[b], char_sprites, i % rows, cols)
+
+
+@njit(cache=True)
+def _retile_changed_characters(out_rows, chars, colors, prev_chars, prev_colors, char_sprites):
+    """
+    Redraw only the characters that differ from prev_chars/prev_colors, which are updated in place.
+    Returns the number of redrawn characters
+    """
+    char_height = char_sprites.shape[2]
+    char_bytes = char_sprites.shape[3]
+    changed = 0
+    for h in range(prev_chars.shape[0]):
+        for w in range(prev_chars.shape[1]):
+            char = chars[h, w]
+            color = min(colors[h, w], 15)
+            if char == prev_chars[h, w] and color == prev_colors[h, w]:
+                continue
+            prev_chars[h, w] = char
+            prev_colors[h, w] = color
+            _blit_char(out_rows, h * char_height, w * char_bytes, char_sprites[color, char])
+            changed += 1
+    return changed
+
+
+@njit(cache=True)
+def _tile_glyphs_to_image(out_images, glyphs, glyph2tile, tileset):
+    """
+    Build (B, nrow * tile_height, ncol * tile_width, 3) map images by copying the tile of every glyph to out_images
+    """
+    tile_height = tileset.shape[1]
+    tile_width = tileset.shape[2]
+    for b in range(glyphs.shape[0]):
+        for h in range(glyphs.shape[1]):
+            for w in range(glyphs.shape[2]):
+                _blit(out_images[b], h * tile_height, w * tile_width, tileset[glyph2tile[glyphs[b, h, w]]])
 
 
-def _initialize_char_array(font_size, rescale_font_size):
+@njit(cache=True)
+def _retile_changed_glyphs(out_image, glyphs, prev_glyphs, glyph2tile, tileset):
+    """
+    Redraw only the tiles of glyphs that differ from prev_glyphs, which is updated in place.
+    Returns the number of redrawn tiles
+    """
+    tile_height = tileset.shape[1]
+    tile_width = tileset.shape[2]
+    changed = 0
+    for h in range(glyphs.shape[0]):
+        for w in range(glyphs.shape[1]):
+            glyph = glyphs[h, w]
+            if glyph == prev_glyphs[h, w]:
+                continue
+            prev_glyphs[h, w] = glyph
+            _blit(out_image, h * tile_height, w * tile_width, tileset[glyph2tile[glyph]])
+            changed += 1
+    return changed
+
+
+def _initialize_char_masks(font_size, rescale_font_size):
     """Draw all characters in PIL and cache them in numpy arrays
     if rescale_font_size is given, assume it is (width, height)
-    Returns a np array of (num_chars, num_colors, char_height, char_width, 3)
+    Returns a np array of (num_chars, char_height, char_width) grayscale masks, the kernels colorize them
+    when drawing as all 16 colors differ only by tint
     """
     font = ImageFont.truetype(SMALL_FONT_PATH, font_size)
     dummy_text = "".join([(chr(i) if chr(i).isprintable() else " ") for i in range(256)])
@@ -88,49 +216,172 @@ def _initialize_char_array(font_size, rescale_font_size):
 
     char_width = rescale_font_size[0]
     char_height = rescale_font_size[1]
-    char_array = np.zeros((256, 16, char_height, char_width, 3), dtype=np.uint8)
+    char_masks = np.zeros((256, char_height, char_width), dtype=np.uint8)
+
+    for char_index in range(256):
+        char = dummy_text[char_index]
+
+        image = Image.new("L", (image_width, image_height))
+        image_draw = ImageDraw.Draw(image)
+
+        _, _, width, height = font.getbbox(char)
+        x = (image_width - width) // 2
+        y = (image_height - height) // 2
+        image_draw.text((x, y), char, font=font, fill=255)
+
+        arr = np.array(image)
+        if rescale_font_size:
+            arr = cv2.resize(arr, rescale_font_size, interpolation=cv2.INTER_AREA)
+        char_masks[char_index] = arr
+
+    return char_masks
+
+
+def _char_masks_key(font_size, rescale_font_size):
+    """Everything the char masks depend on, the key of their on-disk cache"""
+    return (
+        CHAR_MASKS_VERSION,
+        file_digest(SMALL_FONT_PATH),
+        font_size,
+        tuple(rescale_font_size),
+        PIL.__version__,
+        cv2.__version__,
+    )
 
-    for color_index in range(16):
-        for char_index in range(256):
-            char = dummy_text[char_index]
 
-            image = Image.new("RGB", (image_width, image_height))
-            image_draw = ImageDraw.Draw(image)
-            image_draw.rectangle((0, 0, image_width, image_height), fill=(0, 0, 0))
+def load_char_masks(font_size, rescale_font_size):
+    """`_initialize_char_masks` through the on-disk cache, the result is a read-only memory-mapped array"""
+    key = _char_masks_key(font_size, rescale_font_size)
+    return cached_array("char_masks", key, lambda: _initialize_char_masks(font_size, rescale_font_size))
 
-            _, _, width, height = font.getbbox(char)
-            x = (image_width - width) // 2
-            y = (image_height - height) // 2
-            image_draw.text((x, y), char, font=font, fill=COLORS[color_index])
 
-            arr = np.array(image).copy()
-            if rescale_font_size:
-                arr = cv2.resize(arr, rescale_font_size, interpolation=cv2.INTER_AREA)
-            char_array[char_index, color_index] = arr
+def colorize_char_masks(char_masks, palette=PALETTE):
+    """
+    (256, h, w) grayscale char_masks as (16, 256, h, w * 3) RGB sprites of every character in every palette color,
+    so that rasterizing a terminal is a plain copy
+    """
+    sprites = (char_masks[None, ..., None].astype(np.uint16) * palette[:, None, None, None, :] + 127) // 255
+    return sprites.astype(np.uint8).reshape(*sprites.shape[:3], -1)
+
+
+def load_char_sprites(font_size, rescale_font_size, palette=PALETTE):
+    """
+    `colorize_char_masks` of `load_char_masks` through the on-disk cache, read-only and memory-mapped so that
+    all the visualizers and worker processes share a single copy of the sprites (16 times the masks)
+    """
+    key = (_char_masks_key(font_size, rescale_font_size), palette.tobytes())
+    return cached_array(
+        "char_sprites", key, lambda: colorize_char_masks(load_char_masks(font_size, rescale_font_size), palette)
+    )
+
+
+def _as_rows(image):
+    """View a (..., H, W, 3) image with contiguous pixels (e.g. a pane of a frame) as (..., H, W * 3) rows of bytes"""
+    rows = image.view()
+    rows.shape = (*image.shape[:-2], image.shape[-2] * 3)
+    return rows
+
 
-    return char_array
+def rasterize_ttys(tty_chars, tty_colors, char_sprites, out=None, parallel=False):
+    """
+    Rasterize B terminals, (B, rows, cols) chars and colors, with the character sprites of `colorize_char_masks`
+    into (B, rows * h, cols * w, 3) RGB out (any view of that shape with contiguous pixels).
+
+    parallel: split the rows between numba threads. Once the parallel kernel ran, forking the process (the
+        default multiprocessing start method on Linux) makes it hang at exit under numba's TBB threading layer,
+        processes started afterwards have to use a "spawn" or "forkserver" context.
+    """
+    batch_size, rows, cols = tty_chars.shape
+    shape = (batch_size, rows * char_sprites.shape[2], cols * char_sprites.shape[3] // 3, 3)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    assert out.shape == shape and out.dtype == np.uint8, (out.shape, shape)
+    kernel = _tile_characters_to_images_parallel if parallel else _tile_characters_to_images
+    kernel(_as_rows(out), tty_chars, tty_colors, char_sprites)
+    return out
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+
+def warmup_kernels():
+    """
+    Compile (or load from the numba cache) the kernels for the array types `Visualize`, `RenderTtyrec` and
+    `TileTTY` pass them, on tiny dummy arrays: contiguous buffers and pane views of frames, uint8/int8
+    observations and the int16 stacked crops of `TileTTY`, read-only memory-mapped tiles, glyph2tile and
+    character sprites.
+    The parallel kernel isn't run, so that the process can still fork (see `rasterize_ttys`).
+    """
+    tileset = _readonly(np.zeros((1, 2, 2, 3), dtype=np.uint8))
+    glyph2tile = _readonly(np.zeros(1, dtype=np.int16))
+    char_sprites = _readonly(np.zeros((16, 256, 2, 6), dtype=np.uint8))
+    # (B, H, W, 3) frames, the left half is a pane view like `Rect.view`
+    frames = np.zeros((1, 4, 8, 3), dtype=np.uint8)
+
+    glyphs = np.zeros((1, 2, 2), dtype=np.int16)
+    _tile_glyphs_to_image(frames[:, :, :4], glyphs, glyph2tile, tileset)
+    _retile_changed_glyphs(frames[0, :, :4], glyphs[0], np.full((2, 2), -1, dtype=np.int32), glyph2tile, tileset)
+
+    for chars_dtype, colors_dtype in ((np.uint8, np.int8), (np.int16, np.int16)):
+        chars = np.zeros((1, 2, 2), dtype=chars_dtype)
+        colors = np.zeros((1, 2, 2), dtype=colors_dtype)
+        for out in (frames[:, :, :4], np.zeros((1, 4, 4, 3), dtype=np.uint8)):
+            _tile_characters_to_images(_as_rows(out), chars, colors, char_sprites)
+            _tile_characters_to_image(_as_rows(out[0]), chars[0], colors[0], 2, 2, char_sprites, 0, 0)
+            prev_chars = np.zeros((2, 2), dtype=np.uint8)
+            prev_colors = np.full((2, 2), -1, dtype=np.int8)
+            _retile_changed_characters(_as_rows(out[0]), chars[0], colors[0], prev_chars, prev_colors, char_sprites)
+
+
+def _pane(out, height, width, clear=True):
+    """Return out (a view of the frame the pane is drawn into) or a new image if out is None"""
+    if out is None:
+        return np.zeros((height, width, 3), dtype=np.uint8)
+    assert out.shape == (height, width, 3), (out.shape, height, width)
+    if clear:
+        out.fill(0)
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def _text_ascent(scale, thickness=1):
+    """
+    Rows the letters and digits drawn by `_put_text` at scale reach above their baseline. The antialiased strokes
+    go a pixel or two beyond the height getTextSize reports, so the height is measured on the drawn text.
+    """
+    text = string.ascii_letters + string.digits
+    (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, scale * 2, thickness)
+    canvas = np.zeros((2 * height + baseline, width + 2 * height), dtype=np.uint8)
+    cv2.putText(canvas, text, (height, 2 * height), cv2.FONT_HERSHEY_PLAIN, scale * 2, 255, thickness, cv2.LINE_AA)
+    return 2 * height - int(np.flatnonzero(canvas.any(axis=1))[0])
 
 
-def _draw_grid(imgs, ncol):
-    grid = imgs.reshape((-1, ncol, *imgs[0].shape))
-    rows = []
-    for row in grid:
-        rows.append(np.concatenate(row, axis=1))
-    return np.concatenate(rows, axis=0)
+def _text_origin(scale, thickness=1):
+    """
+    (x, y) of the bottom-left origin of cv2.putText from the top left of a text line: the text and its bold passes
+    start below a pane frame (scaled as in `compute_layout`), which covers the top of the first line of a pane
+    """
+    frame_thickness = max(1, round(FRAME_THICKNESS * scale))
+    return round(FONT_SIZE * scale) // 2, frame_thickness + BOLD_OFFSET + _text_ascent(scale, thickness)
 
 
 def _put_text(img, text, pos, scale=FONT_SIZE / 32, thickness=1, color=(255, 255, 0), bg_color=None, bold=False):
-    # TODO: figure out how exactly opencv anchors the text
-    pos = (pos[0] + FONT_SIZE // 2, pos[1] + FONT_SIZE // 2 + 8)
+    line_top = pos[1]
+    origin_x, origin_y = _text_origin(scale, thickness)
+    pos = (pos[0] + origin_x, pos[1] + origin_y)
+    # the next line's text starts a frame thickness below its top
+    line_end = line_top + round(FONT_SIZE * scale) + max(1, round(FRAME_THICKNESS * scale))
 
     font = cv2.FONT_HERSHEY_PLAIN  # Monospaced font
     scale *= 2  # Adjust scale for better visibility in console
 
     if bg_color is not None:
-        (text_width, text_height), baseline = cv2.getTextSize(text, font, scale, thickness)
-        # Calculate the rectangle's position
-        rect_pos = (pos[0], pos[1] - text_height - baseline)
-        rect_end = (pos[0] + text_width, pos[1] + baseline)
+        (text_width, _), _ = cv2.getTextSize(text, font, scale, thickness)
+        # the whole line, down to where the text of the next one starts
+        rect_pos = (pos[0], line_top)
+        rect_end = (pos[0] + text_width, line_end - 1)
 
         # Draw the background rectangle
         cv2.rectangle(img, rect_pos, rect_end, bg_color, -1)
@@ -142,8 +393,8 @@ def _put_text(img, text, pos, scale=FONT_SIZE / 32, thickness=1, color=(255, 255
 
     if bold:
         # Draw the text multiple times with small offsets to create a bold effect
-        for offset_x in range(-1, 2):
-            for offset_y in range(-1, 2):
+        for offset_x in range(-BOLD_OFFSET, BOLD_OFFSET + 1):
+            for offset_y in range(-BOLD_OFFSET, BOLD_OFFSET + 1):
                 draw_text(offset_x, offset_y)
     else:
         # Draw the text once for normal weight
@@ -152,49 +403,118 @@ def _put_text(img, text, pos, scale=FONT_SIZE / 32, thickness=1, color=(255, 255
     return img
 
 
+@functools.lru_cache(maxsize=TEXT_SPRITE_CACHE_SIZE)
+def _text_sprite(text, scale, color, bg_color, bold):
+    """
+    `_put_text` rasterized once on black and cropped to the drawn pixels, returns the read-only sprite and its
+    (x, y) offset from the text position, or None if nothing is drawn
+    """
+    (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, scale * 2, 1)
+    anchor_x, anchor_y = _text_origin(scale)
+    # generous margins, glyphs and bold offsets reach a little beyond the box reported by getTextSize
+    margin = text_height + 4
+    x0 = min(anchor_x, 0) - margin
+    y0 = anchor_y - text_height - baseline - margin
+    canvas = np.zeros((anchor_y + baseline + margin - y0, anchor_x + text_width + margin - x0, 3), dtype=np.uint8)
+    _put_text(canvas, text, (-x0, -y0), scale=scale, color=color, bg_color=bg_color, bold=bold)
+
+    ys, xs = np.nonzero(canvas.any(axis=2))
+    if len(ys) == 0:
+        return None
+    sprite = canvas[ys.min() : ys.max() + 1, xs.min() : xs.max() + 1].copy()
+    sprite.flags.writeable = False
+    return sprite, x0 + xs.min(), y0 + ys.min()
+
+
+def _blit_sprite(img, sprite, x, y):
+    """Draw a text sprite at (x, y) of img clipped to it, on a black pane this is the same as drawing the text"""
+    h0, w0 = max(y, 0), max(x, 0)
+    h1, w1 = min(y + sprite.shape[0], img.shape[0]), min(x + sprite.shape[1], img.shape[1])
+    if h0 < h1 and w0 < w1:
+        dst = img[h0:h1, w0:w1]
+        np.maximum(dst, sprite[h0 - y : h1 - y, w0 - x : w1 - x], out=dst)
+
+
 def _draw_frame(img, color=(90, 90, 90), thickness=3):
     return cv2.rectangle(img, (0, 0), (img.shape[1] - 1, img.shape[0] - 1), color, thickness)
 
 
+class TextLine(NamedTuple):
+    """A line of text of a pane"""
+
+    line: int
+    text: str
+    color: Tuple[int, int, int] = (255, 255, 0)
+    indent: int = 0
+    bg_color: Optional[Tuple[int, int, int]] = None
+    bold: bool = False
+
+
+class History:
+    """
+    Action, message and popup history of a single environment. Only the last capacity entries are kept,
+    steps counts all actions since the reset.
+    """
+
+    def __init__(self, capacity: int = HISTORY_SIZE):
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.action_history = RingBuffer(self.capacity)
+        self.message_history = RingBuffer(self.capacity)
+        self.popup_history = RingBuffer(self.capacity)
+        self.steps = 0
+
+
 class Visualize:
     def __init__(
         self,
         tileset_path="tilesets/3.6.1tiles32.png",
         tile_size=32,
         render_font_size=(12, 22),
+        incremental: bool = False,
+        output_size: Optional[Tuple[int, int]] = None,
     ):
-        self.render_font_size = render_font_size
-        self.tileset = cv2.imread(tileset_path)[..., ::-1]
-        if self.tileset is None:
-            raise FileNotFoundError(f"Tileset {tileset_path} not found")
-        if self.tileset.shape[0] % tile_size != 0 or self.tileset.shape[1] % tile_size != 0:
-            raise ValueError("Tileset and tile_size doesn't match modulo")
-
-        h = self.tileset.shape[0] // tile_size
-        w = self.tileset.shape[1] // tile_size
-        tiles = []
-        for y in range(h):
-            y *= tile_size
-            for x in range(w):
-                x *= tile_size
-                tiles.append(self.tileset[y : y + tile_size, x : x + tile_size])
-        self.tileset = np.array(tiles)
-        from glyph2tile import glyph2tile
-
-        self.glyph2tile = np.array(glyph2tile)
+        """
+        incremental: keep the previous frame and only redraw the map tiles and tty characters that changed since
+            then (everything is redrawn on level change), the frames are identical to the non-incremental ones.
+        output_size: (width, height) of the frames, tiles, font atlas and panes are rasterized directly at that
+            size (see `compute_layout`) and render_font_size is ignored. None keeps the native frame size.
+        """
+        self.layout = compute_layout(output_size, tile_size, render_font_size)
+        self.render_font_size = self.layout.char_size
+        self.incremental = incremental
+        self.tileset = load_tiles(tileset_path, tile_size, self.layout.tile_size)
+        self.glyph2tile = load_glyph2tile()
 
         self.video_writer = None
         self.fourcc = cv2.VideoWriter_fourcc(*"mp4v")  # or use 'XVID' for .avi format
 
-        self.action_history = list()
-        self.message_history = list()
-        self.popup_history = list()
+        self.history = History()
 
         self._window_name = "NetHack"
 
-        self.render_char_array = _initialize_char_array(FONT_SIZE, render_font_size)
-        self.render_char_array = self.render_char_array.transpose(0, 1, 4, 2, 3)
-        self.render_char_array = np.ascontiguousarray(self.render_char_array)
+        self.render_char_masks = load_char_masks(FONT_SIZE, self.render_font_size)
+        self.render_char_sprites = load_char_sprites(FONT_SIZE, self.render_font_size)
+
+        # buffers reused between frames, so that steady-state rendering doesn't allocate images
+        self._frame = None
+        self._tty_image = np.zeros(
+            (
+                nethack.nethack.TERMINAL_SHAPE[0] * self.render_font_size[1],
+                nethack.nethack.TERMINAL_SHAPE[1] * self.render_font_size[0],
+                3,
+            ),
+            dtype=np.uint8,
+        )
+        # what is currently drawn in self._frame map and tty (or self._tty_image if the tty is resized),
+        # used by incremental rendering
+        self._prev_glyphs = None
+        self._prev_level = None
+        self._prev_tty_chars = np.zeros(nethack.nethack.TERMINAL_SHAPE, dtype=np.uint8)
+        self._prev_tty_colors = np.full(nethack.nethack.TERMINAL_SHAPE, -1, dtype=np.int8)
+        self._prev_pane_lines = {}
 
     def render(
         self,
@@ -210,73 +530,262 @@ class Visualize:
         info,
         # TODO: add tty_cursor
     ):
-        tiles_idx = self.glyph2tile[glyphs]
-        tiles = self.tileset[tiles_idx.reshape(-1)]
-        scene_vis = _draw_grid(tiles, glyphs.shape[1])
-        topbar = self._draw_topbar(scene_vis.shape[1])
-        bottombar = self._draw_bottombar(tty_chars, tty_colors, blstats, info, scene_vis.shape[1])
-        rendered = np.concatenate([topbar, scene_vis, bottombar], axis=0)
-        inventory = self._draw_inventory(inv_glyphs, inv_letters, inv_oclasses, inv_strs, rendered.shape[0])
-        rendered = np.concatenate([rendered, inventory], axis=1)
+        """Render a single frame.
 
-        image = rendered[..., ::-1]
+        The returned BGR image is a view of a frame buffer owned by the visualizer which is overwritten
+        by the next call, copy it if it has to outlive that.
+        """
+        if self._frame is None:
+            self._frame = np.zeros(self.frame_shape(), dtype=np.uint8)
+            self.invalidate()
+
+        if self.incremental:
+            self._redraw_map(glyphs, blstats)
+        else:
+            self._draw_map(glyphs[None], self._frame[None])
+        self._draw_panes(
+            self._frame,
+            blstats,
+            inv_glyphs,
+            inv_letters,
+            inv_oclasses,
+            inv_strs,
+            tty_chars,
+            tty_colors,
+            info,
+            self.history,
+            incremental=self.incremental,
+        )
 
-        return image
+        return self._frame[..., ::-1]
 
-    def reset_history(self):
-        self.action_history = list()
-        self.message_history = list()
-        self.popup_history = list()
-
-    def update_history(self, action, message, tty_chars):
-        self.action_history.append(action)
-        self.update_message_and_popup_history(message, tty_chars)
-
-    def _draw_bottombar(self, tty_chars, tty_colors, blstats, info, width):
-        height = FONT_SIZE * len(tty_chars)
-        tty = self._draw_tty(tty_chars, tty_colors, width - width // 2, height)
-        stats = self._draw_stats(blstats, info, width // 2, height)
-        return np.concatenate([tty, stats], axis=1)
-
-    def _draw_tty(self, tty_chars, tty_colors, width, height):
-        chw_image_shape = (
-            3,
-            nethack.nethack.TERMINAL_SHAPE[0] * self.render_char_array.shape[3],
-            nethack.nethack.TERMINAL_SHAPE[1] * self.render_char_array.shape[4],
+    def invalidate(self):
+        """Force the next incremental `render` to redraw the whole frame"""
+        self._prev_glyphs = None
+        self._prev_tty_colors.fill(-1)
+        self._prev_pane_lines.clear()
+
+    def frame_shape(self):
+        """(height, width, 3) of a frame produced by `render`"""
+        return self.layout.shape
+
+    def render_batch(
+        self,
+        glyphs,
+        blstats,
+        message,
+        inv_glyphs,
+        inv_letters,
+        inv_oclasses,
+        inv_strs,
+        tty_chars,
+        tty_colors,
+        infos,
+        histories=None,
+        out=None,
+    ):
+        """Render frames of B environments at once.
+
+        All observation arguments are stacked along a leading batch axis, e.g. glyphs is (B, 21, 79),
+        infos is a sequence of B info dicts and histories an optional sequence of B `History` objects
+        (empty history panes are drawn when not given). The map mosaic of all environments is built
+        in a single pass into out, a preallocated (B, *frame_shape()) uint8 RGB buffer that can be reused
+        between calls (zero it once, the gaps between panes are never drawn). Returns the BGR view of out,
+        the same color order as `render`.
+        """
+        batch_size = glyphs.shape[0]
+        frame_shape = self.frame_shape()
+        if out is None:
+            out = np.zeros((batch_size, *frame_shape), dtype=np.uint8)
+        assert out.shape == (batch_size, *frame_shape) and out.dtype == np.uint8
+        if histories is None:
+            histories = [History()] * batch_size
+
+        self._draw_map(glyphs, out)
+        for i in range(batch_size):
+            self._draw_panes(
+                out[i],
+                blstats[i],
+                inv_glyphs[i],
+                inv_letters[i],
+                inv_oclasses[i],
+                inv_strs[i],
+                tty_chars[i],
+                tty_colors[i],
+                infos[i],
+                histories[i],
+            )
+
+        return out[..., ::-1]
+
+    def _draw_map(self, glyphs, frames):
+        """Tile (B, nrow, ncol) glyphs straight into the map area of (B, H, W, 3) frames"""
+        _tile_glyphs_to_image(self.layout.map.view(frames), glyphs, self.glyph2tile, self.tileset)
+
+    def _redraw_map(self, glyphs, blstats):
+        """Redraw only the changed map tiles of self._frame, or all of them after a level change"""
+        level = (blstats[nethack.NLE_BL_DNUM], blstats[nethack.NLE_BL_DLEVEL])
+        if level != self._prev_level:
+            self.invalidate()
+            self._prev_level = level
+        if self._prev_glyphs is None or self._prev_glyphs.shape != glyphs.shape:
+            self._prev_glyphs = np.full(glyphs.shape, -1, dtype=np.int32)
+
+        _retile_changed_glyphs(
+            self.layout.map.view(self._frame), glyphs, self._prev_glyphs, self.glyph2tile, self.tileset
         )
-        out_image = np.zeros(chw_image_shape, dtype=np.uint8)
-
-        _tile_characters_to_image(
-            out_image=out_image,
-            chars=tty_chars,
-            colors=tty_colors,
-            output_height_chars=nethack.nethack.TERMINAL_SHAPE[0],
-            output_width_chars=nethack.nethack.TERMINAL_SHAPE[1],
-            char_array=self.render_char_array,
-            offset_h=0,
-            offset_w=0,
+
+    def _draw_panes(
+        self,
+        frame,
+        blstats,
+        inv_glyphs,
+        inv_letters,
+        inv_oclasses,
+        inv_strs,
+        tty_chars,
+        tty_colors,
+        info,
+        history,
+        incremental=False,
+    ):
+        """Draw everything around the map into views of frame"""
+        layout = self.layout
+        self._draw_action_history(history, out=layout.actions.view(frame), incremental=incremental)
+        self._draw_message_history(history, out=layout.messages.view(frame), incremental=incremental)
+        self._draw_popup_history(history, out=layout.popups.view(frame), incremental=incremental)
+        self._draw_tty(
+            tty_chars,
+            tty_colors,
+            layout.tty.width,
+            layout.tty.height,
+            out=layout.tty.view(frame),
+            incremental=incremental,
         )
+        self._draw_stats(blstats, info, history, out=layout.stats.view(frame), incremental=incremental)
+        self._draw_inventory(
+            inv_glyphs,
+            inv_letters,
+            inv_oclasses,
+            inv_strs,
+            out=layout.inventory.view(frame),
+            incremental=incremental,
+        )
+
+    @property
+    def action_history(self) -> RingBuffer:
+        """The last HISTORY_SIZE actions of `history`, newest last"""
+        return self.history.action_history
 
-        tty_image = out_image.transpose(1, 2, 0)
-        tty = cv2.resize(tty_image, (width, height), interpolation=cv2.INTER_AREA)
-        return tty
+    @property
+    def message_history(self) -> RingBuffer:
+        """The last HISTORY_SIZE messages of `history`, newest last"""
+        return self.history.message_history
 
-    def _draw_stats(self, blstats, info, width, height):
-        ret = np.zeros((height, width, 3), dtype=np.uint8)
+    @property
+    def popup_history(self) -> RingBuffer:
+        """The last HISTORY_SIZE popups (lists of lines) of `history`, newest last"""
+        return self.history.popup_history
+
+    def reset_history(self):
+        self.history.reset()
+
+    def update_history(self, action, message, tty_chars, history=None):
+        history = history or self.history
+        history.action_history.append(action)
+        history.steps += 1
+        self.update_message_and_popup_history(message, tty_chars, history)
+
+    def _draw_tty(self, tty_chars, tty_colors, width, height, out=None, incremental=False):
+        """Draw the terminal at (width, height).
+
+        If that is the size of the rasterized terminal the characters are drawn straight into out (or into an
+        internal buffer that is returned and overwritten by the next call if out is None), otherwise the terminal
+        is resized into out. With incremental, only changed characters are redrawn and out is assumed to still
+        hold the previous terminal, so it is left untouched if nothing changed.
+        """
+        direct = (height, width) == self._tty_image.shape[:2]
+        if out is None:
+            target = self._tty_image
+        else:
+            assert out.shape == (height, width, 3), (out.shape, height, width)
+            target = out if direct else self._tty_image
+
+        if incremental:
+            changed = _retile_changed_characters(
+                _as_rows(target),
+                tty_chars,
+                tty_colors,
+                self._prev_tty_chars,
+                self._prev_tty_colors,
+                self.render_char_sprites,
+            )
+            if changed == 0 and out is not None:
+                return out
+        else:
+            _tile_characters_to_images(
+                _as_rows(target[None]), tty_chars[None], tty_colors[None], self.render_char_sprites
+            )
+            # the drawn terminal no longer matches what incremental rendering has drawn
+            self._prev_tty_colors.fill(-1)
+
+        if direct:
+            return target
+        out = _pane(out, height, width, clear=False)
+        cv2.resize(self._tty_image, (width, height), dst=out, interpolation=cv2.INTER_AREA)
+        return out
+
+    def draw_ttys(self, tty_chars, tty_colors, out=None, parallel=False):
+        """
+        Rasterize B terminals, (B, rows, cols) tty_chars and tty_colors, at the size of the font atlas (no resizing)
+        into (B, TERMINAL_SHAPE[0] * char_height, TERMINAL_SHAPE[1] * char_width, 3) RGB out, see `rasterize_ttys`
+        """
+        shape = (len(tty_chars), *self._tty_image.shape)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        assert out.shape == shape and out.dtype == np.uint8, (out.shape, shape)
+        kernel = _tile_characters_to_images_parallel if parallel else _tile_characters_to_images
+        kernel(_as_rows(out), tty_chars, tty_colors, self.render_char_sprites)
+        return out
+
+    def _draw_lines(self, lines, rect, out=None, pane=None):
+        """
+        Draw `TextLine`s into a cleared, framed pane of the size of rect. Text is blitted from cached sprites.
+        With a pane name (incremental rendering into self._frame) out is left untouched if it already shows lines.
+        """
+        out = _pane(out, rect.height, rect.width, clear=False)
+        if pane is not None:
+            if self._prev_pane_lines.get(pane) == lines:
+                return out
+            self._prev_pane_lines[pane] = lines
+
+        out.fill(0)
+        scale = self.layout.font_scale
+        for line in lines:
+            sprite = _text_sprite(line.text, scale, line.color, line.bg_color, line.bold)
+            if sprite is not None:
+                image, x, y = sprite
+                _blit_sprite(out, image, round(line.indent * scale) + x, line.line * self.layout.line_height + y)
+        _draw_frame(out, thickness=self.layout.frame_thickness)
+        return out
+
+    def _draw_stats(self, blstats, info, history=None, out=None, incremental=False):
+        history = history or self.history
         blstats = BLStats(*blstats)
+        lines = []
 
         # game info
         i = 0
         txt = [
             f"Score:{blstats.score}",
-            f"Step:{len(self.action_history)}",
+            f"Step:{history.steps}",
             f"Turn:{blstats.time}",
             # FIXME: how can we ensure that we use `FinalStatsWrapper` and `TaskRewardsInfoWrapper`?
             f"Dlvl:{info.get('episode_extra_stats', {'dlvl': 1})['dlvl']}",
             f"MaxDlvl:{info.get('episode_extra_stats', {'max_dlvl': 1})['max_dlvl']}",
             f"{' '.join(map(lambda x: x.capitalize(), Level(blstats.dungeon_number).name.split('_')))}",
         ]
-        _put_text(ret, " ".join(txt), (0, i * FONT_SIZE), color=(255, 255, 255))
+        lines.append(TextLine(i, " ".join(txt), color=(255, 255, 255)))
         i += 1
 
         # general character info
@@ -288,7 +797,7 @@ class Visualize:
             f"Wi:{blstats.wisdom}",
             f"Ch:{blstats.charisma}",
         ]
-        _put_text(ret, " ".join(txt), (0, i * FONT_SIZE))
+        lines.append(TextLine(i, " ".join(txt)))
         i += 1
         txt = [
             f"HP:{blstats.hitpoints}({blstats.max_hitpoints})",
@@ -296,179 +805,78 @@ class Visualize:
             f"AC:{blstats.armor_class}",
             f"Xp:{blstats.experience_level}/{blstats.experience_points}",
         ]
-        _put_text(ret, " ".join(txt), (0, i * FONT_SIZE), color=(255, 255, 255))
+        lines.append(TextLine(i, " ".join(txt), color=(255, 255, 255)))
         i += 2
 
         # extra stats info
         for k, v in info.get("episode_extra_stats", {}).items():
             txt = f"{' '.join(map(lambda x: x.capitalize(), k.split('_')))}: {v}"
-            _put_text(ret, txt, (0, i * FONT_SIZE), color=(255, 255, 255))
+            lines.append(TextLine(i, txt, color=(255, 255, 255)))
             i += 1
 
-        _draw_frame(ret)
-        return ret
-
-    def _draw_topbar(self, width):
-        actions_vis = self._draw_action_history(np.round(width / 100 * 7).astype(int))
-        messages_vis = self._draw_message_history(np.round(width / 100 * 43).astype(int))
-        popup_vis = self._draw_popup_history(np.round(width / 100 * 50).astype(int))
-        ret = np.concatenate([actions_vis, messages_vis, popup_vis], axis=1)
-        assert ret.shape[1] == width
-        return ret
-
-    def _draw_action_history(self, width):
-        vis = np.zeros((FONT_SIZE * HISTORY_SIZE, width, 3)).astype(np.uint8)
-        for i in range(HISTORY_SIZE):
-            if i >= len(self.action_history):
-                break
-            txt = self.action_history[-i - 1]
-            if i == 0:
-                _put_text(vis, txt, (0, i * FONT_SIZE), color=(255, 255, 255))
-            else:
-                _put_text(vis, txt, (0, i * FONT_SIZE), color=(120, 120, 120))
-        _draw_frame(vis)
-        return vis
-
-    def _draw_message_history(self, width):
-        messages_vis = np.zeros((FONT_SIZE * HISTORY_SIZE, width, 3)).astype(np.uint8)
-        for i in range(HISTORY_SIZE):
-            if i >= len(self.message_history):
-                break
-            txt = self.message_history[-i - 1]
-            if i == 0:
-                _put_text(messages_vis, txt, (0, i * FONT_SIZE), color=(255, 255, 255))
-            else:
-                _put_text(messages_vis, txt, (0, i * FONT_SIZE), color=(120, 120, 120))
-        _draw_frame(messages_vis)
-        return messages_vis
-
-    def _draw_popup_history(self, width):
-        messages_vis = np.zeros((FONT_SIZE * HISTORY_SIZE, width, 3)).astype(np.uint8)
-        for i in range(HISTORY_SIZE):
-            if i >= len(self.popup_history):
-                break
-            txt = "|".join(self.popup_history[-i - 1])
-            if i == 0:
-                _put_text(messages_vis, txt, (0, i * FONT_SIZE), color=(255, 255, 255))
-            else:
-                _put_text(messages_vis, txt, (0, i * FONT_SIZE), color=(120, 120, 120))
-        _draw_frame(messages_vis)
-        return messages_vis
-
-    def update_message_and_popup_history(self, message, tty_chars):
+        return self._draw_lines(lines, self.layout.stats, out, "stats" if incremental else None)
+
+    def _draw_history(self, texts, rect, out=None, pane=None):
+        """Draw the last HISTORY_SIZE texts, newest on top"""
+        lines = [
+            TextLine(i, texts[-i - 1], color=(255, 255, 255) if i == 0 else (120, 120, 120))
+            for i in range(min(HISTORY_SIZE, len(texts)))
+        ]
+        return self._draw_lines(lines, rect, out, pane)
+
+    def _draw_action_history(self, history, out=None, incremental=False):
+        return self._draw_history(history.action_history, self.layout.actions, out, "actions" if incremental else None)
+
+    def _draw_message_history(self, history, out=None, incremental=False):
+        return self._draw_history(
+            history.message_history, self.layout.messages, out, "messages" if incremental else None
+        )
+
+    def _draw_popup_history(self, history, out=None, incremental=False):
+        popups = ["|".join(popup) for popup in history.popup_history.last(HISTORY_SIZE)]
+        return self._draw_history(popups, self.layout.popups, out, "popups" if incremental else None)
+
+    def update_message_and_popup_history(self, message, tty_chars, history=None):
         """Uses MORE action to get full popup and/or message."""
-        message = "".join(map(chr, message)).replace("\0", " ").replace("\n", "").strip()
+        history = history or self.history
+        message = screen.decode(message).strip()
         if message.endswith("--More--"):
             # FIXME: It seems like in this case the environment doesn't expect additional input,
             #        but I'm not 100% sure, so it's too risky to change it, because it could stall everything.
             #        With the current implementation, in the worst case, we'll get "Unknown command ' '".
             message = message[: -len("--More--")]
 
-        assert "\n" not in message and "\r" not in message
-        popup = []
-
-        lines = ["".join(map(chr, line)).replace("\0", " ").replace("\n", "").strip() for line in tty_chars]
-        marker_pos, marker_type = self._find_marker(lines)
-
-        if marker_pos is None:
-            self.message_history.append(message)
-            self.popup_history.append(popup)
-            return
-
-        pref = ""
-        message_lines_count = 0
-        if message:
-            for i, line in enumerate(lines[: marker_pos[0] + 1]):
-                if i == marker_pos[0]:
-                    line = line[: marker_pos[1]]
-                message_lines_count += 1
-                pref += line.strip()
-
-                # I'm not sure when the new line character in broken messages should be a space and when be ignored.
-                # '#' character (and others) occasionally occurs at the beginning of the broken line and isn't in
-                # the message. Sometimes the message on the screen lacks last '.'.
-                def replace_func(x):
-                    return "".join((c for c in x if c.isalnum()))
-
-                if replace_func(pref) == replace_func(message):
-                    break
-            else:
-                if marker_pos[0] == 0:
-                    elems1 = [s for s in message.split() if s]
-                    elems2 = [s for s in pref.split() if s]
-                    assert len(elems1) < len(elems2) and elems2[-len(elems1) :] == elems1, (elems1, elems2)
-                    return pref, popup, False
-                raise ValueError(f"Message:\n{repr(message)}\ndoesn't match the screen:\n{repr(pref)}")
-
-        # cut out popup
-        for line in lines[message_lines_count : marker_pos[0]] + [lines[marker_pos[0]][: marker_pos[1]]]:
-            line = line[marker_pos[1] :].strip()
-            if line:
-                popup.append(line)
-
-        self.message_history.append(message)
-        self.popup_history.append(popup)
-
-    @staticmethod
-    def _find_marker(lines, regex=re.compile(r"(--More--|\(end\)|\(\d+ of \d+\))")):
-        """Return (line, column) of markers:
-        --More-- | (end) | (X of N)
-        """
-        if len(regex.findall(" ".join(lines))) > 1:
-            raise ValueError("Too many markers")
-
-        result, marker_type = None, None
-        for i, line in enumerate(lines):
-            res = regex.findall(line)
-            if res:
-                assert len(res) == 1
-                j = line.find(res[0])
-                result, marker_type = (i, j), res[0]
-                break
-
-        if result is not None and result[1] == 1:
-            result = (result[0], 0)  # e.g. for known items view
-        return result, marker_type
-
-    def _draw_inventory(self, inv_glyphs, inv_letters, inv_oclasses, inv_strs, height):
-        width = 1000
-        ret = np.zeros((height, width, 3), dtype=np.uint8)
+        message, popup, _ = screen.message_and_popup(message, tty_chars)
+        history.message_history.append(message)
+        history.popup_history.append(popup)
 
+    def _draw_inventory(self, inv_glyphs, inv_letters, inv_oclasses, inv_strs, out=None, incremental=False):
         # don't show empty items
-        number_of_items = len([i for i in inv_glyphs if i != 5976])
-        inv_glyphs = inv_glyphs[:number_of_items]
+        number_of_items = np.count_nonzero(np.asarray(inv_glyphs) != nethack.MAX_GLYPH)
         inv_letters = inv_letters[:number_of_items]
         inv_oclasses = inv_oclasses[:number_of_items]
-        inv_strs = inv_strs[:number_of_items]
-
-        inv_letters = list(map(chr, inv_letters))
-        inv_oclasses = [ItemClasses(o).name for o in inv_oclasses]
-        inv_strs = list(map(lambda x: "".join([chr(y) for y in x if y != 0]), inv_strs))
-
-        items = dict(
-            glyphs=inv_glyphs,
-            letters=inv_letters,
-            oclasses=inv_oclasses,
-            strs=inv_strs,
-        )
-        items = pd.DataFrame(items)
-        groups = {}
-        for name, group in items.groupby("oclasses"):
-            groups[name] = group
+        # rows viewed as fixed-width bytes drop the trailing NULs, latin-1 maps every byte to chr(byte)
+        inv_strs = np.ascontiguousarray(inv_strs[:number_of_items]).view(f"S{inv_strs.shape[-1]}")[:, 0]
 
+        # group by class in ItemClasses order, a stable sort keeps the inventory order within a class
+        ranks = ITEM_CLASS_RANK[inv_oclasses]
+        lines = []
         i = 0
-        for clas in ItemClasses:
-            if clas.name in groups:
-                txt = clas.name.capitalize()
-                _put_text(ret, txt, (0, i * FONT_SIZE), color=(0, 0, 0), bg_color=(255, 255, 255), bold=True)
-                i += 1
-
-                for item in groups[clas.name].iloc:
-                    txt = f"{item['letters']}) {item['strs']}"
-                    _put_text(ret, txt, (10, i * FONT_SIZE), color=(255, 255, 255))
+        prev_rank = None
+        for j in np.argsort(ranks, kind="stable"):
+            rank = ranks[j]
+            if rank == len(ITEM_CLASSES):
+                break
+            if rank != prev_rank:
+                if prev_rank is not None:
                     i += 1
-
+                txt = ITEM_CLASSES[rank].name.capitalize()
+                lines.append(TextLine(i, txt, color=(0, 0, 0), bg_color=(255, 255, 255), bold=True))
                 i += 1
+                prev_rank = rank
+
+            txt = f"{chr(inv_letters[j])}) {inv_strs[j].decode('latin-1')}"
+            lines.append(TextLine(i, txt, color=(255, 255, 255), indent=10))
+            i += 1
 
-        _draw_frame(ret)
-        return ret
+        return self._draw_lines(lines, self.layout.inventory, out, "inventory" if incremental else None)
@@ -1,9 +1,9 @@
-import re
-
 import gymnasium as gym
 from nle.nethack import actions as A
 from nle.nethack import tty_render
 
+from nle_utils import screen
+
 
 class AutoMore(gym.Wrapper):
     """
@@ -59,68 +59,9 @@ class AutoMore(gym.Wrapper):
     def _decode_message(self, obs):
         return self.message_and_popup(obs).strip()
 
-    def find_marker(self, lines):
-        """Return (line, column) of markers:
-        --More-- | (end) | (X of N)
-        """
-        regex = re.compile(r"(--More--|\(end\)|\(\d+ of \d+\))")
-        if len(regex.findall(" ".join(lines))) > 1:
-            raise ValueError("Too many markers")
-
-        result, marker_type = None, None
-        for i, line in enumerate(lines):
-            res = regex.findall(line)
-            if res:
-                assert len(res) == 1
-                j = line.find(res[0])
-                result, marker_type = (i, j), res[0]
-                break
-
-        # Special case: adjust column position if marker starts at position
-        if result is not None and result[1] == 1:
-            result = (result[0], 0)  # Normalize to start of line
-        return result, marker_type
-
     def message_and_popup(self, obs):
-        # Decode and clean up message and TTY characters
-        message = bytes(obs["message"]).decode("latin-1").strip("\0")
-
-        popup = []
-        lines = [bytes(line).decode("latin-1").strip("\0") for line in obs["tty_chars"]]
-        marker_pos, marker_type = self.find_marker(lines)
-
-        # If no marker found, combine message and popup directly
-        if marker_pos is None:
-            return self.combine_message_and_popup(message, popup)
-
-        pref = ""
-        message_lines_count = 0
-        if message:
-            # Try to find where the message ends in the TTY output
-            for i, line in enumerate(lines[: marker_pos[0] + 1]):
-                if i == marker_pos[0]:
-                    line = line[: marker_pos[1]]
-                message_lines_count += 1
-                pref += line.strip()
-
-                # Compare message and screen text (ignoring non-alphanumeric chars)
-                def replace_func(x):
-                    return "".join(c for c in x if c.isalnum())
-
-                if replace_func(pref) == replace_func(message):
-                    break
-            else:
-                # Handle special case for --More-- in first line
-                if marker_pos[0] == 0:
-                    return self.combine_message_and_popup(message, popup, marker_type)
-                raise ValueError(f"Message:\n{repr(message)}\ndoesn't match the screen:\n{repr(pref)}")
-
-        # Extract popup content (text between message and marker)
-        for line in lines[message_lines_count : marker_pos[0]] + [lines[marker_pos[0]][: marker_pos[1]]]:
-            line = line[marker_pos[1] :].strip()
-            if line:
-                popup.append(line)
-
+        message = screen.decode(obs["message"]).strip()
+        message, popup, marker_type = screen.message_and_popup(message, obs["tty_chars"])
         return self.combine_message_and_popup(message, popup, marker_type)
 
     def combine_message_and_popup(self, message, popup, marker_type=None):
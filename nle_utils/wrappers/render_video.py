@@ -3,9 +3,12 @@ from pathlib import Path
 import cv2
 import gymnasium as gym
 
+from nle_utils.video_writer import AsyncVideoWriter, DuplicateFrames, FrameTimestamps
 from nle_utils.visualize import Visualize
 from nle_utils.wrappers.last_info import LastInfo
 
+VIDEO_SIZE = (1920, 1080)
+
 
 class RenderVideo(LastInfo):
     def __init__(
@@ -16,14 +19,45 @@ class RenderVideo(LastInfo):
         tile_size=32,
         render_font_size=(12, 22),
         show: bool = False,
+        incremental: bool = False,
+        async_writer: bool = False,
+        queue_size: int = 8,
+        queue_policy: str = "block",
+        native_resolution: bool = False,
+        dedup: bool = False,
     ):
+        """
+        incremental: only redraw what changed since the previous frame (see `Visualize`), the frames are the same.
+        async_writer: resize and encode frames in a background thread (see `AsyncVideoWriter`), so that the
+            environment step doesn't wait for the encoder. queue_size frames can be pending, when the queue
+            is full queue_policy "block" waits for the encoder and "drop" skips the frame.
+        native_resolution: lay out and rasterize the frames directly at VIDEO_SIZE instead of resizing the native
+            frames to it (render_font_size is ignored then).
+        dedup: skip rendering and encoding steps whose observation is identical to the previous step's one
+            (menus, --More-- prompts), their history updates show up in the next encoded frame. The step each
+            frame starts at and how many steps it lasts are written to a .frames.csv file next to the video.
+            With queue_policy "drop" the file doesn't account for dropped frames.
+        """
         super().__init__(env)
 
         self.output_dir = output_dir
         self.show = show
-        self.visualizer = Visualize(tileset_path=tileset_path, tile_size=tile_size, render_font_size=render_font_size)
+        self.async_writer = async_writer
+        self.queue_size = queue_size
+        self.queue_policy = queue_policy
+        self.dedup = dedup
+        self.visualizer = Visualize(
+            tileset_path=tileset_path,
+            tile_size=tile_size,
+            render_font_size=render_font_size,
+            incremental=incremental,
+            output_size=VIDEO_SIZE if native_resolution else None,
+        )
 
         self.video_writer = None
+        self.timestamps = None
+        self._duplicates = DuplicateFrames()
+        self._step = 0
         self.fourcc = cv2.VideoWriter_fourcc(*"mp4v")  # or use 'XVID' for .avi format
 
         self._window_name = "NetHack"
@@ -31,19 +65,31 @@ class RenderVideo(LastInfo):
     def reset(self, **kwargs):
         if self.video_writer is not None:
             self.video_writer.release()
+        if self.timestamps is not None:
+            self.timestamps.close()
 
         self.visualizer.reset_history()
-        obs, info = self.env.reset(**kwargs)
+        self._duplicates.reset()
+        self._step = 0
+        obs, info = super().reset(**kwargs)
 
         self.output_path = Path(self.output_dir) / f"{Path(self.env.unwrapped.nethack._ttyrec).stem}.mp4"
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        self.video_writer = cv2.VideoWriter(str(self.output_path), self.fourcc, 30.0, (1920, 1080))
+        if self.async_writer:
+            self.video_writer = AsyncVideoWriter(
+                self.output_path, self.fourcc, 30.0, VIDEO_SIZE, queue_size=self.queue_size, policy=self.queue_policy
+            )
+        else:
+            self.video_writer = cv2.VideoWriter(str(self.output_path), self.fourcc, 30.0, VIDEO_SIZE)
+        if self.dedup:
+            self.timestamps = FrameTimestamps(self.output_path.with_suffix(".frames.csv"), time_column="step")
 
         # TODO: add self.render() when updated to gymnasium
         return obs, info
 
     def step(self, action):
-        obs, reward, term, trun, info = self.env.step(action)
+        obs, reward, term, trun, info = super().step(action)
+        self._step += 1
 
         # render current frame
         self.render()
@@ -68,6 +114,12 @@ class RenderVideo(LastInfo):
         tty_chars = last_obs[self.env.unwrapped._observation_keys.index("tty_chars")]
         tty_colors = last_obs[self.env.unwrapped._observation_keys.index("tty_colors")]
 
+        if self.dedup:
+            if self._duplicates(glyphs, blstats, inv_glyphs, inv_letters, inv_strs, tty_chars, tty_colors):
+                self.timestamps.repeat()
+                return
+            self.timestamps.add(self._step)
+
         image = self.visualizer.render(
             glyphs,
             blstats,
@@ -81,15 +133,25 @@ class RenderVideo(LastInfo):
             self.last_info,  # we have access to self.last_info because we derive from LastInfo wrapper
         )
 
-        resized_image = cv2.resize(image, (1920, 1080), cv2.INTER_AREA)
-        self.video_writer.write(resized_image)
+        if self.async_writer:
+            # image is a view of the visualizer's frame buffer, the writer copies it before the next render
+            self.video_writer.write(image)
+        else:
+            if image.shape[1::-1] != VIDEO_SIZE:
+                image = cv2.resize(image, VIDEO_SIZE, interpolation=cv2.INTER_AREA)
+            self.video_writer.write(image)
 
         if self.show:
-            cv2.imshow(self._window_name, resized_image)
+            if image.shape[1::-1] != VIDEO_SIZE:
+                image = cv2.resize(image, VIDEO_SIZE, interpolation=cv2.INTER_AREA)
+            cv2.imshow(self._window_name, image)
             cv2.waitKey(1)
 
     def close(self):
         if self.video_writer is not None:
             self.video_writer.release()
+        if self.timestamps is not None:
+            self.timestamps.close()
+        if self.show:
             cv2.destroyAllWindows()
         return self.env.close()
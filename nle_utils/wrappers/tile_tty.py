@@ -2,6 +2,8 @@ import gymnasium as gym
 import numpy as np
 from nle import nethack
 
+from nle_utils.visualize import load_char_sprites, rasterize_ttys
+
 
 class TileTTY(gym.Wrapper):
     def __init__(
@@ -10,11 +12,18 @@ class TileTTY(gym.Wrapper):
         font_size=9,
         crop_size=12,
         rescale_font_size=(6, 6),
+        rasterize: bool = False,
     ):
+        """
+        rasterize: screen_image is the RGB image of the cropped terminal, drawn by `rasterize_ttys` (serial, so
+            that the wrapped env can still be forked) with a font_size font rescaled to rescale_font_size characters,
+            instead of character and color codes
+        """
         super().__init__(env)
         self.font_size = font_size
         self.crop_size = crop_size
         self.rescale_font_size = rescale_font_size
+        self.rasterize = rasterize
 
         crop_rows = crop_size or nethack.nethack.TERMINAL_SHAPE[0]
         crop_cols = crop_size or nethack.nethack.TERMINAL_SHAPE[1]
@@ -23,10 +32,13 @@ class TileTTY(gym.Wrapper):
         self.char_height = rescale_font_size[1]
 
         self.chw_image_shape = (
-            2,
+            3 if rasterize else 2,
             crop_rows * self.char_height,
             crop_cols * self.char_width,
         )
+        if rasterize:
+            self.char_sprites = load_char_sprites(font_size, rescale_font_size)
+            self._screen = np.zeros((1, *self.chw_image_shape[1:], 3), dtype=np.uint8)
 
         obs_spaces = {"screen_image": gym.spaces.Box(low=0, high=255, shape=self.chw_image_shape, dtype=np.uint8)}
         obs_spaces.update([(k, self.env.observation_space[k]) for k in self.env.observation_space])
@@ -63,7 +75,11 @@ class TileTTY(gym.Wrapper):
         tty = np.stack([tty_chars, tty_colors], axis=0)
 
         cropped_tty = self.crop_around_cursor(tty, tty_cursor)
-        screen = np.tile(cropped_tty, (1, self.char_height, self.char_width))
+        if self.rasterize:
+            rasterize_ttys(cropped_tty[None, 0], cropped_tty[None, 1], self.char_sprites, out=self._screen)
+            screen = np.ascontiguousarray(self._screen[0].transpose(2, 0, 1))
+        else:
+            screen = np.tile(cropped_tty, (1, self.char_height, self.char_width))
 
         obs["screen_image"] = screen
 
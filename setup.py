@@ -30,7 +30,6 @@ setup(
         "opencv-python~=4.10",
         "numpy>=1.18.1,<2.0",
         "numba ~= 0.58",
-        "pandas ~= 2.1",
         "matplotlib ~= 3.8",
         "seaborn ~= 0.12",
         "scipy ~= 1.11",
@@ -40,10 +39,12 @@ setup(
     ],
     extras_require={
         # some tests require Atari and Mujoco so let's make sure dev environment has that
-        "dev": ["black", "isort>=5.12", "pytest<8.0", "flake8", "pre-commit", "twine"]
+        "dev": ["black", "isort>=5.12", "pytest<8.0", "flake8", "pre-commit", "twine"],
+        "pandas": ["pandas ~= 2.1", "pyarrow >= 10"],
     },
     package_dir={"": "./"},
     packages=setuptools.find_packages(where="./", include=["nle_utils*"]),
+    package_data={"nle_utils": ["data/*.npy"]},
     include_package_data=True,
     python_requires=">=3.8",
 )
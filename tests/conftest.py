@@ -0,0 +1,48 @@
+import glob
+import os
+from pathlib import Path
+
+import gymnasium as gym
+import nle  # noqa: F401
+import pytest
+
+from nle_utils.utils.cache import CACHE_DIR_ENV
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_root(tmp_path_factory):
+    """On-disk caches of the session (font atlas, tiles, ttyrecs) in a fresh directory instead of the user's one,
+    so that the tests exercise the build path and leave nothing behind"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path_factory.mktemp("nle_utils_cache")))
+        yield Path(os.environ[CACHE_DIR_ENV])
+
+
+def play_game(savedir, steps, seed=0):
+    """Play steps random actions (across resets) in NetHackScore and return the paths of the recorded ttyrecs"""
+    env = gym.make("NetHackScore-v0", save_ttyrec_every=1, savedir=savedir)
+    env.reset(seed=seed)
+    env.action_space.seed(seed)
+    for _ in range(steps):
+        _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        if terminated or truncated:
+            env.reset()
+    env.close()
+    return sorted(glob.glob(os.path.join(savedir, "*.ttyrec*")))
+
+
+@pytest.fixture(scope="session")
+def ttyrec(tmp_path_factory):
+    """A short recorded game, nle.<pid>.0.ttyrec3.bz2 (the directory name must not contain "ttyrec", see
+    `get_ttyrec_version`)"""
+    return play_game(str(tmp_path_factory.mktemp("games")), steps=300)[0]
+
+
+@pytest.fixture(scope="session")
+def ttyrecs(ttyrec, tmp_path_factory):
+    """Three games of different lengths, starting with ttyrec"""
+    # a directory per game, the files of this process are all named nle.<pid>.0.ttyrec3.bz2
+    return [ttyrec] + [
+        play_game(str(tmp_path_factory.mktemp("games")), steps=steps, seed=seed)[0]
+        for steps, seed in [(120, 1), (40, 2)]
+    ]
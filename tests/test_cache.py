@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from nle_utils import visualize
+from nle_utils.utils.cache import CACHE_DIR_ENV, cache_dir, cached_array
+
+
+class Build:
+    """Counts the calls of a cache build function"""
+
+    def __init__(self, value=0):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return np.full((4, 3), self.value, dtype=np.int16)
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    return tmp_path
+
+
+def test_hit_is_memory_mapped(cache_root):
+    build = Build(7)
+    first = cached_array("test", ("key", 1), build)
+    second = cached_array("test", ("key", 1), build)
+    assert build.calls == 1
+    assert isinstance(second, np.memmap) and not second.flags.writeable
+    np.testing.assert_array_equal(first, second)
+    assert [path.name for path in cache_root.iterdir()] == [Path(second.filename).name]
+
+
+def test_key_change_rebuilds(cache_root):
+    build = Build()
+    cached_array("test", ("key", 1), build)
+    cached_array("test", ("key", 2), build)
+    cached_array("other", ("key", 1), build)
+    assert build.calls == 3
+    assert len(list(cache_root.iterdir())) == 3
+
+
+@pytest.mark.parametrize("damage", ["truncated", "garbage", "empty"])
+def test_corrupted_file_is_rebuilt(cache_root, damage):
+    cached_array("test", "key", Build(1))
+    (path,) = cache_root.iterdir()
+    content = path.read_bytes()
+    path.write_bytes({"truncated": content[:-8], "garbage": b"garbage" * 20, "empty": b""}[damage])
+
+    build = Build(1)
+    array = cached_array("test", "key", build)
+    assert build.calls == 1
+    np.testing.assert_array_equal(array, np.ones((4, 3)))
+    assert path.read_bytes() == content
+
+
+def test_unwritable_cache_dir(tmp_path, monkeypatch):
+    # a file where the directory should be, unlike permissions this can't be bypassed by root
+    (tmp_path / "file").write_bytes(b"")
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path / "file" / "cache"))
+    build = Build(3)
+    array = cached_array("test", "key", build)
+    assert build.calls == 1 and not isinstance(array, np.memmap)
+    np.testing.assert_array_equal(array, np.full((4, 3), 3))
+
+
+def test_cache_dir_defaults_to_xdg(monkeypatch, tmp_path):
+    monkeypatch.delenv(CACHE_DIR_ENV, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert cache_dir() == tmp_path / "nle_utils"
+
+
+def test_char_masks_key():
+    key = visualize._char_masks_key(visualize.FONT_SIZE, (12, 22))
+    assert key == visualize._char_masks_key(visualize.FONT_SIZE, [12, 22])
+    assert key != visualize._char_masks_key(visualize.FONT_SIZE + 1, (12, 22))
+    assert key != visualize._char_masks_key(visualize.FONT_SIZE, (16, 30))
+
+
+def test_load_char_masks(cache_root, monkeypatch):
+    masks = visualize.load_char_masks(visualize.FONT_SIZE, (12, 22))
+    assert masks.shape == (256, 22, 12) and masks.dtype == np.uint8 and isinstance(masks, np.memmap)
+    np.testing.assert_array_equal(masks, visualize._initialize_char_masks(visualize.FONT_SIZE, (12, 22)))
+    assert masks[ord(" ")].max() == 0 and masks[ord("@")].max() > 0
+
+    def rebuild(*args):
+        raise AssertionError("cached char masks were rebuilt")
+
+    monkeypatch.setattr(visualize, "_initialize_char_masks", rebuild)
+    np.testing.assert_array_equal(visualize.load_char_masks(visualize.FONT_SIZE, (12, 22)), masks)
+
+    # a new atlas version invalidates the cache
+    monkeypatch.setattr(visualize, "CHAR_MASKS_VERSION", visualize.CHAR_MASKS_VERSION + 1)
+    with pytest.raises(AssertionError, match="rebuilt"):
+        visualize.load_char_masks(visualize.FONT_SIZE, (12, 22))
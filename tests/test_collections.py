@@ -0,0 +1,60 @@
+import pytest
+
+from nle_utils.collections import RingBuffer
+
+
+def test_ring_buffer_before_full():
+    buffer = RingBuffer(4)
+    assert len(buffer) == 0
+    assert list(buffer) == []
+    for item in "abc":
+        buffer.append(item)
+    assert len(buffer) == 3
+    assert list(buffer) == ["a", "b", "c"]
+    assert buffer[0] == "a" and buffer[-1] == "c"
+
+
+def test_ring_buffer_wraparound():
+    buffer = RingBuffer(3)
+    for item in range(8):
+        buffer.append(item)
+    assert len(buffer) == 3
+    assert list(buffer) == [5, 6, 7]
+    assert [buffer[i] for i in range(3)] == [5, 6, 7]
+    assert [buffer[-i] for i in range(1, 4)] == [7, 6, 5]
+
+
+@pytest.mark.parametrize("index", [3, -4])
+def test_ring_buffer_index_out_of_range(index):
+    buffer = RingBuffer(5)
+    for item in range(3):
+        buffer.append(item)
+    with pytest.raises(IndexError):
+        buffer[index]
+
+
+def test_ring_buffer_last():
+    buffer = RingBuffer(4)
+    assert buffer.last(2) == []
+    for item in range(6):
+        buffer.append(item)
+    assert buffer.last(2) == [4, 5]
+    assert buffer.last(4) == [2, 3, 4, 5]
+    # more than stored
+    assert buffer.last(10) == [2, 3, 4, 5]
+    assert buffer.last(0) == []
+
+
+def test_ring_buffer_clear():
+    buffer = RingBuffer(2)
+    for item in range(3):
+        buffer.append(item)
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.append("x")
+    assert list(buffer) == ["x"]
+
+
+def test_ring_buffer_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+
+from nle_utils.ttyrec.load_ttyrecs import LoadTtyrecs
+from nle_utils.ttyrec.read_ttyrec import ReadTtyrec, TtyrecChunk
+
+SHM_DIR = "/dev/shm"
+
+
+@pytest.fixture(scope="module")
+def frames(ttyrecs):
+    """All the frames of every game, read with ReadTtyrec"""
+    return [next(ReadTtyrec(seq_length=100_000).read_chunks(ttyrec, copy=True)) for ttyrec in ttyrecs]
+
+
+def copy_batches(loader):
+    return [{name: array.copy() for name, array in batch.items()} for batch in loader]
+
+
+def shared_memory_blocks():
+    return set(os.listdir(SHM_DIR)) if os.path.isdir(SHM_DIR) else set()
+
+
+def test_batches_match_read_ttyrec(ttyrecs, frames):
+    batch_size, seq_length = 2, 64
+    batches = copy_batches(LoadTtyrecs(ttyrecs, batch_size=batch_size, seq_length=seq_length, num_workers=1))
+    assert all(batch["chars"].shape[:2] == (batch_size, seq_length) for batch in batches)
+
+    for b in range(batch_size):
+        # files are dealt to the rows round-robin, a row reads its files back to back
+        file_ids = list(range(len(ttyrecs)))[b::batch_size]
+        row = {name: np.concatenate([batch[name][b] for batch in batches]) for name in batches[0]}
+        num_frames = sum(len(frames[i].chars) for i in file_ids)
+
+        for field in TtyrecChunk._fields:
+            expected = np.concatenate([getattr(frames[i], field) for i in file_ids])
+            np.testing.assert_array_equal(row[field][:num_frames], expected, err_msg=field)
+            # zero padding after the last file of the row
+            assert not row[field][num_frames:].any(), field
+        np.testing.assert_array_equal(
+            row["file_ids"][:num_frames], np.repeat(file_ids, [len(frames[i].chars) for i in file_ids])
+        )
+        assert (row["file_ids"][num_frames:] == -1).all()
+        starts = np.cumsum([0] + [len(frames[i].chars) for i in file_ids[:-1]])
+        np.testing.assert_array_equal(np.flatnonzero(row["done"]), starts)
+
+    # batches stop once every row is out of files, the last one is padded
+    longest = max(sum(len(frames[i].chars) for i in range(b, len(ttyrecs), batch_size)) for b in range(batch_size))
+    assert len(batches) == -(-longest // seq_length)
+    assert (batches[-1]["file_ids"] == -1).any()
+
+
+def test_batches_of_several_workers(ttyrecs, frames):
+    loader = LoadTtyrecs(ttyrecs, batch_size=1, seq_length=50, num_workers=2, shuffle=True, seed=0)
+    batches = copy_batches(loader)
+    for file_id, expected in enumerate(frames):
+        # batches of different workers are interleaved, the frames of a file stay in order
+        masks = [batch["file_ids"] == file_id for batch in batches]
+        assert sum(int(batch["done"][mask].sum()) for batch, mask in zip(batches, masks)) == 1
+        for field in TtyrecChunk._fields:
+            read = np.concatenate([batch[field][mask] for batch, mask in zip(batches, masks)])
+            np.testing.assert_array_equal(read, getattr(expected, field), err_msg=field)
+
+
+def test_worker_error_is_raised(ttyrecs, tmp_path):
+    missing = str(tmp_path / "nle.1.0.ttyrec3.bz2")
+    before = shared_memory_blocks()
+    with pytest.raises(RuntimeError, match="worker failed"):
+        for _ in LoadTtyrecs([ttyrecs[0], missing], batch_size=1, seq_length=64, num_workers=2):
+            pass
+    assert shared_memory_blocks() <= before
+
+
+def test_shared_memory_released(ttyrecs):
+    before = shared_memory_blocks()
+    batches = iter(LoadTtyrecs(ttyrecs, batch_size=2, seq_length=16, num_workers=2))
+    next(batches)
+    assert shared_memory_blocks() - before
+    # early exit
+    batches.close()
+    assert shared_memory_blocks() <= before
+
+    for _ in LoadTtyrecs(ttyrecs, batch_size=2, seq_length=256, num_workers=2):
+        pass
+    assert shared_memory_blocks() <= before
+
+
+def test_version_mismatch(ttyrecs):
+    with pytest.raises(ValueError, match="not a version 1 ttyrec"):
+        LoadTtyrecs(ttyrecs, ttyrec_version=1)
@@ -0,0 +1,83 @@
+import io
+import re
+
+import numpy as np
+
+from nle_utils.ttyrec.print_ttyrec import AnsiScreen, PrintTtyrec
+from nle_utils.ttyrec.read_ttyrec import COLUMNS, ROWS, ReadTtyrec
+
+ESCAPES = re.compile(r"\033\[([0-9;]*)([HJKm])|([^\033])", re.S)
+
+
+class Terminal:
+    """The subset of an ANSI terminal `AnsiScreen` writes: cursor moves, clears and the 16 colors"""
+
+    def __init__(self):
+        self.chars = np.zeros((ROWS, COLUMNS), dtype=np.uint8)
+        self.colors = np.zeros((ROWS, COLUMNS), dtype=np.int8)
+        self.row = self.column = 0
+        self.color = 0
+
+    def write(self, data):
+        for match in ESCAPES.finditer(data):
+            params, command, char = match.groups()
+            if char is not None:
+                if self.row < ROWS and self.column < COLUMNS:
+                    self.chars[self.row, self.column] = ord(char)
+                    self.colors[self.row, self.column] = self.color
+                self.column += 1
+            elif command == "H":
+                row, column = params.split(";")
+                self.row, self.column = int(row) - 1, int(column) - 1
+            elif command == "J":
+                self.chars.fill(0)
+                self.colors.fill(0)
+            elif command == "m":
+                codes = [int(code) for code in params.split(";")]
+                if codes != [0]:
+                    bright, foreground = codes
+                    self.color = bright * 8 + foreground - 30
+
+
+def test_diff_output_reproduces_full_redraw(ttyrec):
+    diff_terminal = Terminal()
+    screen = AnsiScreen(io.StringIO())
+    redrawn = 0
+    for i, (chars, colors, cursor, *_) in enumerate(ReadTtyrec().read(ttyrec)):
+        output = screen.draw(chars, colors, cursor, status=f"frame {i}")
+        diff_terminal.write(output)
+
+        # a full redraw on a fresh screen
+        full_terminal = Terminal()
+        full_terminal.write(AnsiScreen(io.StringIO()).draw(chars, colors, cursor))
+
+        np.testing.assert_array_equal(diff_terminal.chars, full_terminal.chars, err_msg=f"frame {i}")
+        np.testing.assert_array_equal(diff_terminal.colors, full_terminal.colors, err_msg=f"frame {i}")
+        np.testing.assert_array_equal(diff_terminal.chars, chars)
+        np.testing.assert_array_equal(diff_terminal.colors, colors & 15)
+        assert (diff_terminal.row, diff_terminal.column) == tuple(cursor)
+        redrawn += output.startswith("\033[2J")
+    # only the first frame clears the screen
+    assert redrawn == 1
+
+
+def test_unchanged_frame_writes_only_status():
+    chars = np.full((ROWS, COLUMNS), ord("."), dtype=np.uint8)
+    colors = np.full((ROWS, COLUMNS), 7, dtype=np.int8)
+    screen = AnsiScreen(io.StringIO())
+    screen.draw(chars, colors)
+    assert screen.draw(chars, colors, status="hi") == f"\033[0m\033[{ROWS + 1};1H\033[Khi"
+
+    chars[3, 10:13] = ord("@")
+    output = screen.draw(chars, colors)
+    assert output.startswith("\033[4;11H")
+    assert "@@@" in output and "." not in output
+
+
+def test_print_ttyrec_every_and_range(ttyrec, capsys):
+    out = io.StringIO()
+    PrintTtyrec(out=out).render(ttyrec, every=10, start=5, stop=60)
+    output = out.getvalue()
+    assert output.count("frame: ") == 6
+    assert "frame: 5 " in output and "frame: 55 " in output
+    assert capsys.readouterr().out.strip() == "finished"
@@ -0,0 +1,185 @@
+import threading
+
+import numpy as np
+import pytest
+
+from nle_utils.ttyrec.read_ttyrec import ChunkPool, ReadTtyrec, TtyrecChunk, allocate_chunk, get_ttyrec_version
+
+
+@pytest.fixture(scope="module")
+def frames(ttyrec):
+    """All the frames of ttyrec converted at once, the reference of the other reads"""
+    chunks = list(ReadTtyrec(seq_length=100_000).read_chunks(ttyrec, copy=True))
+    assert len(chunks) == 1
+    return chunks[0]
+
+
+def assert_frames_equal(chunk, expected):
+    for field, array, expected_array in zip(TtyrecChunk._fields, chunk, expected):
+        np.testing.assert_array_equal(array, expected_array, err_msg=field)
+
+
+def concatenate(chunks):
+    return TtyrecChunk(*(np.concatenate(arrays) for arrays in zip(*chunks)))
+
+
+def test_get_ttyrec_version():
+    assert get_ttyrec_version("games/nle.1.0.ttyrec3.bz2") == 3
+    assert get_ttyrec_version("2019-11-18.08_52_15.ttyrec.bz2") == 1
+    assert get_ttyrec_version("game.bz2") is None
+
+
+@pytest.mark.parametrize("chunk_len", [1, 7, 50, 100_000])
+def test_read_chunks_lengths(ttyrec, frames, chunk_len):
+    num_frames = len(frames.chars)
+    chunks = list(ReadTtyrec().read_chunks(ttyrec, chunk_len=chunk_len, copy=True))
+    assert [len(chunk.chars) for chunk in chunks[:-1]] == [chunk_len] * (len(chunks) - 1)
+    assert 0 < len(chunks[-1].chars) <= chunk_len
+    assert sum(len(chunk.chars) for chunk in chunks) == num_frames
+    assert_frames_equal(concatenate(chunks), frames)
+
+
+def copies(chunks):
+    return [TtyrecChunk(*(np.copy(array) for array in chunk)) for chunk in chunks]
+
+
+def test_read_chunks_seq_length(ttyrec, frames):
+    chunks = copies(ReadTtyrec(seq_length=16).read_chunks(ttyrec))
+    assert len(chunks[0].chars) == 16
+    assert_frames_equal(concatenate(chunks), frames)
+
+
+def test_read_chunks_reuses_buffers(ttyrec):
+    reader = ReadTtyrec(seq_length=16)
+    chunks = reader.read_chunks(ttyrec)
+    first = next(chunks)
+    second = next(chunks)
+    # views of the reader buffers, overwritten by the next chunk
+    assert np.shares_memory(first.chars, second.chars)
+    assert np.shares_memory(first.chars, reader.chars)
+
+
+def test_read_chunks_copy(ttyrec):
+    chunks = list(ReadTtyrec(seq_length=16).read_chunks(ttyrec, copy=True))
+    assert not any(np.shares_memory(a.chars, b.chars) for a, b in zip(chunks, chunks[1:]))
+
+
+def test_read_matches_chunks(ttyrec, frames):
+    # frames are views of the reader buffers
+    read = copies(ReadTtyrec(seq_length=16).read(ttyrec))
+    assert len(read) == len(frames.chars)
+    for i in (0, len(read) // 2, len(read) - 1):
+        assert_frames_equal(read[i], TtyrecChunk(*(array[i] for array in frames)))
+
+
+def test_allocate_chunk():
+    chunk = allocate_chunk(5)
+    assert all(len(array) == 5 for array in chunk)
+    assert chunk.chars.shape[1:] == chunk.colors.shape[1:]
+    assert not chunk.chars.any()
+
+
+def test_chunk_pool_keeps_chunks(ttyrec, frames):
+    pool = ChunkPool(num_chunks=100, chunk_len=16)
+    # kept without copying, no chunk is converted into a buffer still in use
+    chunks = list(ReadTtyrec().read_chunks(ttyrec, pool=pool))
+    assert pool.available == 100 - len(chunks)
+    assert_frames_equal(concatenate(chunks), frames)
+
+    for chunk in chunks:
+        pool.release(chunk)
+    assert pool.available == 100
+
+
+def test_chunk_pool_reuses_released_chunks(ttyrec, frames):
+    pool = ChunkPool(num_chunks=2, chunk_len=16)
+    kept = []
+    for chunk in ReadTtyrec().read_chunks(ttyrec, pool=pool):
+        kept.append(TtyrecChunk(*(array.copy() for array in chunk)))
+        pool.release(chunk)
+        assert pool.available == 2
+    assert_frames_equal(concatenate(kept), frames)
+
+
+def test_chunk_pool_exhausted(ttyrec):
+    pool = ChunkPool(num_chunks=2, chunk_len=16)
+    chunks = ReadTtyrec().read_chunks(ttyrec, pool=pool)
+    first, second = next(chunks), next(chunks)
+    assert pool.available == 0
+    with pytest.raises(RuntimeError):
+        next(chunks)
+    assert not np.shares_memory(first.chars, second.chars)
+
+
+def test_chunk_pool_block():
+    pool = ChunkPool(num_chunks=1, chunk_len=4, block=True)
+    chunk = pool.acquire()
+    # acquire waits for another thread to release the chunk
+    timer = threading.Timer(0.05, pool.release, args=(chunk,))
+    timer.start()
+    assert np.shares_memory(pool.acquire().chars, chunk.chars)
+    timer.join()
+
+
+def test_chunk_pool_release_errors():
+    pool = ChunkPool(num_chunks=1, chunk_len=4)
+    chunk = pool.acquire()
+    # any view of the chunk identifies it
+    pool.release(TtyrecChunk(*(array[:2] for array in chunk)))
+    with pytest.raises(ValueError):
+        pool.release(chunk)
+    with pytest.raises(ValueError):
+        pool.release(allocate_chunk(4))
+
+
+def test_chunk_pool_chunk_len_mismatch(ttyrec):
+    pool = ChunkPool(num_chunks=1, chunk_len=4)
+    with pytest.raises(ValueError):
+        next(ReadTtyrec().read_chunks(ttyrec, chunk_len=8, pool=pool))
+
+
+def read_range(reader, ttyrec, start, stop, chunk_len=16):
+    chunks = list(reader.read_chunks(ttyrec, chunk_len=chunk_len, copy=True, start=start, stop=stop))
+    return concatenate(chunks) if chunks else None
+
+
+@pytest.mark.parametrize("start, stop", [(0, 1), (0, 40), (13, 77), (100, None), (5, 5)])
+def test_read_chunks_range(ttyrec, frames, start, stop):
+    chunk = read_range(ReadTtyrec(), ttyrec, start, stop)
+    expected = TtyrecChunk(*(array[start:stop] for array in frames))
+    if len(expected.chars) == 0:
+        assert chunk is None
+    else:
+        assert_frames_equal(chunk, expected)
+
+
+def test_read_chunks_range_past_end(ttyrec, frames):
+    num_frames = len(frames.chars)
+    chunk = read_range(ReadTtyrec(), ttyrec, num_frames - 3, num_frames + 10)
+    assert_frames_equal(chunk, TtyrecChunk(*(array[-3:] for array in frames)))
+    assert read_range(ReadTtyrec(), ttyrec, num_frames + 10, None) is None
+
+
+def test_read_chunks_resumes_and_rewinds(ttyrec, frames):
+    reader = ReadTtyrec()
+    # consecutive ranges continue from the converter position
+    assert_frames_equal(read_range(reader, ttyrec, 0, 30), TtyrecChunk(*(array[0:30] for array in frames)))
+    assert reader._position == 30
+    assert_frames_equal(read_range(reader, ttyrec, 30, 60), TtyrecChunk(*(array[30:60] for array in frames)))
+    assert_frames_equal(read_range(reader, ttyrec, 75, 90), TtyrecChunk(*(array[75:90] for array in frames)))
+    # an earlier start reloads the ttyrec
+    assert_frames_equal(read_range(reader, ttyrec, 10, 20), TtyrecChunk(*(array[10:20] for array in frames)))
+
+
+def test_read_range(ttyrec, frames):
+    read = copies(ReadTtyrec().read(ttyrec, 20, 25))
+    assert len(read) == 5
+    assert_frames_equal(read[0], TtyrecChunk(*(array[20] for array in frames)))
+
+
+def test_seek(ttyrec, frames):
+    reader = ReadTtyrec()
+    for frame in (50, 3, len(frames.chars) - 1):
+        assert_frames_equal(reader.seek(ttyrec, frame), TtyrecChunk(*(array[frame] for array in frames)))
+    with pytest.raises(IndexError):
+        reader.seek(ttyrec, len(frames.chars))
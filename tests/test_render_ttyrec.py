@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import cv2
+import pytest
+
+from nle_utils.ttyrec import render_ttyrec
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SCRIPT = """
+from nle_utils.ttyrec.render_ttyrec import RenderTtyrec, render_ttyrec_parallel
+from nle_utils.video_writer import has_ffmpeg
+
+if __name__ == "__main__":
+    # runs the parallel rasterizer in this process before render_ttyrec_parallel starts its workers
+    RenderTtyrec({serial_dir!r}, dedup=True, parallel=True).render({ttyrec!r})
+    render_ttyrec_parallel(
+        {ttyrec!r}, {split_dir!r}, n_jobs=2, min_segment_frames=100, dedup=True, reencode=not has_ffmpeg()
+    )
+"""
+
+
+def frame_count(path):
+    capture = cv2.VideoCapture(str(path))
+    count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return count
+
+
+def test_render_ttyrec_parallel_after_render(ttyrec, tmp_path):
+    serial_dir, split_dir = tmp_path / "serial", tmp_path / "split"
+    script = tmp_path / "render.py"
+    script.write_text(SCRIPT.format(ttyrec=ttyrec, serial_dir=str(serial_dir), split_dir=str(split_dir)))
+
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))}
+    # hangs at exit if the workers are forked after the parallel kernel ran
+    subprocess.run([sys.executable, str(script)], cwd=ROOT, env=env, check=True, timeout=300)
+
+    name = Path(ttyrec).stem
+    assert frame_count(split_dir / f"{name}.mp4") == frame_count(serial_dir / f"{name}.mp4") > 0
+    assert (split_dir / f"{name}.frames.csv").read_text() == (serial_dir / f"{name}.frames.csv").read_text()
+    assert not any(path.name.startswith(".segments-") for path in split_dir.iterdir())
+
+
+def test_render_ttyrec_parallel_without_ffmpeg(ttyrec, tmp_path, monkeypatch):
+    monkeypatch.setattr(render_ttyrec, "has_ffmpeg", lambda: False)
+
+    def get_context(method):
+        raise AssertionError("segments rendered without ffmpeg to concatenate them")
+
+    monkeypatch.setattr(render_ttyrec.mp, "get_context", get_context)
+    render_ttyrec.render_ttyrec_parallel(ttyrec, str(tmp_path), n_jobs=2, min_segment_frames=100)
+    assert frame_count(tmp_path / f"{Path(ttyrec).stem}.mp4") == render_ttyrec.count_frames(ttyrec)
+
+
+@pytest.mark.parametrize("error", [0.5, 2.0])
+def test_render_ttyrec_parallel_frame_estimate(ttyrec, tmp_path_factory, monkeypatch, error):
+    total = render_ttyrec.count_frames(ttyrec)
+    # the segments come from the estimate, the ttyrec isn't decoded before they are dispatched
+    monkeypatch.setattr(render_ttyrec, "split_frames", lambda *args: int(total * error))
+    monkeypatch.setattr(render_ttyrec, "count_frames", None)
+    output_dir = tmp_path_factory.mktemp("split")
+    render_ttyrec.render_ttyrec_parallel(ttyrec, str(output_dir), n_jobs=2, min_segment_frames=100, reencode=True)
+    assert frame_count(output_dir / f"{Path(ttyrec).stem}.mp4") == total
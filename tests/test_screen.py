@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from nle_utils import screen
+
+ROWS, COLUMNS = 24, 80
+
+
+def make_tty(texts, rows=ROWS, columns=COLUMNS):
+    """
+    (rows, columns) uint8 tty_chars with texts, (line, column, text) tuples or strings for consecutive lines
+    from the top, the rest is NULs like in NLE observations
+    """
+    tty_chars = np.zeros((rows, columns), dtype=np.uint8)
+    for i, text in enumerate(texts):
+        line, column, text = text if isinstance(text, tuple) else (i, 0, text)
+        data = np.frombuffer(text.encode("latin-1"), dtype=np.uint8)
+        tty_chars[line, column : column + len(data)] = data
+    return tty_chars
+
+
+def test_decode_replaces_nuls():
+    message = np.zeros(10, dtype=np.uint8)
+    message[:5] = np.frombuffer(b"Hello", dtype=np.uint8)
+    assert screen.decode(message) == "Hello     "
+
+
+def test_screen_bytes():
+    tty_chars = make_tty(["ab", "c"], rows=2, columns=3)
+    assert screen.screen_bytes(tty_chars) == b"ab c  "
+
+
+def test_no_marker():
+    tty_chars = make_tty(["You see here a dagger."])
+    assert screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS) == (None, None)
+    assert screen.message_and_popup("You see here a dagger.", tty_chars) == ("You see here a dagger.", [], None)
+
+
+def test_more_after_message():
+    tty_chars = make_tty(["You hear some noises.--More--"])
+    assert screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS) == ((0, 21), "--More--")
+    assert screen.message_and_popup("You hear some noises.", tty_chars) == ("You hear some noises.", [], "--More--")
+
+
+def test_more_after_wrapped_message():
+    first = "You hear the footsteps of a guard on patrol. You hear a door open. You hear"
+    tty_chars = make_tty([first, "some noises in the distance.--More--"])
+    message = first + " some noises in the distance."
+    assert screen.message_and_popup(message, tty_chars) == (message, [], "--More--")
+
+
+def test_more_popup_below_message():
+    tty_chars = make_tty(
+        [
+            (0, 0, "Things that are here:"),
+            (1, 20, "a +0 dagger"),
+            (2, 20, "2 uncursed food rations"),
+            (3, 20, "--More--"),
+        ]
+    )
+    message, popup, marker = screen.message_and_popup("Things that are here:", tty_chars)
+    assert message == "Things that are here:"
+    assert popup == ["a +0 dagger", "2 uncursed food rations"]
+    assert marker == "--More--"
+
+
+def test_menu_popup_end():
+    # a menu drawn over the map on the right, the left part of the lines is ignored
+    tty_chars = make_tty(
+        [
+            (0, 40, " Weapons"),
+            (1, 0, "----- map -----"),
+            (1, 40, " a - a long sword (weapon in hand)"),
+            (2, 40, " Armor"),
+            (3, 40, " b - an uncursed +3 small shield"),
+            (4, 40, "(end)"),
+        ]
+    )
+    message, popup, marker = screen.message_and_popup("", tty_chars)
+    assert message == ""
+    assert popup == ["Weapons", "a - a long sword (weapon in hand)", "Armor", "b - an uncursed +3 small shield"]
+    assert marker == "(end)"
+
+
+def test_menu_popup_pages():
+    tty_chars = make_tty([(0, 30, "Discoveries"), (1, 30, "Potions"), (2, 30, "(1 of 2)")])
+    assert screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS) == ((2, 30), "(1 of 2)")
+    assert screen.message_and_popup("", tty_chars) == ("", ["Discoveries", "Potions"], "(1 of 2)")
+
+
+def test_marker_at_column_one():
+    # e.g. the known items view, drawn one column off the left edge
+    tty_chars = make_tty([(0, 1, "Discoveries"), (1, 1, "(end)")])
+    assert screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS) == ((1, 0), "(end)")
+
+
+def test_marker_split_across_lines_is_ignored():
+    tty_chars = make_tty([(0, 76, "--Mo"), (1, 0, "re--")])
+    assert screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS) == (None, None)
+
+
+def test_page_marker_needs_numbers():
+    tty_chars = make_tty(["(one of two)"])
+    assert screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS) == (None, None)
+
+
+def test_too_many_markers():
+    tty_chars = make_tty([(0, 0, "Hello--More--"), (5, 40, "(end)")])
+    with pytest.raises(ValueError):
+        screen.find_marker(screen.screen_bytes(tty_chars), COLUMNS)
+
+
+def test_message_not_on_screen():
+    tty_chars = make_tty([(0, 0, "Something else entirely"), (2, 0, "--More--")])
+    with pytest.raises(ValueError):
+        screen.message_and_popup("You hear some noises.", tty_chars)
+    # a marker on the first line can't be below the message, it is returned as is
+    tty_chars = make_tty(["Something else--More--"])
+    assert screen.message_and_popup("You hear some noises.", tty_chars) == ("You hear some noises.", [], "--More--")
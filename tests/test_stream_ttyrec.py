@@ -0,0 +1,28 @@
+import bz2
+import gzip
+
+import pytest
+
+from nle_utils.ttyrec.render_ttyrec import count_frames
+from nle_utils.ttyrec.stream_ttyrec import estimate_frames
+
+
+def test_estimate_frames(ttyrecs):
+    for ttyrec in ttyrecs:
+        assert estimate_frames(ttyrec) == count_frames(ttyrec) > 0
+
+
+@pytest.mark.parametrize("suffix", ["gz", "none"])
+def test_estimate_frames_formats(ttyrec, tmp_path_factory, suffix):
+    data = bz2.decompress(open(ttyrec, "rb").read())
+    path = tmp_path_factory.mktemp("formats") / f"game.ttyrec3.{suffix}"
+    path.write_bytes(gzip.compress(data) if suffix == "gz" else data)
+    assert estimate_frames(str(path)) == count_frames(ttyrec)
+
+
+def test_estimate_frames_truncated(ttyrec, tmp_path_factory):
+    data = bz2.decompress(open(ttyrec, "rb").read())
+    path = tmp_path_factory.mktemp("truncated") / "game.ttyrec3"
+    # cut in the middle of a record
+    path.write_bytes(data[: len(data) // 2 + 5])
+    assert 0 < estimate_frames(str(path)) < count_frames(ttyrec)
@@ -0,0 +1,76 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from nle_utils.ttyrec.read_ttyrec import ReadTtyrec, TtyrecChunk
+from nle_utils.ttyrec.ttyrec_cache import (
+    COMPRESSIONS,
+    TtyrecCache,
+    is_ttyrec_cache,
+    open_ttyrec_cache,
+    ttyrec_cache_path,
+    write_ttyrec_cache,
+)
+
+
+@pytest.fixture(scope="module")
+def frames(ttyrec):
+    return next(ReadTtyrec(seq_length=100_000).read_chunks(ttyrec, copy=True))
+
+
+@pytest.fixture
+def cache_dir(tmp_path_factory):
+    # not tmp_path, its name (the test name) contains "ttyrec" which would be taken for the version
+    return str(tmp_path_factory.mktemp("caches"))
+
+
+def assert_frames_equal(chunk, expected):
+    for field, array, expected_array in zip(TtyrecChunk._fields, chunk, expected):
+        np.testing.assert_array_equal(array, expected_array, err_msg=field)
+
+
+@pytest.mark.parametrize("compression", list(COMPRESSIONS))
+def test_round_trip(ttyrec, frames, cache_dir, compression):
+    path = write_ttyrec_cache(ttyrec, ttyrec_cache_path(ttyrec, cache_dir), chunk_len=64, compression=compression)
+    assert is_ttyrec_cache(path)
+
+    cache = TtyrecCache(path)
+    assert len(cache) == len(frames.chars)
+    assert cache.is_fresh()
+    assert_frames_equal(cache.read(0, len(cache)), frames)
+    # straddling chunks, clipped to the cache, into out buffers
+    assert_frames_equal(cache[60:130], TtyrecChunk(*(array[60:130] for array in frames)))
+    assert_frames_equal(cache.read(len(cache) - 5, len(cache) + 5), TtyrecChunk(*(array[-5:] for array in frames)))
+    assert_frames_equal(cache[-1], TtyrecChunk(*(array[-1] for array in frames)))
+    assert_frames_equal(cache[::7], TtyrecChunk(*(array[::7] for array in frames)))
+    with pytest.raises(IndexError):
+        cache[len(cache)]
+
+
+def test_read_ttyrec_from_cache(ttyrec, frames, cache_dir):
+    write_ttyrec_cache(ttyrec, ttyrec_cache_path(ttyrec, cache_dir), chunk_len=64)
+    reader = ReadTtyrec(seq_length=50, cache_dir=cache_dir)
+    assert reader.open_cache(ttyrec) is not None
+
+    chunks = list(reader.read_chunks(ttyrec, copy=True))
+    assert [len(chunk.chars) for chunk in chunks[:-1]] == [50] * (len(chunks) - 1)
+    assert_frames_equal(TtyrecChunk(*(np.concatenate(arrays) for arrays in zip(*chunks))), frames)
+    assert_frames_equal(reader.seek(ttyrec, 100), TtyrecChunk(*(array[100] for array in frames)))
+
+
+def test_stale_cache_is_ignored(ttyrec, tmp_path_factory, cache_dir):
+    source = os.path.join(tmp_path_factory.mktemp("games"), os.path.basename(ttyrec))
+    shutil.copy(ttyrec, source)
+    write_ttyrec_cache(source, ttyrec_cache_path(source, cache_dir))
+    assert open_ttyrec_cache(source, cache_dir) is not None
+
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert open_ttyrec_cache(source, cache_dir) is None
+    assert ReadTtyrec(cache_dir=cache_dir).open_cache(source) is None
+
+
+def test_missing_cache(ttyrec, cache_dir):
+    assert open_ttyrec_cache(ttyrec, cache_dir) is None
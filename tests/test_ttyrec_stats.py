@@ -0,0 +1,51 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from nle_utils.ttyrec import ttyrec_stats
+from nle_utils.ttyrec.read_ttyrec import ReadTtyrec
+
+
+def test_status_numbers():
+    lines = np.frombuffer(
+        b"Dlvl:12 $:0 HP:1(1) T:345 ".ljust(40) + b"Home 1 $:0 T:7".ljust(40) + b"Dlvl:3".ljust(40), dtype=np.uint8
+    ).reshape(3, 40)
+    np.testing.assert_array_equal(ttyrec_stats._status_numbers(lines, b"Dlvl:", 3), [12, -1, 3])
+    np.testing.assert_array_equal(ttyrec_stats._status_numbers(lines, b" T:", 7), [345, 7, -1])
+
+
+def test_ttyrec_stats(ttyrec):
+    stats = ttyrec_stats.ttyrec_stats(ttyrec, chunk_len=64)
+    frames = sum(len(chunk.chars) for chunk in ReadTtyrec(seq_length=1000).read_chunks(ttyrec))
+    assert set(stats) == set(ttyrec_stats.STATS_COLUMNS)
+    assert stats["frames"] == frames
+    assert stats["duration"] >= 0
+    assert stats["max_dlvl"] >= stats["final_dlvl"] >= 1
+    assert stats["turns"] >= 1
+    assert sum(json.loads(stats["actions"]).values()) == stats["keypresses"]
+    # chunking doesn't change the result
+    assert ttyrec_stats.ttyrec_stats(ttyrec, chunk_len=1000) == stats
+
+
+def test_update_ttyrec_stats_is_incremental(ttyrec, tmp_path_factory):
+    output = str(tmp_path_factory.mktemp("stats") / "stats.csv")
+    assert ttyrec_stats.update_ttyrec_stats([ttyrec], output, n_jobs=1) == 1
+    assert ttyrec_stats.update_ttyrec_stats([ttyrec], output, n_jobs=1) == 0
+    rows = ttyrec_stats.read_ttyrec_stats(output)
+    assert list(rows) == [os.path.abspath(ttyrec)]
+    assert ttyrec_stats.update_ttyrec_stats([ttyrec], output, n_jobs=1, overwrite=True) == 1
+    assert len(ttyrec_stats.read_ttyrec_stats(output)) == 1
+
+
+def test_parquet_engine_checked_before_work(ttyrec, tmp_path_factory, monkeypatch):
+    monkeypatch.setattr(ttyrec_stats, "is_module_available", lambda module: module == "pandas")
+
+    def imap_parallel(**kwargs):
+        raise AssertionError("stats computed without a Parquet engine")
+
+    monkeypatch.setattr(ttyrec_stats, "imap_parallel", imap_parallel)
+    output = str(tmp_path_factory.mktemp("stats") / "stats.parquet")
+    with pytest.raises(ImportError, match="pyarrow or fastparquet"):
+        ttyrec_stats.update_ttyrec_stats([ttyrec], output, n_jobs=1)
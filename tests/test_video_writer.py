@@ -0,0 +1,284 @@
+import csv
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from nle_utils.video_writer import (
+    AsyncVideoWriter,
+    DuplicateFrames,
+    FrameTimestamps,
+    concat_frame_timestamps,
+    concat_videos,
+    has_ffmpeg,
+)
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_duplicate_frames():
+    duplicates = DuplicateFrames()
+    a = np.arange(6).reshape(2, 3)
+    b = np.zeros(4, dtype=np.int8)
+    assert not duplicates(a, b)
+    assert duplicates(a.copy(), b.copy())
+    # compared against copies, modifying the inputs afterwards doesn't matter
+    a[0, 0] = 100
+    assert not duplicates(a, b)
+    assert duplicates(a, b)
+    b[1] = 1
+    assert not duplicates(a, b)
+
+
+def test_duplicate_frames_shape_and_count_changes():
+    duplicates = DuplicateFrames()
+    assert not duplicates(np.zeros(3))
+    assert not duplicates(np.zeros(4))
+    assert not duplicates(np.zeros(4), np.zeros(1))
+    assert duplicates(np.zeros(4), np.zeros(1))
+    duplicates.reset()
+    assert not duplicates(np.zeros(4), np.zeros(1))
+
+
+def test_frame_timestamps(tmp_path):
+    path = tmp_path / "video.frames.csv"
+    timestamps = FrameTimestamps(path, time_column="timestamp")
+    timestamps.add(10)
+    timestamps.repeat()
+    timestamps.repeat()
+    timestamps.add(13)
+    timestamps.add(14)
+    timestamps.repeat()
+    timestamps.close()
+    timestamps.close()
+    assert read_rows(path) == [
+        ["frame", "timestamp", "repeats"],
+        ["0", "10", "3"],
+        ["1", "13", "1"],
+        ["2", "14", "2"],
+    ]
+
+
+def test_frame_timestamps_repeat_before_first_frame(tmp_path):
+    timestamps = FrameTimestamps(tmp_path / "video.frames.csv")
+    with pytest.raises(RuntimeError):
+        timestamps.repeat()
+    timestamps.close()
+    assert read_rows(tmp_path / "video.frames.csv") == [["frame", "time", "repeats"]]
+
+
+def write_timestamps(path, frames):
+    """frames: (time, repeats) of the encoded frames"""
+    timestamps = FrameTimestamps(path, time_column="timestamp")
+    for time, repeats in frames:
+        timestamps.add(time)
+        for _ in range(repeats - 1):
+            timestamps.repeat()
+    timestamps.close()
+    return path
+
+
+def test_concat_frame_timestamps(tmp_path):
+    # input frames 0-9: 0 0 0 1 | 1 1 2 3 | 3 4, split after frames 3 and 7
+    paths = [
+        write_timestamps(tmp_path / "0.frames.csv", [(0, 3), (3, 1)]),
+        # starts with 2 repeats of the last frame of the previous segment
+        write_timestamps(tmp_path / "1.frames.csv", [(6, 1), (7, 1)]),
+        write_timestamps(tmp_path / "2.frames.csv", [(9, 1)]),
+    ]
+    output = tmp_path / "video.frames.csv"
+    concat_frame_timestamps(paths, [0, 2, 1], output)
+
+    assert read_rows(output) == read_rows(
+        write_timestamps(tmp_path / "expected.frames.csv", [(0, 3), (3, 3), (6, 1), (7, 2), (9, 1)])
+    )
+
+
+def test_concat_frame_timestamps_empty_segment(tmp_path):
+    paths = [
+        write_timestamps(tmp_path / "0.frames.csv", [(0, 2)]),
+        # a segment made only of repeats
+        write_timestamps(tmp_path / "1.frames.csv", []),
+        write_timestamps(tmp_path / "2.frames.csv", [(5, 1)]),
+    ]
+    output = tmp_path / "video.frames.csv"
+    concat_frame_timestamps(paths, [0, 3, 0], output)
+    assert read_rows(output)[1:] == [["0", "0", "5"], ["1", "5", "1"]]
+
+
+def test_concat_frame_timestamps_leading_repeats_without_frames(tmp_path):
+    paths = [write_timestamps(tmp_path / "0.frames.csv", [(0, 1)])]
+    with pytest.raises(ValueError):
+        concat_frame_timestamps(paths, [1], tmp_path / "video.frames.csv")
+
+
+def write_video(path, values, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30.0, size)
+    for value in values:
+        writer.write(np.full((size[1], size[0], 3), value, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.mark.parametrize(
+    "reencode",
+    [pytest.param(False, marks=pytest.mark.skipif(not has_ffmpeg(), reason="ffmpeg is not installed")), True],
+)
+def test_concat_videos(tmp_path, reencode):
+    paths = [write_video(tmp_path / "0.mp4", [0, 50, 100]), write_video(tmp_path / "1.mp4", [150, 200])]
+    output = tmp_path / "video.mp4"
+    concat_videos(paths, output, cv2.VideoWriter_fourcc(*"mp4v"), 30.0, (64, 48), reencode=reencode)
+
+    capture = cv2.VideoCapture(str(output))
+    means = []
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        means.append(frame.mean())
+    capture.release()
+    np.testing.assert_allclose(means, [0, 50, 100, 150, 200], atol=8)
+
+
+def test_concat_videos_without_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+    assert not has_ffmpeg()
+    paths = [write_video(tmp_path / "0.mp4", [0])]
+    with pytest.raises(RuntimeError, match="ffmpeg is not on the PATH"):
+        concat_videos(paths, tmp_path / "video.mp4", cv2.VideoWriter_fourcc(*"mp4v"), 30.0, (64, 48))
+    assert not (tmp_path / "video.mp4").exists()
+
+
+def test_concat_videos_ffmpeg_error(tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "bin" / "ffmpeg"
+    ffmpeg.parent.mkdir()
+    ffmpeg.write_text("#!/bin/sh\necho 'unsupported codec' >&2\nexit 1\n")
+    ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", str(ffmpeg.parent))
+    paths = [write_video(tmp_path / "0.mp4", [0])]
+    with pytest.raises(RuntimeError, match="unsupported codec"):
+        concat_videos(paths, tmp_path / "video.mp4", cv2.VideoWriter_fourcc(*"mp4v"), 30.0, (64, 48))
+
+
+class EncoderError(Exception):
+    pass
+
+
+class FakeVideoWriter:
+    """cv2.VideoWriter recording the frame values, its writes wait for gate and the fail_at-th one raises"""
+
+    instances = []
+
+    def __init__(self, path, fourcc, fps, frame_size, fail_at=None):
+        self.frame_size = frame_size
+        self.values = []
+        self.released = False
+        self.gate = threading.Event()
+        self.gate.set()
+        self.writing = threading.Event()
+        self.fail_at = fail_at
+        FakeVideoWriter.instances.append(self)
+
+    def write(self, frame):
+        assert frame.shape == (self.frame_size[1], self.frame_size[0], 3)
+        self.writing.set()
+        self.gate.wait(timeout=10)
+        if len(self.values) == self.fail_at:
+            raise EncoderError("encoder failed")
+        self.values.append(tuple(frame[0, 0]))
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def fake_video_writer(monkeypatch):
+    FakeVideoWriter.instances = []
+    monkeypatch.setattr(cv2, "VideoWriter", FakeVideoWriter)
+    return FakeVideoWriter
+
+
+def make_writer(queue_size=2, policy="block", frame_size=(8, 4)):
+    writer = AsyncVideoWriter("video.mp4", 0, 30.0, frame_size, queue_size=queue_size, policy=policy)
+    return writer, FakeVideoWriter.instances[-1]
+
+
+def frame(value, size=(8, 4)):
+    return np.full((size[1], size[0], 3), (value, 0, 255 - value), dtype=np.uint8)
+
+
+def test_async_writer_block_keeps_all_frames_in_order(fake_video_writer):
+    writer, encoder = make_writer(queue_size=2)
+    image = frame(0)
+    for value in range(20):
+        # the buffer is reused, write copies it
+        image[:] = frame(value)
+        writer.write(image)
+    writer.release()
+    assert encoder.values == [(value, 0, 255 - value) for value in range(20)]
+    assert writer.dropped == 0
+
+
+def test_async_writer_converts_and_resizes(fake_video_writer):
+    writer, encoder = make_writer(frame_size=(16, 8))
+    # a BGR view of an RGB buffer, like the frames of Visualize.render
+    writer.write(frame(10)[..., ::-1], copy=False)
+    writer.write(frame(20, size=(16, 8)))
+    writer.release()
+    # encoded as the view shows it
+    assert encoder.values == [(245, 0, 10), (20, 0, 235)]
+
+
+def test_async_writer_drop_counts_dropped_frames(fake_video_writer):
+    writer, encoder = make_writer(queue_size=2, policy="drop")
+    encoder.gate.clear()
+    writer.write(frame(0))
+    # the writer thread is encoding frame 0, 2 frames fit in the queue and the others are dropped
+    assert encoder.writing.wait(timeout=10)
+    for value in range(1, 6):
+        writer.write(frame(value))
+    assert writer.dropped == 3
+    encoder.gate.set()
+    writer.release()
+    assert [value for value, _, _ in encoder.values] == [0, 1, 2]
+
+
+def test_async_writer_reraises_thread_error(fake_video_writer):
+    writer, encoder = make_writer()
+    encoder.fail_at = 1
+    writer.write(frame(0))
+    writer.write(frame(1))
+    writer.write(frame(2))
+    writer._queue.join()
+    with pytest.raises(EncoderError):
+        writer.write(frame(3))
+    with pytest.raises(EncoderError):
+        writer.release()
+    # the frames after the error are discarded
+    assert encoder.values == [(0, 0, 255)]
+    assert encoder.released and writer._thread is None
+
+
+def test_async_writer_release_flushes_and_joins(fake_video_writer):
+    writer, encoder = make_writer(queue_size=8)
+    thread = writer._thread
+    encoder.gate.clear()
+    for value in range(6):
+        writer.write(frame(value))
+    threading.Timer(0.2, encoder.gate.set).start()
+    writer.release()
+    assert not thread.is_alive()
+    assert encoder.released
+    assert len(encoder.values) == 6
+    writer.release()
+    with pytest.raises(RuntimeError):
+        writer.write(frame(0))
+
+
+def test_async_writer_invalid_policy():
+    with pytest.raises(ValueError):
+        AsyncVideoWriter("video.mp4", 0, 30.0, (8, 4), policy="wait")
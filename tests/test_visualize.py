@@ -0,0 +1,162 @@
+import copy
+import tracemalloc
+import zlib
+from pathlib import Path
+
+import gymnasium as gym
+import nle  # noqa: F401
+import numpy as np
+import pytest
+
+from nle_utils.layout import compute_layout
+from nle_utils.visualize import ITEM_CLASSES, Visualize, _text_sprite
+
+ROOT = Path(__file__).resolve().parents[1]
+TILESET_PATH = str(ROOT / "tilesets" / "3.6.1tiles32.png")
+
+RENDER_KEYS = (
+    "glyphs",
+    "blstats",
+    "message",
+    "inv_glyphs",
+    "inv_letters",
+    "inv_oclasses",
+    "inv_strs",
+    "tty_chars",
+    "tty_colors",
+)
+# a frame is about 20 MiB, steady-state rendering only allocates small temporaries
+MAX_RENDER_ALLOCATION = 256 * 1024
+
+
+@pytest.fixture(scope="module")
+def observations():
+    """60 steps of random actions, NetHackScore's are mostly moves so that the map and the tty change"""
+    env = gym.make("NetHackScore-v0")
+    obs, info = env.reset(seed=0)
+    env.action_space.seed(0)
+    observations = []
+    for _ in range(60):
+        observations.append({key: obs[key].copy() for key in RENDER_KEYS})
+        obs, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        if terminated or truncated:
+            obs, info = env.reset()
+    env.close()
+    return observations
+
+
+def render_peak_allocations(visualizer, observations, trace=True):
+    """Peak traced allocation of every `render` call of an episode over observations"""
+    peaks = []
+    visualizer.reset_history()
+    for i, obs in enumerate(observations):
+        if trace:
+            tracemalloc.start()
+        try:
+            visualizer.render(*(obs[key] for key in RENDER_KEYS), {})
+            if trace:
+                peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        visualizer.update_history(f"action {i}", obs["message"], obs["tty_chars"])
+    return peaks
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_render_steady_state_allocations(observations, incremental):
+    visualizer = Visualize(tileset_path=TILESET_PATH, incremental=incremental)
+    # the first episode allocates the frame buffer, compiles the kernels and fills the text sprite cache
+    render_peak_allocations(visualizer, observations[:16], trace=False)
+
+    peak = max(render_peak_allocations(visualizer, observations[:16]))
+    assert peak < MAX_RENDER_ALLOCATION, f"render allocated {peak / 1024:.1f} KiB"
+
+
+def test_render_returns_frame_buffer(observations):
+    visualizer = Visualize(tileset_path=TILESET_PATH)
+    obs = observations[0]
+    first = visualizer.render(*(obs[key] for key in RENDER_KEYS), {})
+    second = visualizer.render(*(obs[key] for key in RENDER_KEYS), {})
+    assert first.shape == visualizer.frame_shape()
+    assert np.shares_memory(first, second)
+
+
+def test_history_attributes(observations):
+    visualizer = Visualize(tileset_path=TILESET_PATH)
+    render_peak_allocations(visualizer, observations[:3], trace=False)
+    assert list(visualizer.action_history) == ["action 0", "action 1", "action 2"]
+    assert visualizer.action_history is visualizer.history.action_history
+    assert len(visualizer.message_history) == len(visualizer.popup_history) == 3
+
+    visualizer.reset_history()
+    assert len(visualizer.action_history) == len(visualizer.message_history) == len(visualizer.popup_history) == 0
+
+
+def digest(frame):
+    """Frames are about 20 MiB, an episode of them is compared through checksums (of the RGB buffer under the BGR
+    view, which is contiguous)"""
+    return zlib.crc32(np.ascontiguousarray(frame[..., ::-1]).data)
+
+
+def render_episode(visualizer, observations):
+    """Digests of the frames of an episode over observations, and the history each one was drawn with"""
+    frames, histories = [], []
+    visualizer.reset_history()
+    for i, obs in enumerate(observations):
+        frames.append(digest(visualizer.render(*(obs[key] for key in RENDER_KEYS), {})))
+        histories.append(copy.deepcopy(visualizer.history))
+        visualizer.update_history(f"action {i}", obs["message"], obs["tty_chars"])
+    return frames, histories
+
+
+def test_incremental_frames_equal_full_renders(observations):
+    full = Visualize(tileset_path=TILESET_PATH)
+    incremental = Visualize(tileset_path=TILESET_PATH, incremental=True)
+    expected, _ = render_episode(full, observations)
+
+    incremental.reset_history()
+    for i, obs in enumerate(observations):
+        if i % 20 == 10:
+            incremental.invalidate()
+        for _ in range(2 if i % 15 == 0 else 1):
+            # also nothing to redraw when the same observation is rendered again
+            frame = incremental.render(*(obs[key] for key in RENDER_KEYS), {})
+            assert digest(frame) == expected[i], f"frame {i} differs"
+        incremental.update_history(f"action {i}", obs["message"], obs["tty_chars"])
+
+
+@pytest.mark.parametrize("batch_size", [4, 7])
+def test_render_batch_equals_render(observations, batch_size):
+    visualizer = Visualize(tileset_path=TILESET_PATH)
+    expected, histories = render_episode(visualizer, observations)
+
+    # the last batch is smaller when batch_size doesn't divide the episode
+    outs = {}
+    for start in range(0, len(observations), batch_size):
+        batch = observations[start : start + batch_size]
+        if len(batch) not in outs:
+            outs[len(batch)] = np.zeros((len(batch), *visualizer.frame_shape()), dtype=np.uint8)
+        frames = visualizer.render_batch(
+            *(np.stack([obs[key] for obs in batch]) for key in RENDER_KEYS),
+            [{}] * len(batch),
+            histories[start : start + batch_size],
+            out=outs[len(batch)],
+        )
+        assert frames.shape == (len(batch), *visualizer.frame_shape())
+        for i, frame in enumerate(frames):
+            assert digest(frame) == expected[start + i], f"frame {start + i} differs"
+
+
+@pytest.mark.parametrize("output_size", [(1920, 1080), (1280, 720), None])
+def test_inventory_headers_fit_in_pane(output_size):
+    layout = compute_layout(output_size)
+    for item_class in ITEM_CLASSES:
+        header = item_class.name.capitalize()
+        # drawn without background to find the pixels of the text, at the top left of the inventory
+        text, x, y = _text_sprite(header, layout.font_scale, (255, 255, 255), None, True)
+        assert y >= layout.frame_thickness and x >= layout.frame_thickness, header
+        assert x + text.shape[1] <= layout.inventory.width - layout.frame_thickness, header
+        caps, _, caps_y = _text_sprite(header.upper(), layout.font_scale, (255, 255, 255), None, True)
+        # and the box of the header stops where the text of the next line starts
+        box, _, box_y = _text_sprite(header, layout.font_scale, (0, 0, 0), (255, 255, 255), True)
+        assert caps_y + caps.shape[0] <= box_y + box.shape[0] <= layout.line_height + y, header